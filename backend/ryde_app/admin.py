@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils import timezone
-from .models import User, UserProfile, Vehicle, Ride, EmergencyRequest, DriverLocation
+from .models import User, UserProfile, Vehicle, Ride, RideStatusTransition, EmergencyRequest, DriverLocation, PlaceDetail
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -97,6 +97,12 @@ class RideAdmin(admin.ModelAdmin):
     list_filter = ('status', 'created_at')
     search_fields = ('customer__email', 'driver__email')
 
+@admin.register(RideStatusTransition)
+class RideStatusTransitionAdmin(admin.ModelAdmin):
+    list_display = ('ride', 'from_status', 'to_status', 'actor', 'created_at')
+    list_filter = ('to_status', 'created_at')
+    search_fields = ('ride__id', 'actor__email')
+
 @admin.register(EmergencyRequest)
 class EmergencyRequestAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'service_type', 'status', 'created_at')
@@ -107,4 +113,9 @@ class EmergencyRequestAdmin(admin.ModelAdmin):
 class DriverLocationAdmin(admin.ModelAdmin):
     list_display = ('driver', 'lat', 'lng', 'is_online', 'last_updated')
     list_filter = ('is_online',)
-    search_fields = ('driver__email',)
\ No newline at end of file
+    search_fields = ('driver__email',)
+
+@admin.register(PlaceDetail)
+class PlaceDetailAdmin(admin.ModelAdmin):
+    list_display = ('place_id', 'name', 'address', 'lat', 'lng', 'fetched_at')
+    search_fields = ('place_id', 'name', 'address')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RydeAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ryde_app'
+
+    def ready(self):
+        # Connects the rollup's post_delete receiver
+        from . import ride_metrics  # noqa: F401
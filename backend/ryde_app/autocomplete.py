@@ -0,0 +1,340 @@
+import bisect
+import re
+import threading
+import time
+
+from cachetools import TTLCache
+from django.conf import settings
+
+from .geo import calculate_distance
+from .maps_client import maps_client
+
+LOCAL_PLACE_PREFIX = 'ryde:'
+MAX_INDEXED_WORDS = 6
+RIDE_ENDS = ('pickup', 'dropoff')
+
+
+def normalize_query(text):
+    text = re.sub(r"[^\w\s]", ' ', text.lower())
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def local_place_id(ride_id, end):
+    """Place id for the ``end`` ('pickup' or 'dropoff') address of a ride.
+
+    The id names the row it came from, so any worker can resolve it from the
+    database even if its own index has never seen the address.
+    """
+    return f"{LOCAL_PLACE_PREFIX}{ride_id}:{end}"
+
+
+def parse_local_place_id(place_id):
+    """``(ride_id, end)`` for an id made by ``local_place_id``, else None"""
+    if not place_id or not place_id.startswith(LOCAL_PLACE_PREFIX):
+        return None
+    ride_id, _, end = place_id[len(LOCAL_PLACE_PREFIX):].partition(':')
+    if not ride_id.isdigit() or end not in RIDE_ENDS:
+        return None
+    return int(ride_id), end
+
+
+class AutocompleteIndex:
+    """Sorted prefix index over places we have already seen.
+
+    Every word start of a place description is stored as a key in a sorted
+    list, so "westl" and "sarit" both find "Sarit Centre, Westlands" with a
+    bisect instead of a scan. Entries come from Google predictions we have
+    returned before and from pickup/dropoff addresses of past rides.
+    """
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._keys = []
+        self._entries = {}
+        # Normalised ride-history address -> the local place id it was indexed under
+        self._addresses = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _insert(self, suggestion, lat, lng):
+        """Store a new entry (caller holds the lock); returns its index keys, or [] if none were added"""
+        place_id = suggestion['place_id']
+        entry = self._entries.get(place_id)
+        if entry:
+            entry['hits'] += 1
+            if lat is not None and lng is not None:
+                entry['lat'], entry['lng'] = lat, lng
+            return []
+        if len(self._entries) >= self.max_entries:
+            return []
+
+        self._entries[place_id] = {
+            'suggestion': {
+                'description': suggestion['description'],
+                'place_id': place_id,
+                'main_text': suggestion.get('main_text', ''),
+                'secondary_text': suggestion.get('secondary_text', ''),
+                'types': suggestion.get('types', []),
+            },
+            'lat': lat,
+            'lng': lng,
+            'hits': 1,
+        }
+        words = normalize_query(suggestion['description']).split(' ')
+        return [(' '.join(words[position:]), place_id) for position in range(min(len(words), MAX_INDEXED_WORDS))]
+
+    def add(self, suggestion, lat=None, lng=None):
+        with self._lock:
+            for key in self._insert(suggestion, lat, lng):
+                bisect.insort(self._keys, key)
+
+    def _address_suggestion(self, address, ride_id, end):
+        normalized = normalize_query(address)
+        if normalized not in self._addresses and len(self._entries) >= self.max_entries:
+            return None
+        place_id = self._addresses.setdefault(normalized, local_place_id(ride_id, end))
+        main_text, _, secondary_text = address.partition(',')
+        return {
+            'description': address,
+            'place_id': place_id,
+            'main_text': main_text.strip(),
+            'secondary_text': secondary_text.strip(),
+            'types': ['ride_history'],
+        }
+
+    def add_address(self, address, lat, lng, ride_id, end):
+        """Index the ``end`` address of a ride; repeats of an address share the first ride's id"""
+        with self._lock:
+            suggestion = self._address_suggestion(address, ride_id, end)
+            if suggestion:
+                self.add(suggestion, lat, lng)
+
+    def add_addresses(self, rows):
+        """Bulk ``add_address`` for ``(address, lat, lng, ride_id, end)`` rows, sorting the keys once"""
+        with self._lock:
+            keys = []
+            for address, lat, lng, ride_id, end in rows:
+                suggestion = self._address_suggestion(address, ride_id, end)
+                if suggestion:
+                    keys.extend(self._insert(suggestion, lat, lng))
+            self._keys.extend(keys)
+            self._keys.sort()
+
+    def set_location(self, place_id, lat, lng):
+        with self._lock:
+            entry = self._entries.get(place_id)
+            if entry:
+                entry['lat'], entry['lng'] = lat, lng
+
+    def resolve(self, place_id):
+        """Return ``{'address', 'name', 'lat', 'lng'}`` for a locally known place"""
+        entry = self._entries.get(place_id)
+        if not entry or entry['lat'] is None:
+            return None
+        return {
+            'address': entry['suggestion']['description'],
+            'name': entry['suggestion']['main_text'],
+            'lat': entry['lat'],
+            'lng': entry['lng'],
+        }
+
+    def search(self, query, lat=None, lng=None, limit=15):
+        prefix = normalize_query(query)
+        if not prefix:
+            return []
+
+        matches = {}
+        with self._lock:
+            position = bisect.bisect_left(self._keys, (prefix, ''))
+            while position < len(self._keys) and self._keys[position][0].startswith(prefix):
+                place_id = self._keys[position][1]
+                matches[place_id] = self._entries[place_id]
+                position += 1
+
+        def rank(entry):
+            if lat is not None and lng is not None and entry['lat'] is not None:
+                distance = calculate_distance(lat, lng, entry['lat'], entry['lng'])
+            else:
+                distance = float('inf')
+            return (distance, -entry['hits'])
+
+        ranked = sorted(matches.values(), key=rank)
+        return [entry['suggestion'] for entry in ranked[:limit]]
+
+    def ensure_loaded(self):
+        """Seed the index from ride history the first time it is used.
+
+        Concurrent callers wait for the load instead of searching an empty
+        index, and a load that fails is tried again on the next call.
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+
+            from .models import Ride
+            limit = getattr(settings, 'AUTOCOMPLETE_HISTORY_ROWS', 5000)
+            rides = Ride.objects.order_by('-created_at').values_list(
+                'id',
+                'pickup_address', 'pickup_lat', 'pickup_lng',
+                'dropoff_address', 'dropoff_lat', 'dropoff_lng',
+            )[:limit]
+            rows = []
+            for ride_id, pickup_address, pickup_lat, pickup_lng, dropoff_address, dropoff_lat, dropoff_lng in rides:
+                if pickup_address:
+                    rows.append((pickup_address, pickup_lat, pickup_lng, ride_id, 'pickup'))
+                if dropoff_address:
+                    rows.append((dropoff_address, dropoff_lat, dropoff_lng, ride_id, 'dropoff'))
+            self.add_addresses(rows)
+            self._loaded = True
+
+
+def resolve_place(place_id):
+    """``{'address', 'name', 'lat', 'lng'}`` for a place in the index or a ``ryde:`` ride address.
+
+    Ride-history ids are looked up in the database when this worker's index
+    doesn't hold them (another worker issued the id, or the process restarted).
+    """
+    place = autocomplete_index.resolve(place_id)
+    if place or parse_local_place_id(place_id) is None:
+        return place
+
+    from .models import Ride
+    ride_id, end = parse_local_place_id(place_id)
+    row = Ride.objects.filter(id=ride_id).values_list(f'{end}_address', f'{end}_lat', f'{end}_lng').first()
+    if not row or not row[0] or row[1] is None:
+        return None
+    address, lat, lng = row
+    return {
+        'address': address,
+        'name': address.partition(',')[0].strip(),
+        'lat': lat,
+        'lng': lng,
+    }
+
+
+class SingleFlight:
+    """Let concurrent callers with the same key share one upstream call"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+
+
+autocomplete_index = AutocompleteIndex(
+    max_entries=getattr(settings, 'AUTOCOMPLETE_INDEX_MAX_ENTRIES', 20000),
+)
+_upstream_results = TTLCache(
+    maxsize=getattr(settings, 'AUTOCOMPLETE_UPSTREAM_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'AUTOCOMPLETE_UPSTREAM_TTL', 300),
+)
+_upstream_lock = threading.Lock()
+_inflight = SingleFlight()
+# Monotonic time until which Places calls skip the types filter after it was rejected
+_types_filter_skip_until = 0.0
+
+
+def fetch_google_suggestions(query, lat=None, lng=None):
+    """Call Places Autocomplete and convert predictions to suggestion dicts"""
+    global _types_filter_skip_until
+
+    params = {
+        'input': query,
+        'components': 'country:ke',
+    }
+    if time.monotonic() >= _types_filter_skip_until:
+        params['types'] = 'establishment,geocode'
+    if lat is not None and lng is not None:
+        params.update({
+            'location': f'{lat},{lng}',
+            'radius': 50000,
+        })
+
+    data = maps_client.get('autocomplete', params)
+
+    if data['status'] == 'INVALID_REQUEST' and 'types' in params:
+        params.pop('types')
+        data = maps_client.get('autocomplete', params)
+        if data['status'] != 'INVALID_REQUEST':
+            # The filter was the problem: skip it for a while rather than retrying every keystroke
+            _types_filter_skip_until = time.monotonic() + getattr(
+                settings, 'AUTOCOMPLETE_TYPES_FILTER_BACKOFF_SECONDS', 600
+            )
+
+    suggestions = []
+    if data['status'] == 'OK':
+        for prediction in data['predictions']:
+            suggestions.append({
+                'description': prediction['description'],
+                'place_id': prediction['place_id'],
+                'main_text': prediction.get('structured_formatting', {}).get('main_text', ''),
+                'secondary_text': prediction.get('structured_formatting', {}).get('secondary_text', ''),
+                'types': prediction.get('types', [])
+            })
+    return data['status'], suggestions
+
+
+def suggest(query, lat=None, lng=None, limit=15):
+    """Answer from the local index when it has enough matches, else ask Google.
+
+    Upstream answers are kept for a short TTL so a user re-typing the same
+    prefix is debounced, and identical prefixes in flight at the same moment
+    share one Google call. Returns ``(suggestions, source)``.
+    """
+    autocomplete_index.ensure_loaded()
+
+    local = autocomplete_index.search(query, lat, lng, limit)
+    if len(local) >= getattr(settings, 'AUTOCOMPLETE_MIN_LOCAL_RESULTS', 5):
+        return local, 'local'
+
+    location_key = (round(lat, 2), round(lng, 2)) if lat is not None and lng is not None else None
+    key = (normalize_query(query), location_key)
+
+    with _upstream_lock:
+        cached = _upstream_results.get(key)
+    if cached is not None:
+        return cached, 'cache'
+
+    def fetch():
+        status, suggestions = fetch_google_suggestions(query, lat, lng)
+        if status in ('OK', 'ZERO_RESULTS'):
+            with _upstream_lock:
+                _upstream_results[key] = suggestions
+        for suggestion in suggestions:
+            autocomplete_index.add(suggestion)
+        return suggestions
+
+    upstream = _inflight.do(key, fetch)
+
+    seen = {suggestion['place_id'] for suggestion in upstream}
+    merged = upstream + [suggestion for suggestion in local if suggestion['place_id'] not in seen]
+    return merged[:limit], 'google'
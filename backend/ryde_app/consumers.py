@@ -1,11 +1,70 @@
 import json
-import jwt
+import time
 from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
+from .geo import calculate_distance
+from .jwt_auth import get_cached_user
+from .live_locations import live_locations
+from .location_fanout import ride_location_broadcaster
+from .logs import get_logger
+
+log = get_logger('ws')
+
+FINISHED_RIDE_STATUSES = ('completed', 'cancelled')
+
+
+class RideParticipantsMixin:
+    """Per-connection cache of ride_id -> {customer_id, driver_id, status}.
+
+    Relaying chat and status messages only needs to know who is on the ride,
+    so after the first lookup it happens without a database round trip.
+    Entries are dropped when a status update, acceptance or ride_taken
+    event for the ride reaches this connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ride_participants = {}
+
+    async def get_ride_participants(self, ride_id):
+        try:
+            ride_id = int(ride_id)
+        except (TypeError, ValueError):
+            return None
+        if ride_id not in self.ride_participants:
+            self.ride_participants[ride_id] = await self.load_ride_participants(ride_id)
+        return self.ride_participants[ride_id]
+
+    def forget_ride(self, ride_id):
+        try:
+            self.ride_participants.pop(int(ride_id), None)
+        except (TypeError, ValueError):
+            pass
+
+    @database_sync_to_async
+    def load_ride_participants(self, ride_id):
+        from .models import Ride
+        row = Ride.objects.filter(id=ride_id).values('id', 'customer_id', 'driver_id', 'status').first()
+        if row is None:
+            log.warning('ride_not_found', ride_id=ride_id)
+            return None
+        return {
+            'ride_id': row['id'],
+            'customer_id': row['customer_id'],
+            'driver_id': row['driver_id'],
+            'status': row['status'],
+        }
+
+
 #Driver Consumer
-class DriverConsumer(AsyncWebsocketConsumer):
+class DriverConsumer(RideParticipantsMixin, AsyncWebsocketConsumer):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Last accepted fix on this connection: (monotonic time, lat, lng)
+        self.last_fix = None
     
     async def connect(self):
         try:
@@ -13,36 +72,38 @@ class DriverConsumer(AsyncWebsocketConsumer):
             self.driver_id = self.scope['url_route']['kwargs'].get('id')
             
             if not self.driver_id:
-                print("❌ [Driver WS] No driver ID provided")
+                log.warning('driver_connect_rejected', reason='missing_id')
                 await self.close(code=4001)
                 return
                 
             self.driver_group_name = f'driver_{self.driver_id}'
-            print(f"🟡 [Driver WS] Connecting driver ID: {self.driver_id}")
+            log.debug('driver_connecting', driver_id=self.driver_id)
 
            
-            self.user = await self.get_user()
-            if not self.user:
-                print("❌ [Driver WS] Authentication failed")
+            # Identity comes from the token claims set by JWTAuthMiddleware
+            self.user_id = self.scope.get('user_id')
+            self.user_type = self.scope.get('user_type')
+            if not self.user_id:
+                log.warning('driver_connect_rejected', reason='unauthenticated', driver_id=self.driver_id)
                 await self.close(code=4001)
                 return
 
            
-            if self.user.user_type not in ['driver', 'boda_rider']:
-                print(f"❌ [Driver WS] Unauthorized user type: {self.user.user_type}")
+            if self.user_type not in ['driver', 'boda_rider']:
+                log.warning('driver_connect_rejected', reason='user_type', driver_id=self.driver_id, user_type=self.user_type)
                 await self.close(code=4003)
                 return
 
             
-            if str(self.user.id) != str(self.driver_id):
-                print(f"❌ [Driver WS] Driver ID mismatch")
+            if str(self.user_id) != str(self.driver_id):
+                log.warning('driver_connect_rejected', reason='id_mismatch', driver_id=self.driver_id, user_id=self.user_id)
                 await self.close(code=4003)
                 return
 
            
             await self.channel_layer.group_add(self.driver_group_name, self.channel_name)
             await self.accept()
-            print(f"✅ [Driver WS] Connected driver {self.driver_id}")
+            log.info('driver_connected', driver_id=self.driver_id)
 
            
             await self.send(text_data=json.dumps({
@@ -50,12 +111,12 @@ class DriverConsumer(AsyncWebsocketConsumer):
                 'data': {
                     'message': f'Driver {self.driver_id} connected', 
                     'driver_id': self.driver_id,
-                    'user_type': self.user.user_type
+                    'user_type': self.user_type
                 }
             }))
 
-        except Exception as e:
-            print(f"❌ [Driver WS] Connection error: {e}")
+        except Exception:
+            log.exception('driver_connect_failed', driver_id=getattr(self, 'driver_id', None))
             
             await self.close(code=4000)
 
@@ -63,9 +124,9 @@ class DriverConsumer(AsyncWebsocketConsumer):
         
         if hasattr(self, 'driver_group_name'):
             await self.channel_layer.group_discard(self.driver_group_name, self.channel_name)
-            print(f"🔴 [Driver WS] Disconnected driver {self.driver_id}, code: {close_code}")
+            log.info('driver_disconnected', driver_id=self.driver_id, code=close_code)
         else:
-            print(f"🔴 [Driver WS] Disconnected (never fully connected), code: {close_code}")
+            log.debug('driver_disconnected', driver_id=None, code=close_code)
 
     async def receive(self, text_data):
         try:
@@ -73,7 +134,7 @@ class DriverConsumer(AsyncWebsocketConsumer):
             message_type = data_json.get('type')
             data = data_json.get('data', {})
 
-            print(f"📨 [Driver WS] Message type: {message_type}, data: {data}")
+            log.sampled('driver_frame', message_type=message_type, driver_id=self.driver_id)
 
             if message_type == 'ping':
                 await self.send(text_data=json.dumps({
@@ -84,7 +145,7 @@ class DriverConsumer(AsyncWebsocketConsumer):
 
             
             elif message_type == 'driver_message':
-                print(f"🔍 [Driver WS] Received driver_message: {data}")
+                log.debug('driver_chat_received', ride_id=data.get('ride_id'))
                 
                 ride_id = data.get('ride_id')
                 if ride_id:
@@ -96,13 +157,11 @@ class DriverConsumer(AsyncWebsocketConsumer):
                     await self.notify_customer_ride_accepted(ride_id, data)
 
             elif message_type == 'location_update':
-                ride_id = data.get('ride_id')
-                if ride_id:
-                    await self.broadcast_driver_location(ride_id, data)
+                await self.ingest_location(data)
 
             elif message_type == 'chat_message':
                 ride_id = data.get('ride_id')
-                print(f"🔍 [Driver WS] Received chat_message for ride {ride_id}: {data}")
+                log.debug('driver_chat_received', ride_id=ride_id)
                 if ride_id:
                     await self.send_chat_to_customer(ride_id, data)        
 
@@ -112,19 +171,17 @@ class DriverConsumer(AsyncWebsocketConsumer):
                     await self.broadcast_ride_status_update(ride_id, data)
 
             else:
-                print(f"⚠️ [Driver WS] Unknown message type: {message_type}")
+                log.warning('driver_unknown_message', message_type=message_type)
 
-        except Exception as e:
-            print(f"❌ [Driver WS] Receive error: {e}")
+        except Exception:
+            log.exception('driver_receive_failed', driver_id=self.driver_id)
 
     
     async def customer_message(self, event):
-        print(f"💬 [Driver WS CUSTOMER_MESSAGE] Received message from customer: {event['data']}")
         await self.send(text_data=json.dumps({
             'type': 'customer_message', 
             'data': event['data']
         }))
-        print(f"✅ [Driver WS CUSTOMER_MESSAGE] Sent to driver frontend")
 
 
     #Messages
@@ -135,20 +192,21 @@ class DriverConsumer(AsyncWebsocketConsumer):
         }))
 
     async def ride_accepted_self(self, event):
-        print(f"🔄 [Driver WS] Updating dashboard with accepted ride {event['data']['ride_id']}")
+        self.forget_ride(event['data'].get('ride_id'))
+        log.debug('driver_ride_accepted_self', ride_id=event['data'].get('ride_id'))
         await self.send(text_data=json.dumps({
             'type': 'ride_accepted_self',
             'data': event['data']
         }))
     
     async def ride_taken(self, event):
+        self.forget_ride(event['data'].get('ride_id'))
         await self.send(text_data=json.dumps({
             'type': 'ride_taken', 
             'data': event['data']
         }))
 
     async def customer_message(self, event):
-        print(f"💬 [Driver WS] Received customer message: {event['data']}")
         await self.send(text_data=json.dumps({
             'type': 'customer_message', 
             'data': event['data']
@@ -175,6 +233,9 @@ class DriverConsumer(AsyncWebsocketConsumer):
     #     }))
 
     async def ride_status_update(self, event):
+        self.forget_ride(event['data'].get('ride_id'))
+        if event['data'].get('status') in FINISHED_RIDE_STATUSES:
+            ride_location_broadcaster.forget(event['data'].get('ride_id'))
         await self.send(text_data=json.dumps({
             'type': 'ride_status_update',
             'data': event['data']
@@ -188,49 +249,113 @@ class DriverConsumer(AsyncWebsocketConsumer):
 
    
     async def notify_customer_ride_accepted(self, ride_id, data):
-        ride = await self.get_ride(ride_id)
-        if not ride or not ride.customer:
-            print(f"❌ [Driver WS] Cannot notify customer - ride {ride_id} not found")
+        ride = await self.get_ride_participants(ride_id)
+        if ride and ride['driver_id'] != self.user_id:
+            # May have been cached before this driver's accept went through
+            self.forget_ride(ride_id)
+            ride = await self.get_ride_participants(ride_id)
+        if not ride or not ride['customer_id']:
+            log.warning('ride_accept_notify_skipped', ride_id=ride_id)
+            return
+        if ride['driver_id'] != self.user_id:
+            log.warning('ride_accept_notify_rejected', ride_id=ride_id, driver_id=self.user_id)
             return
             
-        customer_group = f'customer_{ride.customer.id}'
+        user = await self.get_user()
+        if not user:
+            return
+        
+        customer_group = f"customer_{ride['customer_id']}"
         await self.channel_layer.group_send(customer_group, {
             'type': 'ride_accepted',
             'data': {
-                'ride_id': ride.id,
-                'driver_id': self.user.id,
-                'driver_name': f"{self.user.first_name} {self.user.last_name}",
-                'driver_phone': self.user.phone_number,
+                'ride_id': ride['ride_id'],
+                'driver_id': user.id,
+                'driver_name': f"{user.first_name} {user.last_name}",
+                'driver_phone': user.phone_number,
                 'vehicle_type': data.get('vehicle_type', ''),
                 'license_plate': data.get('license_plate', ''),
                 'timestamp': data.get('timestamp')
             }
         })
-        print(f"📢 [Driver WS] Notified customer {ride.customer.id} about accepted ride")
+        log.info('ride_accept_notified', ride_id=ride['ride_id'], customer_id=ride['customer_id'])
 
-    async def broadcast_driver_location(self, ride_id, data):
-        ride = await self.get_ride(ride_id)
-        if not ride or not ride.customer:
+    async def ingest_location(self, data):
+        """Validate, throttle, store and fan out one GPS fix from the driver"""
+        try:
+            lat = float(data.get('lat'))
+            lng = float(data.get('lng'))
+            heading = data.get('heading')
+            speed = data.get('speed')
+            heading = float(heading) if heading not in (None, '') else None
+            speed = float(speed) if speed not in (None, '') else None
+        except (TypeError, ValueError):
+            await self.send_location_error('Invalid coordinates')
             return
-            
-        customer_group = f'customer_{ride.customer.id}'
-        await self.channel_layer.group_send(customer_group, {
-            'type': 'location_update',
-            'data': data
-        })
+
+        if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+            await self.send_location_error('Invalid coordinate values')
+            return
+        if heading is not None and not (0 <= heading <= 360):
+            heading = None
+        if speed is not None and speed < 0:
+            speed = None
+
+        driver_id = self.user_id
+        now = time.monotonic()
+        previous = self.last_fix
+        if previous:
+            elapsed = now - previous[0]
+            moved_m = calculate_distance(previous[1], previous[2], lat, lng) * 1000
+            if elapsed < getattr(settings, 'LOCATION_INGEST_MIN_INTERVAL_SECONDS', 2):
+                return
+            # A parked driver still checks in every LOCATION_INGEST_MAX_SILENCE_SECONDS
+            if (moved_m < getattr(settings, 'LOCATION_INGEST_MIN_DISTANCE_M', 10) and
+                    elapsed < getattr(settings, 'LOCATION_INGEST_MAX_SILENCE_SECONDS', 30)):
+                return
+        self.last_fix = (now, lat, lng)
+
+        await self.store_location(lat, lng, heading, speed)
+
+        ride_id = data.get('ride_id')
+        if ride_id:
+            await self.broadcast_driver_location(ride_id, {
+                'ride_id': ride_id,
+                'driver_id': driver_id,
+                'lat': lat,
+                'lng': lng,
+                'heading': heading,
+                'speed': speed,
+                'timestamp': data.get('timestamp')
+            })
+
+    async def send_location_error(self, message):
+        await self.send(text_data=json.dumps({
+            'type': 'location_error',
+            'data': {'message': message}
+        }))
+
+    async def broadcast_driver_location(self, ride_id, data):
+        try:
+            await ride_location_broadcaster.publish(self.channel_layer, ride_id, self.user_id, data)
+        except (TypeError, ValueError):
+            log.warning('location_invalid_ride', ride_id=ride_id)
 
     async def send_chat_to_customer(self, ride_id, data):
-        ride = await self.get_ride(ride_id)
-        if not ride or not ride.customer:
-            print(f"❌ [Driver WS] Cannot send chat - ride {ride_id} not found")
+        ride = await self.get_ride_participants(ride_id)
+        if not ride or not ride['customer_id']:
+            log.warning('chat_undeliverable', ride_id=ride_id, sender='driver')
+            return
+        user = await self.get_user()
+        if not user:
             return
         
-        customer_group = f'customer_{ride.customer.id}'
+        customer_group = f"customer_{ride['customer_id']}"
         message_data = {
-            'ride_id': ride.id,
+            'ride_id': ride['ride_id'],
             'message': data.get('message'),
-            'sender_id': self.user.id,
-            'sender_name': f"{self.user.first_name} {self.user.last_name}",
+            'sender_id': user.id,
+            'sender_name': f"{user.first_name} {user.last_name}",
             'sender_type': 'driver',  # Add this
             'timestamp': data.get('timestamp')
         }
@@ -239,134 +364,85 @@ class DriverConsumer(AsyncWebsocketConsumer):
             'type': 'driver_message',
             'data': message_data
         })
-        print(f"💬 [Driver WS] Sent chat to customer {ride.customer.id}: {data.get('message')}")
+        log.debug('chat_relayed', ride_id=ride['ride_id'], sender='driver', length=len(data.get('message') or ''))
 
     async def broadcast_ride_status_update(self, ride_id, data):
-        ride = await self.get_ride(ride_id)
-        if not ride or not ride.customer:
+        if data.get('status') in FINISHED_RIDE_STATUSES:
+            ride_location_broadcaster.forget(ride_id)
+        
+        ride = await self.get_ride_participants(ride_id)
+        if not ride or not ride['customer_id']:
             return
+        if data.get('status'):
+            ride['status'] = data['status']
             
-        customer_group = f'customer_{ride.customer.id}'
+        customer_group = f"customer_{ride['customer_id']}"
         await self.channel_layer.group_send(customer_group, {
             'type': 'ride_status_update',
             'data': data
         })
 
     
-    @database_sync_to_async
-    def get_user(self):
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        query_string = self.scope.get('query_string', b'').decode()
-        token = None
-        for param in query_string.split('&'):
-            if param.startswith('token='):
-                token = param.split('=')[1].replace(' ', '+')
-                break
-        if token:
-            try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-                user_id = payload.get('user_id')
-                if user_id:
-                    return User.objects.get(id=user_id)
-            except Exception as e:
-                print(f"❌ [Driver Auth] JWT error: {e}")
-        user = self.scope.get('user')
-        if user and user.is_authenticated:
-            return user
-        return None
+    async def get_user(self):
+        """Full user row for display fields; cached across connections for a short TTL"""
+        return await get_cached_user(self.user_id)
 
     @database_sync_to_async
-    def get_ride(self, ride_id):
-        from .models import Ride
-        try:
-            return Ride.objects.select_related('customer', 'driver').get(id=ride_id)
-        except Ride.DoesNotExist:
-            print(f"❌ [Driver WS] Ride {ride_id} not found")
-            return None
+    def store_location(self, lat, lng, heading, speed):
+        live_locations.record(self.user_id, lat, lng, heading=heading, speed=speed, is_online=True)
+
 
 
 #Customer Consumer
-class RideConsumer(AsyncWebsocketConsumer):
+class RideConsumer(RideParticipantsMixin, AsyncWebsocketConsumer):
 
     async def connect(self):
         try:
-            print(f"🟡 [Customer WS DEBUG] === STARTING CONNECTION ===")
-            
-          
             self.customer_id = self.scope['url_route']['kwargs']['id']
-            print(f"🟡 [Customer WS DEBUG] Customer ID from URL: {self.customer_id}")
-            
-           
-            query_string = self.scope.get('query_string', b'').decode()
-            print(f"🟡 [Customer WS DEBUG] Raw query string: {query_string}")
-            
-           
-            print(f"🟡 [Customer WS DEBUG] Calling get_user()...")
-            import asyncio
-            try:
-               
-                self.user = await asyncio.wait_for(self.get_user(), timeout=3.0)
-            except asyncio.TimeoutError:
-                print("❌ [Customer WS DEBUG] get_user() timed out!")
-                await self.close(code=4000)
-                return
-                
-            print(f"🟡 [Customer WS DEBUG] get_user() returned: {self.user}")
             
-            if not self.user:
-                print("❌ [Customer WS DEBUG] get_user() returned None - authentication failed")
-                await self.close(code=4001)
-                return
-            
-            print(f"🟡 [Customer WS DEBUG] User details: id={self.user.id}, type={getattr(self.user, 'user_type', 'NO_USER_TYPE')}")
-            
-            
-            if not hasattr(self.user, 'user_type'):
-                print(f"❌ [Customer WS DEBUG] User has no user_type attribute")
+            # Identity comes from the token claims set by JWTAuthMiddleware
+            self.user_id = self.scope.get('user_id')
+            self.user_type = self.scope.get('user_type')
+            if not self.user_id:
+                log.warning('customer_connect_rejected', reason='unauthenticated', customer_id=self.customer_id)
                 await self.close(code=4001)
                 return
                 
-            if self.user.user_type != 'customer':
-                print(f"❌ [Customer WS DEBUG] Wrong user type: {self.user.user_type} (expected: customer)")
+            if self.user_type != 'customer':
+                log.warning('customer_connect_rejected', reason='user_type', customer_id=self.customer_id, user_type=self.user_type)
                 await self.close(code=4001)
                 return
 
             
-            if str(self.user.id) != str(self.customer_id):
-                print(f"❌ [Customer WS DEBUG] ID mismatch: user.id={self.user.id} vs URL id={self.customer_id}")
+            if str(self.user_id) != str(self.customer_id):
+                log.warning('customer_connect_rejected', reason='id_mismatch', customer_id=self.customer_id, user_id=self.user_id)
                 await self.close(code=4003)
                 return
 
             
             self.customer_group_name = f'customer_{self.customer_id}'
-            print(f"🟡 [Customer WS DEBUG] Adding to group: {self.customer_group_name}")
             await self.channel_layer.group_add(self.customer_group_name, self.channel_name)
             
             await self.accept()
-            print(f"✅ [Customer WS DEBUG] CONNECTION SUCCESSFUL for customer {self.customer_id}")
+            log.info('customer_connected', customer_id=self.customer_id)
 
             await self.send(text_data=json.dumps({
                 'type': 'connection_established',
                 'data': {
                     'message': f'Customer {self.customer_id} connected',
                     'customer_id': self.customer_id,
-                    'user_type': self.user.user_type
+                    'user_type': self.user_type
                 }
             }))
 
-        except asyncio.TimeoutError:
-            print("❌ [Customer WS DEBUG] Connection timed out")
-            await self.close(code=4000)
-        except Exception as e:
-            print(f"❌ [Customer WS DEBUG] Connection error: {str(e)}")
-            import traceback
-            print(f"❌ [Customer WS DEBUG] Traceback: {traceback.format_exc()}")
+        except Exception:
+            log.exception('customer_connect_failed', customer_id=getattr(self, 'customer_id', None))
             await self.close(code=4000)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.customer_group_name, self.channel_name)
-        print(f"🔴 [Customer WS] Disconnected customer {self.customer_id}, code: {close_code}")
+        if hasattr(self, 'customer_group_name'):
+            await self.channel_layer.group_discard(self.customer_group_name, self.channel_name)
+        log.info('customer_disconnected', customer_id=getattr(self, 'customer_id', None), code=close_code)
 
     async def receive(self, text_data):
         try:
@@ -374,7 +450,7 @@ class RideConsumer(AsyncWebsocketConsumer):
             message_type = data_json.get('type')
             data = data_json.get('data', {})
 
-            print(f"📨 [Customer WS] Message type: {message_type}, data: {data}")
+            log.sampled('customer_frame', message_type=message_type, customer_id=self.customer_id)
 
             if message_type == 'ping':
                 await self.send(text_data=json.dumps({
@@ -385,7 +461,7 @@ class RideConsumer(AsyncWebsocketConsumer):
 
             
             elif message_type == 'customer_message':
-                print(f"🔍 [Customer WS] Received customer_message: {data}")
+                log.debug('customer_chat_received', ride_id=data.get('ride_id'))
                
                 ride_id = data.get('ride_id')
                 if ride_id:
@@ -393,7 +469,7 @@ class RideConsumer(AsyncWebsocketConsumer):
 
             elif message_type == 'chat_message':
                 ride_id = data.get('ride_id')
-                print(f"🔍 [Customer WS] Received chat_message for ride {ride_id}: {data}")
+                log.debug('customer_chat_received', ride_id=ride_id)
                 if ride_id:
                     await self.send_chat_to_driver(ride_id, data)
 
@@ -402,21 +478,20 @@ class RideConsumer(AsyncWebsocketConsumer):
                 if ride_id:
                     await self.broadcast_ride_status_update(ride_id, data)
 
-        except Exception as e:
-            print(f"❌ [Customer WS] Receive error: {e}")
+        except Exception:
+            log.exception('customer_receive_failed', customer_id=self.customer_id)
 
     
     async def driver_message(self, event):
-        print(f"💬 [Customer WS DRIVER_MESSAGE] Received message from driver: {event['data']}")
         await self.send(text_data=json.dumps({
             'type': 'driver_message', 
             'data': event['data']
         }))
-        print(f"✅ [Customer WS DRIVER_MESSAGE] Sent to customer frontend")
 
     
     async def ride_accepted(self, event):
-        print(f"✅ [Customer WS] Ride accepted: {event['data']}")
+        log.info('customer_ride_accepted', ride_id=event['data'].get('ride_id'), customer_id=self.customer_id)
+        self.forget_ride(event['data'].get('ride_id'))
         await self.send(text_data=json.dumps({
             'type': 'ride_accepted', 
             'data': event['data']
@@ -429,13 +504,13 @@ class RideConsumer(AsyncWebsocketConsumer):
         }))
 
     async def driver_message(self, event):
-        print(f"💬 [Customer WS] Received driver message: {event['data']}")
         await self.send(text_data=json.dumps({
             'type': 'driver_message', 
             'data': event['data']
         }))
 
     async def ride_status_update(self, event):
+        self.forget_ride(event['data'].get('ride_id'))
         await self.send(text_data=json.dumps({
             'type': 'ride_status_update',
             'data': event['data']
@@ -448,7 +523,7 @@ class RideConsumer(AsyncWebsocketConsumer):
         }))
 
     async def ride_declined(self, event):
-        print(f"❌ [Customer WS] Ride declined: {event['data']}")
+        log.info('customer_ride_declined', ride_id=event['data'].get('ride_id'), customer_id=self.customer_id)
         await self.send(text_data=json.dumps({
             'type': 'ride_declined',
             'data': event['data']
@@ -456,17 +531,20 @@ class RideConsumer(AsyncWebsocketConsumer):
 
     
     async def send_chat_to_driver(self, ride_id, data):
-        ride = await self.get_ride(ride_id)
-        if not ride or not ride.driver:
-            print(f"❌ [Customer WS] Cannot send chat - ride {ride_id} not found or no driver")
+        ride = await self.get_ride_participants(ride_id)
+        if not ride or not ride['driver_id']:
+            log.warning('chat_undeliverable', ride_id=ride_id, sender='customer')
+            return
+        user = await self.get_user()
+        if not user:
             return
 
-        driver_group = f'driver_{ride.driver.id}'
+        driver_group = f"driver_{ride['driver_id']}"
         message_data = {
-            'ride_id': ride.id,
+            'ride_id': ride['ride_id'],
             'message': data.get('message'),
-            'sender_id': self.user.id,
-            'sender_name': f"{self.user.first_name} {self.user.last_name}",
+            'sender_id': user.id,
+            'sender_name': f"{user.first_name} {user.last_name}",
             'sender_type': 'customer',  
             'timestamp': data.get('timestamp')
         }
@@ -475,86 +553,25 @@ class RideConsumer(AsyncWebsocketConsumer):
             'type': 'customer_message',
             'data': message_data
         })
-        print(f"💬 [Customer WS] Sent chat to driver {ride.driver.id}: {data.get('message')}")
+        log.debug('chat_relayed', ride_id=ride['ride_id'], sender='customer', length=len(data.get('message') or ''))
 
     async def broadcast_ride_status_update(self, ride_id, data):
-        ride = await self.get_ride(ride_id)
-        if not ride or not ride.driver:
+        ride = await self.get_ride_participants(ride_id)
+        if not ride or not ride['driver_id']:
             return
+        if data.get('status'):
+            ride['status'] = data['status']
             
-        driver_group = f'driver_{ride.driver.id}'
+        driver_group = f"driver_{ride['driver_id']}"
         await self.channel_layer.group_send(driver_group, {
             'type': 'ride_status_update',
             'data': data
         })
 
    
-    @database_sync_to_async
-    def get_user(self):
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        
-        print(f"🔍 [get_user DEBUG] Starting authentication...")
-        
-        query_string = self.scope.get('query_string', b'').decode()
-        print(f"🔍 [get_user DEBUG] Query string: {query_string}")
-        
-        token = None
-        for param in query_string.split('&'):
-            if param.startswith('token='):
-                token = param.split('=')[1]
-                token = token.replace(' ', '+')
-                break
-        
-        print(f"🔍 [get_user DEBUG] Token extracted: {bool(token)}")
-        if token:
-            print(f"🔍 [get_user DEBUG] Token length: {len(token)}")
-        
-        if token:
-            try:
-                import jwt
-                from django.conf import settings
-                
-                print(f"🔍 [get_user DEBUG] Decoding JWT token...")
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-                user_id = payload.get('user_id')
-                print(f"🔍 [get_user DEBUG] Token payload - user_id: {user_id}")
-                
-                if user_id:
-                    print(f"🔍 [get_user DEBUG] Looking up user in database...")
-                    user = User.objects.get(id=user_id)
-                    print(f"🔍 [get_user DEBUG] User found: {user.id}, user_type: {getattr(user, 'user_type', 'NO_TYPE')}")
-                    return user
-            except jwt.ExpiredSignatureError:
-                print("❌ [get_user] Token expired")
-            except jwt.InvalidTokenError as e:
-                print(f"❌ [get_user] Invalid token: {e}")
-            except User.DoesNotExist:
-                print(f"❌ [get_user] User {user_id} not found")
-            except Exception as e:
-                print(f"❌ [get_user] Unexpected error: {e}")
-                import traceback
-                print(f"❌ [get_user] Traceback: {traceback.format_exc()}")
-        
-       
-        user = self.scope.get('user')
-        print(f"🔍 [get_user DEBUG] Scope user: {user}, authenticated: {getattr(user, 'is_authenticated', False)}")
-        
-        if user and user.is_authenticated:
-            print(f"🔍 [get_user] Using scope user: {user.id}")
-            return user
-        
-        print("❌ [get_user] No valid authentication found")
-        return None
-
-    @database_sync_to_async
-    def get_ride(self, ride_id):
-        from .models import Ride
-        try:
-            return Ride.objects.select_related('customer', 'driver').get(id=ride_id)
-        except Ride.DoesNotExist:
-            print(f"❌ [Customer WS] Ride {ride_id} not found")
-            return None
+    async def get_user(self):
+        """Full user row for display fields; cached across connections for a short TTL"""
+        return await get_cached_user(self.user_id)
 
 
 
@@ -0,0 +1,68 @@
+from django.conf import settings
+
+from .models import ACTIVE_RIDE_STATUSES, RideOffer, User
+from .live_locations import live_locations
+
+
+def find_dispatch_candidates(pickup_lat, pickup_lng, vehicle_type, max_drivers=None, radii_km=None):
+    """Pick the nearest online, idle, approved drivers whose vehicle matches the ride.
+
+    The search starts with the smallest ring in ``radii_km`` and only widens to
+    the next one while fewer than ``max_drivers`` drivers have been found.
+    Returns ``(driver_id, distance_km)`` pairs, closest first.
+    """
+    if max_drivers is None:
+        max_drivers = getattr(settings, 'DISPATCH_MAX_DRIVERS', 5)
+    if radii_km is None:
+        radii_km = getattr(settings, 'DISPATCH_RADII_KM', [2, 5, 10, 20])
+
+    candidates = []
+    seen = set()
+    for radius in sorted(radii_km):
+        ring = [
+            (driver_id, distance)
+            for driver_id, distance in live_locations.nearby(pickup_lat, pickup_lng, radius)
+            if driver_id not in seen
+        ]
+        if not ring:
+            continue
+        seen.update(driver_id for driver_id, _ in ring)
+
+        eligible = set(
+            User.objects.filter(
+                id__in=[driver_id for driver_id, _ in ring],
+                user_type__in=['driver', 'boda_rider'],
+                approval_status='approved',
+                is_active=True,
+                vehicle__vehicle_type=vehicle_type,
+                driverlocation__is_online=True,
+            ).exclude(
+                driver_rides__status__in=ACTIVE_RIDE_STATUSES
+            ).values_list('id', flat=True)
+        )
+        candidates.extend(item for item in ring if item[0] in eligible)
+
+        if len(candidates) >= max_drivers:
+            break
+
+    return candidates[:max_drivers]
+
+
+def record_offers(ride_id, driver_ids):
+    """Remember which drivers were sent a ride request.
+
+    Stored in the database rather than the cache so whichever worker handles
+    the accept or cancel can tell the other drivers.
+    """
+    RideOffer.objects.bulk_create(
+        [RideOffer(ride_id=ride_id, driver_id=driver_id) for driver_id in driver_ids],
+        ignore_conflicts=True,
+    )
+
+
+def pop_offered_drivers(ride_id):
+    """Return the drivers a ride was offered to and forget them"""
+    offers = RideOffer.objects.filter(ride_id=ride_id)
+    driver_ids = list(offers.values_list('driver_id', flat=True))
+    offers.delete()
+    return driver_ids
@@ -0,0 +1,65 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:  # Fall back to the scalar formula when numpy isn't installed
+    np = None
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = 111.32
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two coordinates in kilometers using Haversine formula"""
+    R = EARTH_RADIUS_KM
+    
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    
+    a = (math.sin(delta_lat/2) * math.sin(delta_lat/2) +
+         math.cos(lat1_rad) * math.cos(lat2_rad) *
+         math.sin(delta_lon/2) * math.sin(delta_lon/2))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    
+    return R * c
+
+
+def distances_to_point(lats, lngs, lat, lng):
+    """Distances in km from every (lats[i], lngs[i]) to one point.
+
+    Vectorised with numpy when available; ``calculate_distance`` remains the
+    reference implementation and is used element by element otherwise.
+    """
+    if np is None:
+        return [calculate_distance(lat, lng, point_lat, point_lng)
+                for point_lat, point_lng in zip(lats, lngs)]
+
+    lat1 = np.radians(float(lat))
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    delta_lat = lat2 - lat1
+    delta_lon = np.radians(np.asarray(lngs, dtype=np.float64) - float(lng))
+
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def distance_matrix(lats1, lngs1, lats2, lngs2):
+    """Distances in km between every point of the first set and every point of the second.
+
+    Row ``i`` holds the distances from point ``i`` of the first set, e.g. a
+    driver×ride matrix from driver and ride pickup coordinates.
+    """
+    if np is None:
+        return [distances_to_point(lats2, lngs2, lat, lng) for lat, lng in zip(lats1, lngs1)]
+
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lng1 = np.asarray(lngs1, dtype=np.float64)[:, None]
+    lng2 = np.asarray(lngs2, dtype=np.float64)[None, :]
+    delta_lat = lat2 - lat1
+    delta_lon = np.radians(lng2 - lng1)
+
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
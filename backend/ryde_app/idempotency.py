@@ -0,0 +1,97 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .logs import get_logger
+
+log = get_logger('idempotency')
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path} {body}'.encode()).hexdigest()
+
+
+def _claim(request, digest, fingerprint):
+    """Insert the record for this key, or return the one already there as ``(record, False)``"""
+    from .models import IdempotencyRecord
+
+    scope = {'user': request.user, 'path': request.path[:255], 'key_digest': digest}
+    now = timezone.now()
+    # An expired record no longer protects its key
+    ttl = getattr(settings, 'IDEMPOTENCY_TTL_SECONDS', 24 * 3600)
+    IdempotencyRecord.objects.filter(created_at__lt=now - timedelta(seconds=ttl), **scope).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(fingerprint=fingerprint, locked_at=now, **scope), True
+    except IntegrityError:
+        return IdempotencyRecord.objects.filter(**scope).first(), False
+
+
+def _take_over(record):
+    """Claim an in-flight record whose holder has held it past ``IDEMPOTENCY_LOCK_SECONDS``"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 120))
+    return type(record).objects.filter(
+        id=record.id, status_code__isnull=True, locked_at__lt=stale
+    ).update(locked_at=now) == 1
+
+
+def _release(record):
+    type(record).objects.filter(id=record.id, status_code__isnull=True).delete()
+
+
+def idempotent(view):
+    """Replay the stored response when a request repeats its ``Idempotency-Key``.
+
+    Keys are scoped to the user and path. Requests without the header run as
+    usual. The first response below 500 is kept in ``IdempotencyRecord`` for
+    ``IDEMPOTENCY_TTL_SECONDS``; a retry gets it back unchanged without the
+    view running again, on any worker. Inserting the record is the lock, so a
+    duplicate arriving while the first is still running gets a 409. Goes under
+    ``@api_view`` so the request is already authenticated.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}, status=400)
+
+        fingerprint = _fingerprint(request)
+        record, claimed = _claim(request, hashlib.sha256(key.encode()).hexdigest(), fingerprint)
+        if not claimed:
+            if record is not None and record.fingerprint != fingerprint:
+                return Response({"error": f"{HEADER} was already used for a different request"}, status=422)
+            if record is not None and record.status_code is not None:
+                log.info('idempotent_replay', path=request.path, user_id=request.user.id, status=record.status_code)
+                return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+            if record is None or not _take_over(record):
+                return Response({"error": "A request with this Idempotency-Key is still being processed"}, status=409)
+            log.warning('idempotent_lock_taken_over', path=request.path, user_id=request.user.id)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            _release(record)
+            raise
+        if response.status_code < 500:
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=['status_code', 'response'])
+        else:
+            # Let a retry run the view again
+            _release(record)
+        return response
+
+    return wrapper
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from urllib.parse import parse_qs
+
+import jwt
+from cachetools import TTLCache
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .logs import get_logger
+
+log = get_logger('ws')
+
+
+def issue_tokens(user):
+    """Refresh token for ``user`` carrying the claims WebSocket auth reads.
+
+    Access tokens minted from it (including via token/refresh/) copy the
+    ``user_type`` claim, so sockets can authorise without loading the user.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh['user_type'] = user.user_type
+    return refresh
+
+
+def token_from_scope(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    token = (query.get('token') or [None])[0]
+    # '+' in the base64 segments arrives as a space when the client doesn't encode it
+    return token.replace(' ', '+') if token else None
+
+
+def decode_access_token(token):
+    """Return the claims of a valid access token, or None"""
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    except jwt.InvalidTokenError as e:
+        log.info('ws_token_rejected', error=str(e))
+        return None
+    if claims.get('token_type', 'access') != 'access':
+        return None
+    # simplejwt stores the id as a string; consumers compare it with integer ids
+    try:
+        claims['user_id'] = int(claims.get('user_id'))
+    except (TypeError, ValueError):
+        return None
+    return claims
+
+
+_user_cache = TTLCache(
+    maxsize=getattr(settings, 'WS_AUTH_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'WS_AUTH_USER_CACHE_TTL', 60),
+)
+_user_cache_lock = threading.Lock()
+_inflight = {}
+
+
+@database_sync_to_async
+def _load_user(user_id):
+    from .models import User
+    return User.objects.filter(id=user_id, is_active=True).first()
+
+
+async def _load_and_cache(user_id):
+    try:
+        user = await _load_user(user_id)
+        with _user_cache_lock:
+            _user_cache[user_id] = user
+        return user
+    finally:
+        _inflight.pop(user_id, None)
+
+
+def _retrieve_exception(task):
+    # Callers re-raise it; mark it retrieved so asyncio doesn't warn when they were all cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+async def get_cached_user(user_id):
+    """Load a user at most once per TTL; concurrent callers share one query.
+
+    The query runs as its own task, so a caller cancelled mid-load (e.g. the
+    socket disconnected) doesn't cancel it for everyone else waiting on it.
+    """
+    with _user_cache_lock:
+        if user_id in _user_cache:
+            return _user_cache[user_id]
+
+    task = _inflight.get(user_id)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(_load_and_cache(user_id))
+        task.add_done_callback(_retrieve_exception)
+        _inflight[user_id] = task
+    return await asyncio.shield(task)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Authenticate sockets from the ``?token=`` access token.
+
+    Adds ``user_id``, ``user_type`` and ``token_claims`` to the scope. The
+    token is decoded once per connection and no database query is needed
+    unless the token predates the ``user_type`` claim.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope['user_id'] = None
+        scope['user_type'] = None
+        scope['token_claims'] = None
+
+        token = token_from_scope(scope)
+        claims = decode_access_token(token) if token else None
+        if claims:
+            scope['token_claims'] = claims
+            scope['user_id'] = claims['user_id']
+            scope['user_type'] = claims.get('user_type')
+            if scope['user_type'] is None:
+                user = await get_cached_user(claims['user_id'])
+                if user is None:
+                    scope['user_id'] = None
+                else:
+                    scope['user_type'] = user.user_type
+
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return JWTAuthMiddleware(inner)
@@ -0,0 +1,340 @@
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from .spatial_index import driver_index
+from .logs import get_logger
+
+try:
+    import redis
+except ImportError:  # Only needed for the Redis backend
+    redis = None
+
+log = get_logger('locations')
+
+
+def _snapshot(driver_id, lat, lng, heading=None, speed=None, is_online=True, timestamp=None):
+    return {
+        'driver_id': int(driver_id),
+        'lat': float(lat),
+        'lng': float(lng),
+        'heading': None if heading is None else float(heading),
+        'speed': None if speed is None else float(speed),
+        'is_online': bool(is_online),
+        'timestamp': timestamp if timestamp is not None else time.time(),
+    }
+
+
+class MemoryLocationBackend:
+    """Per-process store used when Redis isn't configured (local development).
+
+    Nearby queries go through the grid index, which reloads from the database
+    periodically, so other workers' pings appear once they have been flushed.
+    """
+
+    def __init__(self):
+        self._latest = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def write(self, snapshot, mark_dirty=True):
+        driver_id = snapshot['driver_id']
+        with self._lock:
+            previous = self._latest.get(driver_id)
+            self._latest[driver_id] = snapshot
+            if mark_dirty:
+                self._dirty.add(driver_id)
+        driver_index.update(driver_id, snapshot['lat'], snapshot['lng'], snapshot['is_online'])
+        return previous['is_online'] if previous else None
+
+    def get_many(self, driver_ids):
+        with self._lock:
+            return {driver_id: self._latest[driver_id] for driver_id in driver_ids if driver_id in self._latest}
+
+    def nearby(self, lat, lng, radius_km, limit=None):
+        driver_index.ensure_fresh()
+        return driver_index.nearby(lat, lng, radius_km, limit=limit)
+
+    def take_dirty(self, limit):
+        with self._lock:
+            taken = []
+            while self._dirty and len(taken) < limit:
+                driver_id = self._dirty.pop()
+                if driver_id in self._latest:
+                    taken.append(self._latest[driver_id])
+            return taken
+
+    def restore_dirty(self, snapshots):
+        with self._lock:
+            self._dirty.update(snapshot['driver_id'] for snapshot in snapshots)
+
+    def acquire_flush_lock(self, seconds):
+        return True
+
+    def prune(self):
+        # The grid index reloads from the database, so nothing lingers here
+        return 0
+
+
+class RedisLocationBackend:
+    """Hot store in Redis: a GEO set of online drivers plus one hash per driver.
+
+    Pings only touch Redis; the ids of drivers with unflushed changes are kept
+    in a set that the periodic flush drains into the ``DriverLocation`` table.
+    GEO members don't expire on their own, so each online driver's last ping
+    time is also kept in a sorted set and ``prune`` drops the members whose
+    hash has expired.
+    """
+
+    GEO_KEY = 'ryde:live:geo'
+    SEEN_KEY = 'ryde:live:seen'
+    DIRTY_KEY = 'ryde:live:dirty'
+    FLUSH_LOCK_KEY = 'ryde:live:flush_lock'
+    PRUNE_BATCH = 1000
+
+    def __init__(self, url, ttl_seconds):
+        self.client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=1)
+        self.ttl_seconds = ttl_seconds
+
+    def _driver_key(self, driver_id):
+        return f'ryde:live:driver:{driver_id}'
+
+    @staticmethod
+    def _decode(driver_id, fields):
+        if not fields:
+            return None
+        return _snapshot(
+            driver_id, fields['lat'], fields['lng'],
+            heading=fields.get('heading') or None,
+            speed=fields.get('speed') or None,
+            is_online=fields.get('is_online') == '1',
+            timestamp=float(fields['timestamp']),
+        )
+
+    def write(self, snapshot, mark_dirty=True):
+        driver_id = snapshot['driver_id']
+        key = self._driver_key(driver_id)
+        pipe = self.client.pipeline()
+        pipe.hget(key, 'is_online')
+        pipe.hset(key, mapping={
+            'lat': snapshot['lat'],
+            'lng': snapshot['lng'],
+            'heading': '' if snapshot['heading'] is None else snapshot['heading'],
+            'speed': '' if snapshot['speed'] is None else snapshot['speed'],
+            'is_online': '1' if snapshot['is_online'] else '0',
+            'timestamp': snapshot['timestamp'],
+        })
+        pipe.expire(key, self.ttl_seconds)
+        if snapshot['is_online']:
+            pipe.geoadd(self.GEO_KEY, [snapshot['lng'], snapshot['lat'], driver_id])
+            pipe.zadd(self.SEEN_KEY, {driver_id: snapshot['timestamp']})
+        else:
+            pipe.zrem(self.GEO_KEY, driver_id)
+            pipe.zrem(self.SEEN_KEY, driver_id)
+        if mark_dirty:
+            pipe.sadd(self.DIRTY_KEY, driver_id)
+        previous = pipe.execute()[0]
+        return None if previous is None else previous == '1'
+
+    def get_many(self, driver_ids):
+        driver_ids = list(driver_ids)
+        pipe = self.client.pipeline()
+        for driver_id in driver_ids:
+            pipe.hgetall(self._driver_key(driver_id))
+        found = {}
+        for driver_id, fields in zip(driver_ids, pipe.execute()):
+            snapshot = self._decode(driver_id, fields)
+            if snapshot is not None:
+                found[driver_id] = snapshot
+        return found
+
+    def nearby(self, lat, lng, radius_km, limit=None):
+        results = self.client.geosearch(
+            self.GEO_KEY, longitude=lng, latitude=lat, radius=radius_km, unit='km',
+            sort='ASC', count=limit, withdist=True,
+        )
+        return [(int(member), float(distance)) for member, distance in results]
+
+    def take_dirty(self, limit):
+        driver_ids = self.client.spop(self.DIRTY_KEY, limit) or []
+        return list(self.get_many(int(driver_id) for driver_id in driver_ids).values())
+
+    def restore_dirty(self, snapshots):
+        if snapshots:
+            self.client.sadd(self.DIRTY_KEY, *[snapshot['driver_id'] for snapshot in snapshots])
+
+    def acquire_flush_lock(self, seconds):
+        # Only one worker drains the dirty set per interval
+        return bool(self.client.set(self.FLUSH_LOCK_KEY, '1', nx=True, ex=max(int(seconds), 1)))
+
+    def prune(self):
+        """Drop drivers not seen within the hash TTL from the GEO set; returns how many"""
+        cutoff = time.time() - self.ttl_seconds
+        pruned = 0
+        while True:
+            stale = self.client.zrangebyscore(self.SEEN_KEY, '-inf', cutoff, start=0, num=self.PRUNE_BATCH)
+            if not stale:
+                return pruned
+            pipe = self.client.pipeline()
+            pipe.zrem(self.GEO_KEY, *stale)
+            pipe.zrem(self.SEEN_KEY, *stale)
+            for driver_id in stale:
+                pipe.hgetall(self._driver_key(driver_id))
+            hashes = pipe.execute()[2:]
+
+            # A driver that pinged between the range read and the removal keeps its place
+            restore = self.client.pipeline()
+            revived = 0
+            for driver_id, fields in zip(stale, hashes):
+                snapshot = self._decode(driver_id, fields)
+                if snapshot and snapshot['is_online'] and snapshot['timestamp'] > cutoff:
+                    restore.geoadd(self.GEO_KEY, [snapshot['lng'], snapshot['lat'], driver_id])
+                    restore.zadd(self.SEEN_KEY, {driver_id: snapshot['timestamp']})
+                    revived += 1
+            if revived:
+                restore.execute()
+            pruned += len(stale) - revived
+            if len(stale) < self.PRUNE_BATCH:
+                return pruned
+
+
+class LiveLocationStore:
+    """Hot path for driver positions, written to ``DriverLocation`` in bulk.
+
+    ``record`` is cheap enough to call on every GPS ping. Going online or
+    offline is written through to the database immediately so dispatch
+    queries that filter on ``is_online`` never see a stale presence flag;
+    plain movement is batched until the next ``flush``.
+    """
+
+    def __init__(self, backend, flush_seconds=5, flush_batch=1000):
+        self.backend = backend
+        self.flush_seconds = flush_seconds
+        self.flush_batch = flush_batch
+        self._last_flush = time.monotonic()
+        self._last_prune = 0
+        self._flush_guard = threading.Lock()
+
+    def record(self, driver_id, lat, lng, heading=None, speed=None, is_online=True, persisted=False):
+        """Store a position; ``persisted`` means the caller already saved the row"""
+        snapshot = _snapshot(driver_id, lat, lng, heading, speed, is_online)
+        try:
+            previous_online = self.backend.write(snapshot, mark_dirty=not persisted)
+        except Exception as e:
+            log.warning('live_store_unavailable', error=str(e), driver_id=snapshot['driver_id'])
+            driver_index.update(snapshot['driver_id'], snapshot['lat'], snapshot['lng'], snapshot['is_online'])
+            if not persisted:
+                self._persist([snapshot])
+            return snapshot
+
+        if not persisted and previous_online != snapshot['is_online']:
+            self._persist([snapshot])
+        self.maybe_flush()
+        return snapshot
+
+    def get_many(self, driver_ids):
+        try:
+            return self.backend.get_many(driver_ids)
+        except Exception as e:
+            log.warning('live_lookup_failed', error=str(e))
+            return {}
+
+    def nearby(self, lat, lng, radius_km, limit=None):
+        """Return ``(driver_id, distance_km)`` pairs of online drivers, closest first"""
+        try:
+            # Searches may run while no pings (and so no flushes) arrive
+            if time.monotonic() - self._last_prune >= self.flush_seconds:
+                self.prune()
+            return self.backend.nearby(lat, lng, radius_km, limit=limit)
+        except Exception as e:
+            log.warning('live_nearby_failed', error=str(e))
+            driver_index.ensure_fresh()
+            return driver_index.nearby(lat, lng, radius_km, limit=limit)
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush < self.flush_seconds:
+            return 0
+        if not self._flush_guard.acquire(blocking=False):
+            return 0
+        try:
+            self._last_flush = time.monotonic()
+            if not self.backend.acquire_flush_lock(self.flush_seconds):
+                return 0
+            return self.flush()
+        except Exception:
+            log.exception('live_flush_failed')
+            return 0
+        finally:
+            self._flush_guard.release()
+
+    def prune(self):
+        """Forget drivers whose last ping has expired so searches stop returning them"""
+        self._last_prune = time.monotonic()
+        pruned = self.backend.prune()
+        if pruned:
+            log.info('live_locations_pruned', count=pruned)
+        return pruned
+
+    def flush(self):
+        """Write every pending position to ``DriverLocation``; returns the row count"""
+        self.prune()
+        written = 0
+        while True:
+            snapshots = self.backend.take_dirty(self.flush_batch)
+            if not snapshots:
+                return written
+            try:
+                self._persist(snapshots)
+            except Exception:
+                self.backend.restore_dirty(snapshots)
+                raise
+            written += len(snapshots)
+
+    def _persist(self, snapshots):
+        from .models import DriverLocation
+
+        by_driver = {snapshot['driver_id']: snapshot for snapshot in snapshots}
+        existing = DriverLocation.objects.in_bulk(list(by_driver), field_name='driver_id')
+
+        to_update = []
+        to_create = []
+        for driver_id, snapshot in by_driver.items():
+            fetched_at = datetime.fromtimestamp(snapshot['timestamp'], tz=dt_timezone.utc)
+            location = existing.get(driver_id)
+            if location is None:
+                to_create.append(DriverLocation(
+                    driver_id=driver_id, lat=snapshot['lat'], lng=snapshot['lng'],
+                    is_online=snapshot['is_online'],
+                ))
+                continue
+            location.lat = snapshot['lat']
+            location.lng = snapshot['lng']
+            location.is_online = snapshot['is_online']
+            location.last_updated = fetched_at
+            to_update.append(location)
+
+        if to_update:
+            DriverLocation.objects.bulk_update(to_update, ['lat', 'lng', 'is_online', 'last_updated'], batch_size=500)
+        if to_create:
+            DriverLocation.objects.bulk_create(to_create, ignore_conflicts=True)
+
+
+def _build_backend():
+    backend = getattr(settings, 'LIVE_LOCATION_BACKEND', 'memory')
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError("LIVE_LOCATION_BACKEND is 'redis' but the redis package isn't installed")
+        return RedisLocationBackend(
+            getattr(settings, 'REDIS_URL', 'redis://127.0.0.1:6379'),
+            ttl_seconds=getattr(settings, 'LIVE_LOCATION_TTL_SECONDS', 24 * 3600),
+        )
+    return MemoryLocationBackend()
+
+
+live_locations = LiveLocationStore(
+    _build_backend(),
+    flush_seconds=getattr(settings, 'LIVE_LOCATION_FLUSH_SECONDS', 5),
+    flush_batch=getattr(settings, 'LIVE_LOCATION_FLUSH_BATCH', 1000),
+)
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+from cachetools import TTLCache
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+_MISSING = (None, None)
+
+
+class RideLocationBroadcaster:
+    """Coalesces driver location frames into at most one customer update per interval.
+
+    Only the newest position per ride is kept. The first frame after a quiet
+    period goes out immediately; frames arriving within the interval replace
+    each other and the latest one is sent when the interval elapses.
+    """
+
+    def __init__(self, interval_seconds=1.0, mapping_ttl=4 * 3600, mapping_maxsize=10000):
+        self.interval_seconds = interval_seconds
+        self._participants = TTLCache(maxsize=mapping_maxsize, ttl=mapping_ttl)
+        self._participants_lock = threading.Lock()
+        self._latest = {}
+        # Only consulted within one interval of a send, so old entries can simply expire
+        self._last_sent = TTLCache(maxsize=mapping_maxsize, ttl=max(60, interval_seconds * 10))
+        self._pending = {}
+        self.received = 0
+        self.sent = 0
+
+    async def publish(self, channel_layer, ride_id, driver_id, data):
+        ride_id = int(ride_id)
+        customer_id, ride_driver_id = await self.get_participants(ride_id)
+        if customer_id is not None and ride_driver_id != driver_id:
+            # The ride may have been reassigned since it was cached
+            customer_id, ride_driver_id = await self.get_participants(ride_id, refresh=True)
+        if customer_id is None or ride_driver_id != driver_id:
+            return False
+
+        self.received += 1
+        self._latest[ride_id] = (customer_id, data)
+        if ride_id in self._pending:
+            return True
+
+        wait = self.interval_seconds - (time.monotonic() - self._last_sent.get(ride_id, 0))
+        if wait <= 0:
+            await self._emit(channel_layer, ride_id)
+        else:
+            self._pending[ride_id] = asyncio.ensure_future(self._emit_later(channel_layer, ride_id, wait))
+        return True
+
+    async def _emit_later(self, channel_layer, ride_id, wait):
+        try:
+            await asyncio.sleep(wait)
+            await self._emit(channel_layer, ride_id)
+        finally:
+            self._pending.pop(ride_id, None)
+
+    async def _emit(self, channel_layer, ride_id):
+        latest = self._latest.pop(ride_id, None)
+        if latest is None:
+            return
+        customer_id, data = latest
+        self._last_sent[ride_id] = time.monotonic()
+        self.sent += 1
+        await channel_layer.group_send(f'customer_{customer_id}', {
+            'type': 'location_update',
+            'data': data
+        })
+
+    async def get_participants(self, ride_id, refresh=False):
+        """Return ``(customer_id, driver_id)`` for the ride, from memory after the first lookup.
+
+        Only rides that have a driver are cached: a missing ride or one still
+        waiting to be accepted is looked up again on the next frame.
+        """
+        participants = None
+        if not refresh:
+            with self._participants_lock:
+                participants = self._participants.get(ride_id)
+        if participants is None:
+            participants = await self._load_participants(ride_id)
+            with self._participants_lock:
+                if participants[1] is None:
+                    self._participants.pop(ride_id, None)
+                else:
+                    self._participants[ride_id] = participants
+        return participants
+
+    @database_sync_to_async
+    def _load_participants(self, ride_id):
+        from .models import Ride
+        row = Ride.objects.filter(id=ride_id).values_list('customer_id', 'driver_id').first()
+        return row if row else _MISSING
+
+    def invalidate(self, ride_id):
+        """Drop the cached participants of a ride whose driver changed; safe from any thread"""
+        with self._participants_lock:
+            self._participants.pop(int(ride_id), None)
+
+    def forget(self, ride_id):
+        """Drop everything held for a ride, e.g. once it has been completed or cancelled"""
+        try:
+            ride_id = int(ride_id)
+        except (TypeError, ValueError):
+            return
+        with self._participants_lock:
+            self._participants.pop(ride_id, None)
+        self._latest.pop(ride_id, None)
+        self._last_sent.pop(ride_id, None)
+        pending = self._pending.pop(ride_id, None)
+        if pending is not None:
+            pending.cancel()
+
+    def stats(self):
+        return {
+            'frames_received': self.received,
+            'frames_sent': self.sent,
+            'frames_dropped': self.received - self.sent - len(self._latest),
+            'tracked_rides': len(self._participants),
+        }
+
+
+ride_location_broadcaster = RideLocationBroadcaster(
+    interval_seconds=getattr(settings, 'LOCATION_BROADCAST_INTERVAL_SECONDS', 1.0),
+    mapping_ttl=getattr(settings, 'LOCATION_BROADCAST_MAPPING_TTL', 4 * 3600),
+)
@@ -0,0 +1,106 @@
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+# Attributes every LogRecord has; anything else on a record came in through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class EventLogger:
+    """Structured logger for one ``ryde_app`` subsystem.
+
+    Calls take an event name plus keyword fields, e.g.
+    ``log.info('ride_requested', ride_id=ride.id)``. The level is checked
+    before anything is built, so disabled debug calls cost one comparison.
+    """
+
+    def __init__(self, subsystem):
+        self.logger = logging.getLogger(f'ryde_app.{subsystem}')
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+
+    def _log(self, level, event, fields, exc_info=False):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, exc_info=exc_info, stacklevel=3,
+                            extra={'event': event, 'fields': fields})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        """ERROR with the active exception's traceback attached"""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+    def sampled(self, event, level=logging.DEBUG, every=None, **fields):
+        """Log one in every ``every`` occurrences of a high-frequency event"""
+        if not self.logger.isEnabledFor(level):
+            return
+        every = every or getattr(settings, 'LOG_SAMPLE_EVERY', 100)
+        with self._counts_lock:
+            count = self._counts.get(event, 0) + 1
+            self._counts[event] = count
+        if count % every == 1 or every == 1:
+            fields['sample_rate'] = every
+            fields['occurrences'] = count
+            self._log(level, event, fields)
+
+
+def get_logger(subsystem):
+    return EventLogger(subsystem)
+
+
+def _record_fields(record):
+    fields = getattr(record, 'fields', None)
+    if fields is None:
+        # Records from plain logging calls: keep whatever was passed in ``extra``
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event and fields"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None) or record.getMessage(),
+        }
+        for key, value in _record_fields(record).items():
+            if key not in ('event', 'fields'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Readable single-line output for local development"""
+
+    def format(self, record):
+        parts = [
+            datetime.fromtimestamp(record.created).strftime('%H:%M:%S'),
+            record.levelname,
+            record.name,
+            getattr(record, 'event', None) or record.getMessage(),
+        ]
+        for key, value in _record_fields(record).items():
+            if key not in ('event', 'fields'):
+                parts.append(f'{key}={value}')
+        line = ' '.join(str(part) for part in parts)
+        if record.exc_info:
+            line = f'{line}\n{self.formatException(record.exc_info)}'
+        return line
@@ -0,0 +1,30 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ryde_app import ride_metrics
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyRideMetrics rollup from the rides table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        start_date = _parse_date(options['date_from']) if options['date_from'] else None
+        end_date = _parse_date(options['date_to']) if options['date_to'] else None
+
+        started = time.perf_counter()
+        written = ride_metrics.rebuild(start_date, end_date)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"📊 Wrote {written} daily metric row(s) in {elapsed_ms:.1f}ms")
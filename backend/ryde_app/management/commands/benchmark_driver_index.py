@@ -0,0 +1,82 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from ryde_app.geo import calculate_distance
+from ryde_app.spatial_index import DriverLocationIndex
+
+# Rough bounding box around Nairobi used to scatter synthetic drivers
+NAIROBI_BOUNDS = {
+    'min_lat': -1.45, 'max_lat': -1.15,
+    'min_lng': 36.65, 'max_lng': 37.05,
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare the driver grid index against the linear nearby-driver scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--radius', type=float, default=5.0)
+        parser.add_argument('--cell-km', type=float, default=1.0)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        radius = options['radius']
+
+        self.stdout.write(
+            f"{'drivers':>10} {'linear ms/q':>12} {'index ms/q':>12} {'speedup':>9} {'build ms':>10}"
+        )
+
+        for size in options['sizes']:
+            drivers = [
+                (
+                    driver_id,
+                    rng.uniform(NAIROBI_BOUNDS['min_lat'], NAIROBI_BOUNDS['max_lat']),
+                    rng.uniform(NAIROBI_BOUNDS['min_lng'], NAIROBI_BOUNDS['max_lng']),
+                )
+                for driver_id in range(size)
+            ]
+            queries = [
+                (
+                    rng.uniform(NAIROBI_BOUNDS['min_lat'], NAIROBI_BOUNDS['max_lat']),
+                    rng.uniform(NAIROBI_BOUNDS['min_lng'], NAIROBI_BOUNDS['max_lng']),
+                )
+                for _ in range(options['queries'])
+            ]
+
+            index = DriverLocationIndex(cell_km=options['cell_km'])
+            started = time.perf_counter()
+            index.rebuild(drivers)
+            build_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            linear_results = [self.linear_scan(drivers, lat, lng, radius) for lat, lng in queries]
+            linear_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+            started = time.perf_counter()
+            index_results = [index.nearby(lat, lng, radius) for lat, lng in queries]
+            index_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+            for expected, actual in zip(linear_results, index_results):
+                if [driver_id for driver_id, _ in expected] != [driver_id for driver_id, _ in actual]:
+                    self.stderr.write(self.style.ERROR(f"Result mismatch at {size} drivers"))
+                    break
+
+            speedup = linear_ms / index_ms if index_ms else float('inf')
+            self.stdout.write(
+                f"{size:>10} {linear_ms:>12.3f} {index_ms:>12.3f} {speedup:>8.1f}x {build_ms:>10.1f}"
+            )
+
+    def linear_scan(self, drivers, lat, lng, radius):
+        """Same loop get_nearby_drivers used before the index existed"""
+        results = []
+        for driver_id, driver_lat, driver_lng in drivers:
+            distance = calculate_distance(lat, lng, driver_lat, driver_lng)
+            if distance <= radius:
+                results.append((driver_id, distance))
+        results.sort(key=lambda item: item[1])
+        return results
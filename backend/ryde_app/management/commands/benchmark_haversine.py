@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ryde_app import geo
+from ryde_app.geo import calculate_distance, distances_to_point, distance_matrix
+from ryde_app.management.commands.benchmark_driver_index import NAIROBI_BOUNDS
+
+
+class Command(BaseCommand):
+    help = 'Compare the scalar haversine loop with the vectorised batch functions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--matrix', type=int, nargs=2, default=[500, 200],
+                            metavar=('DRIVERS', 'RIDES'))
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if geo.np is None:
+            raise CommandError('numpy is not installed; the batch functions are using the scalar fallback')
+
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'points':>10} {'scalar ms':>11} {'numpy ms':>10} {'speedup':>9} {'max err km':>12}")
+        for size in options['sizes']:
+            lats, lngs = self.random_points(rng, size)
+            lat, lng = self.random_points(rng, 1)
+            lat, lng = lat[0], lng[0]
+
+            scalar_ms, expected = self.time_best(repeat, lambda: [
+                calculate_distance(lat, lng, point_lat, point_lng)
+                for point_lat, point_lng in zip(lats, lngs)
+            ])
+            batch_ms, actual = self.time_best(repeat, lambda: distances_to_point(lats, lngs, lat, lng))
+
+            error = max(abs(a - b) for a, b in zip(expected, actual))
+            self.write_row(size, scalar_ms, batch_ms, error)
+
+        drivers, rides = options['matrix']
+        driver_lats, driver_lngs = self.random_points(rng, drivers)
+        ride_lats, ride_lngs = self.random_points(rng, rides)
+
+        scalar_ms, expected = self.time_best(repeat, lambda: [
+            [calculate_distance(d_lat, d_lng, r_lat, r_lng) for r_lat, r_lng in zip(ride_lats, ride_lngs)]
+            for d_lat, d_lng in zip(driver_lats, driver_lngs)
+        ])
+        batch_ms, actual = self.time_best(
+            repeat, lambda: distance_matrix(driver_lats, driver_lngs, ride_lats, ride_lngs)
+        )
+        error = max(abs(a - b) for row_a, row_b in zip(expected, actual) for a, b in zip(row_a, row_b))
+        self.write_row(f"{drivers}x{rides}", scalar_ms, batch_ms, error)
+
+    def random_points(self, rng, count):
+        lats = [rng.uniform(NAIROBI_BOUNDS['min_lat'], NAIROBI_BOUNDS['max_lat']) for _ in range(count)]
+        lngs = [rng.uniform(NAIROBI_BOUNDS['min_lng'], NAIROBI_BOUNDS['max_lng']) for _ in range(count)]
+        return lats, lngs
+
+    def time_best(self, repeat, func):
+        best = float('inf')
+        result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, (time.perf_counter() - started) * 1000)
+        return best, result
+
+    def write_row(self, label, scalar_ms, batch_ms, error):
+        # Anything beyond float rounding noise means the two formulas disagree
+        style = self.style.ERROR if error > 1e-9 else (lambda text: text)
+        speedup = scalar_ms / batch_ms if batch_ms else float('inf')
+        self.stdout.write(style(
+            f"{label:>10} {scalar_ms:>11.2f} {batch_ms:>10.2f} {speedup:>8.1f}x {error:>12.2e}"
+        ))
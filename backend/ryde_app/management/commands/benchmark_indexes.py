@@ -0,0 +1,252 @@
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from ryde_app.models import ACTIVE_RIDE_STATUSES, DriverLocation, Ride, User
+from ryde_app.management.commands.benchmark_driver_index import NAIROBI_BOUNDS
+
+INDEXED_MODELS = (Ride, User, DriverLocation)
+VEHICLE_TYPES = [choice for choice, _ in Ride.VEHICLE_TYPES]
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic rides and compare query plans and latencies without and with the model indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides', type=int, default=1000000)
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--drivers', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=365, help='Spread ride creation over this many days')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='', help='Write plans and timings to this JSON file')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        report = {}
+
+        # Everything happens in one transaction that is rolled back, so the
+        # database is left exactly as it was
+        with transaction.atomic():
+            self.drop_indexes()
+            started = time.perf_counter()
+            customers, drivers = self.seed(rng, options)
+            self.stdout.write(
+                f"Seeded {options['rides']} rides, {len(customers)} customers and {len(drivers)} drivers "
+                f"in {time.perf_counter() - started:.1f} s"
+            )
+            cases = self.cases(rng, customers, drivers, options['days'])
+
+            self.analyze()
+            report['before'] = self.measure(cases, options['repeat'])
+
+            started = time.perf_counter()
+            self.create_indexes()
+            self.analyze()
+            self.stdout.write(f"Built indexes in {time.perf_counter() - started:.1f} s")
+            report['after'] = self.measure(cases, options['repeat'])
+
+            transaction.set_rollback(True)
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def index_statements(self, build):
+        # A schema editor is only used to render SQL: entering one is refused
+        # inside an atomic block on SQLite
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in INDEXED_MODELS:
+                existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                for index in model._meta.indexes:
+                    if build and index.name not in existing:
+                        yield str(index.create_sql(model, editor))
+                    elif not build and index.name in existing:
+                        yield editor.sql_delete_index % {
+                            'name': editor.quote_name(index.name),
+                            'table': editor.quote_name(model._meta.db_table),
+                        }
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for sql in list(self.index_statements(build=False)):
+                cursor.execute(sql)
+
+    def create_indexes(self):
+        with connection.cursor() as cursor:
+            for sql in list(self.index_statements(build=True)):
+                cursor.execute(sql)
+
+    def analyze(self):
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def seed(self, rng, options):
+        tag = f"bench{rng.randrange(10 ** 8)}"
+        customers = User.objects.bulk_create(
+            [
+                User(email=f"{tag}-c{i}@example.com", password='!', user_type='customer')
+                for i in range(options['customers'])
+            ],
+            batch_size=options['batch_size'],
+        )
+        drivers = User.objects.bulk_create(
+            [
+                User(
+                    email=f"{tag}-d{i}@example.com", password='!',
+                    user_type=rng.choice(['driver', 'driver', 'driver', 'boda_rider']),
+                    approval_status=rng.choices(['approved', 'pending', 'rejected'], [85, 10, 5])[0],
+                    submitted_for_approval=True,
+                )
+                for i in range(options['drivers'])
+            ],
+            batch_size=options['batch_size'],
+        )
+        DriverLocation.objects.bulk_create(
+            [
+                DriverLocation(
+                    driver=driver,
+                    lat=rng.uniform(NAIROBI_BOUNDS['min_lat'], NAIROBI_BOUNDS['max_lat']),
+                    lng=rng.uniform(NAIROBI_BOUNDS['min_lng'], NAIROBI_BOUNDS['max_lng']),
+                    is_online=rng.random() < 0.3,
+                )
+                for driver in drivers
+            ],
+            batch_size=options['batch_size'],
+        )
+
+        # Keep the generated timestamps instead of stamping every row with now()
+        created_at = Ride._meta.get_field('created_at')
+        created_at.auto_now_add = False
+        try:
+            now = timezone.now()
+            remaining = options['rides']
+            while remaining:
+                count = min(remaining, options['batch_size'])
+                Ride.objects.bulk_create(
+                    [self.fake_ride(rng, customers, drivers, now, options['days']) for _ in range(count)]
+                )
+                remaining -= count
+        finally:
+            created_at.auto_now_add = True
+        return customers, drivers
+
+    def fake_ride(self, rng, customers, drivers, now, days):
+        status = rng.choices(
+            ['completed', 'cancelled', 'requested'] + ACTIVE_RIDE_STATUSES,
+            [84, 14, 0.5, 0.5, 0.5, 0.5],
+        )[0]
+        lat = rng.uniform(NAIROBI_BOUNDS['min_lat'], NAIROBI_BOUNDS['max_lat'])
+        lng = rng.uniform(NAIROBI_BOUNDS['min_lng'], NAIROBI_BOUNDS['max_lng'])
+        return Ride(
+            customer=rng.choice(customers),
+            driver=None if status == 'requested' else rng.choice(drivers),
+            vehicle_type=rng.choice(VEHICLE_TYPES),
+            pickup_lat=lat, pickup_lng=lng,
+            dropoff_lat=lat + rng.uniform(-0.05, 0.05), dropoff_lng=lng + rng.uniform(-0.05, 0.05),
+            pickup_address='Pickup', dropoff_address='Dropoff',
+            status=status,
+            fare=Decimal(rng.randrange(15000, 250000)) / 100,
+            created_at=now - timedelta(seconds=rng.uniform(0, days * 86400)),
+        )
+
+    def cases(self, rng, customers, drivers, days):
+        """``(name, queryset, run)`` for each hot query; ``run`` evaluates the queryset"""
+        driver = rng.choice(drivers)
+        customer = rng.choice(customers)
+        nearby = [d.id for d in rng.sample(drivers, min(50, len(drivers)))]
+        today = timezone.localdate()
+        week_start = timezone.now() - timedelta(days=7)
+        month_start = timezone.now() - timedelta(days=min(30, days))
+        totals = lambda qs: qs.aggregate(total=Sum('fare'), rides=Count('id'))
+        return [
+            ('available_rides', Ride.objects.filter(status='requested').order_by('-created_at')[:50], list),
+            (
+                'driver_current_ride',
+                Ride.objects.filter(driver=driver, status__in=ACTIVE_RIDE_STATUSES).order_by('-created_at')[:1],
+                list,
+            ),
+            (
+                'driver_weekly_earnings',
+                Ride.objects.filter(driver=driver, status='completed', created_at__gte=week_start),
+                totals,
+            ),
+            ('customer_history', Ride.objects.filter(customer=customer).order_by('-created_at', '-id')[:50], list),
+            ('admin_rides_by_status', Ride.objects.filter(status='cancelled').order_by('-created_at', '-id')[:20], list),
+            (
+                'report_top_drivers_30d',
+                Ride.objects.filter(status='completed', created_at__gte=month_start, driver__isnull=False)
+                .values('driver_id').annotate(total=Sum('fare')).order_by('-total')[:10],
+                list,
+            ),
+            (
+                'report_legacy_date_cast',
+                Ride.objects.filter(status='completed', created_at__date__gte=today - timedelta(days=30)),
+                totals,
+            ),
+            (
+                'dispatch_eligible_drivers',
+                User.objects.filter(
+                    id__in=nearby,
+                    user_type__in=['driver', 'boda_rider'],
+                    approval_status='approved',
+                    is_active=True,
+                    driverlocation__is_online=True,
+                ).exclude(driver_rides__status__in=ACTIVE_RIDE_STATUSES).values_list('id', flat=True),
+                list,
+            ),
+            ('online_drivers', DriverLocation.objects.filter(is_online=True).values_list('driver_id', 'lat', 'lng'), list),
+            (
+                'pending_drivers',
+                User.objects.filter(
+                    user_type__in=['driver', 'boda_rider'], approval_status='pending', submitted_for_approval=True
+                ).values_list('id', flat=True),
+                list,
+            ),
+        ]
+
+    def measure(self, cases, repeat):
+        results = {}
+        for name, queryset, run in cases:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = {
+                'plan': queryset.explain(),
+                'median_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            }
+        return results
+
+    def print_report(self, report):
+        before, after = report['before'], report['after']
+        self.stdout.write(
+            f"\n{'query':<28} {'before ms':>10} {'after ms':>10} {'speedup':>9} {'before p95':>11} {'after p95':>10}"
+        )
+        for name in before:
+            speedup = before[name]['median_ms'] / after[name]['median_ms'] if after[name]['median_ms'] else 0
+            self.stdout.write(
+                f"{name:<28} {before[name]['median_ms']:>10.3f} {after[name]['median_ms']:>10.3f} "
+                f"{speedup:>8.1f}x {before[name]['p95_ms']:>11.3f} {after[name]['p95_ms']:>10.3f}"
+            )
+        for name in before:
+            self.stdout.write(f"\n{name}\n  before:")
+            self.stdout.write('    ' + before[name]['plan'].replace('\n', '\n    '))
+            self.stdout.write('  after:')
+            self.stdout.write('    ' + after[name]['plan'].replace('\n', '\n    '))
@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ryde_app.geo import calculate_distance
+from ryde_app.road_routing import RoadGraph, DEFAULT_SPEEDS_KMH
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the local road-graph router against the haversine fallback'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--graph', default='', help='Compiled graph (defaults to ROUTING_GRAPH_PATH)')
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Benchmark an N×N synthetic street grid instead of a compiled graph')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        if options['synthetic']:
+            graph = self.synthetic_grid(options['synthetic'], rng)
+        else:
+            path = options['graph'] or getattr(settings, 'ROUTING_GRAPH_PATH', '')
+            if not path:
+                raise CommandError('Pass --graph, set ROUTING_GRAPH_PATH or use --synthetic N')
+            graph = RoadGraph.load(path)
+
+        self.stdout.write(f"Graph: {graph.node_count} nodes, {graph.edge_count} edges")
+
+        pairs = []
+        for _ in range(options['queries']):
+            source = rng.randrange(graph.node_count)
+            target = rng.randrange(graph.node_count)
+            pairs.append((graph.lats[source], graph.lngs[source], graph.lats[target], graph.lngs[target]))
+
+        started = time.perf_counter()
+        for start_lat, start_lng, end_lat, end_lng in pairs:
+            calculate_distance(start_lat, start_lng, end_lat, end_lng)
+        haversine_ms = (time.perf_counter() - started) * 1000 / len(pairs)
+
+        timings = []
+        distance_ratios = []
+        duration_ratios = []
+        unroutable = 0
+        for start_lat, start_lng, end_lat, end_lng in pairs:
+            started = time.perf_counter()
+            route = graph.route(start_lat, start_lng, end_lat, end_lng)
+            timings.append((time.perf_counter() - started) * 1000)
+
+            straight_km = calculate_distance(start_lat, start_lng, end_lat, end_lng)
+            if route is None:
+                unroutable += 1
+            elif straight_km > 0.1:
+                distance_ratios.append(route['distance'] / 1000 / straight_km)
+                # The old fallback assumed 2 minutes per straight-line km
+                duration_ratios.append(route['duration'] / 60 / (straight_km * 2))
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(f"haversine:  {haversine_ms:.4f} ms/query")
+        self.stdout.write(
+            f"road graph: p50 {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms, "
+            f"max {timings[-1]:.2f} ms, unroutable {unroutable}/{len(pairs)}"
+        )
+        if distance_ratios:
+            self.stdout.write(
+                f"road/straight distance: median {statistics.median(distance_ratios):.2f}x; "
+                f"road duration vs distance*2 estimate: median {statistics.median(duration_ratios):.2f}x"
+            )
+
+    def synthetic_grid(self, size, rng):
+        """Two-way street grid ~200 m apart around Nairobi CBD with mixed road classes"""
+        spacing = 0.0018
+        lats = []
+        lngs = []
+        for row in range(size):
+            for col in range(size):
+                lats.append(-1.2864 + (row - size / 2) * spacing)
+                lngs.append(36.8172 + (col - size / 2) * spacing)
+
+        edges = []
+        for row in range(size):
+            for col in range(size):
+                node = row * size + col
+                for neighbour in (node + 1 if col + 1 < size else None,
+                                  node + size if row + 1 < size else None):
+                    if neighbour is None:
+                        continue
+                    road = rng.choice(['primary', 'secondary', 'tertiary', 'residential', 'residential'])
+                    speed = DEFAULT_SPEEDS_KMH[road]
+                    edges.append((node, neighbour, speed))
+                    edges.append((neighbour, node, speed))
+        return RoadGraph.from_edges(lats, lngs, edges)
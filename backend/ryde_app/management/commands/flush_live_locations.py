@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ryde_app.live_locations import live_locations
+
+
+class Command(BaseCommand):
+    help = 'Write pending live driver positions to the DriverLocation table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep flushing every --interval seconds')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between flushes (defaults to LIVE_LOCATION_FLUSH_SECONDS)')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or live_locations.flush_seconds
+
+        while True:
+            started = time.perf_counter()
+            written = live_locations.flush()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if written or not options['loop']:
+                self.stdout.write(f"📍 Flushed {written} driver location(s) in {elapsed_ms:.1f}ms")
+            if not options['loop']:
+                return
+            time.sleep(interval)
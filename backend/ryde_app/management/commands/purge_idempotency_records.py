@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ryde_app.models import IdempotencyRecord
+
+
+class Command(BaseCommand):
+    help = 'Delete Idempotency-Key records older than IDEMPOTENCY_TTL_SECONDS'
+
+    def handle(self, *args, **options):
+        ttl = getattr(settings, 'IDEMPOTENCY_TTL_SECONDS', 24 * 3600)
+        deleted, _ = IdempotencyRecord.objects.filter(
+            created_at__lt=timezone.now() - timedelta(seconds=ttl)
+        ).delete()
+        self.stdout.write(f"Deleted {deleted} expired idempotency record(s)")
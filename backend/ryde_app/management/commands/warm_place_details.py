@@ -0,0 +1,111 @@
+import json
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ryde_app.maps_cache import geocode_cache, geocode_cache_key
+from ryde_app.maps_client import maps_client, MapsUnavailable
+from ryde_app.models import PlaceDetail
+from ryde_app.places import fetch_place_details, store_place
+
+DEFAULT_FIXTURE = Path(__file__).resolve().parents[2] / 'fixtures' / 'nairobi_landmarks.json'
+
+
+class Command(BaseCommand):
+    help = 'Pre-load the place-details store from a fixture of known landmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixture', nargs='?', default=str(DEFAULT_FIXTURE))
+        parser.add_argument('--refresh', action='store_true', help='Re-resolve places that are already stored')
+        parser.add_argument('--export', metavar='PATH', help='Write the stored places to PATH instead of warming')
+
+    def handle(self, *args, **options):
+        if options['export']:
+            return self.export(options['export'])
+
+        try:
+            with open(options['fixture']) as fixture:
+                entries = json.load(fixture)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read fixture {options['fixture']}: {e}")
+
+        loaded = fetched = skipped = failed = 0
+        fresh_since = timezone.now() - timedelta(days=getattr(settings, 'PLACE_DETAILS_TTL_DAYS', 90))
+
+        for entry in entries:
+            place_id = entry.get('place_id')
+            if place_id and not options['refresh'] and PlaceDetail.objects.filter(
+                place_id=place_id, fetched_at__gte=fresh_since
+            ).exists():
+                skipped += 1
+                continue
+
+            try:
+                if place_id and entry.get('lat') is not None and entry.get('lng') is not None:
+                    # Exported fixtures carry full details, so no API call is needed
+                    store_place(place_id, {
+                        'address': entry.get('address', ''),
+                        'name': entry.get('name', ''),
+                        'lat': entry['lat'],
+                        'lng': entry['lng'],
+                    })
+                    loaded += 1
+                elif place_id:
+                    if fetch_place_details(place_id):
+                        fetched += 1
+                    else:
+                        failed += 1
+                elif entry.get('query'):
+                    if self.resolve_query(entry):
+                        fetched += 1
+                    else:
+                        failed += 1
+                else:
+                    failed += 1
+            except MapsUnavailable as e:
+                self.stderr.write(f"Google Maps unavailable for {entry}: {e}")
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Place details warmed: {loaded} loaded, {fetched} fetched, {skipped} already fresh, {failed} failed"
+        ))
+
+    def resolve_query(self, entry):
+        """Geocode a landmark name and store it under the place id Google returns"""
+        data = maps_client.get('geocode', {'address': entry['query'], 'components': 'country:KE'})
+        if data['status'] != 'OK':
+            self.stderr.write(f"Could not resolve {entry['query']}: {data['status']}")
+            return False
+
+        result = data['results'][0]
+        location = result['geometry']['location']
+        store_place(result['place_id'], {
+            'address': result['formatted_address'],
+            'name': entry.get('name') or result['formatted_address'],
+            'lat': location['lat'],
+            'lng': location['lng'],
+        })
+        geocode_cache.set(geocode_cache_key(entry['query']), {
+            'lat': location['lat'],
+            'lng': location['lng'],
+            'display_name': result['formatted_address']
+        })
+        return True
+
+    def export(self, path):
+        places = [
+            {
+                'place_id': place.place_id,
+                'name': place.name,
+                'address': place.address,
+                'lat': place.lat,
+                'lng': place.lng,
+            }
+            for place in PlaceDetail.objects.order_by('name')
+        ]
+        with open(path, 'w') as output:
+            json.dump(places, output, indent=4)
+        self.stdout.write(self.style.SUCCESS(f"Exported {len(places)} places to {path}"))
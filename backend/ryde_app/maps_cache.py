@@ -0,0 +1,257 @@
+import hashlib
+import math
+import re
+import threading
+import time
+from datetime import datetime
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import calculate_distance, KM_PER_DEGREE_LAT
+
+COUNTRY_NAMES = {
+    'KE': 'kenya',
+}
+
+# Same rush-hour windows calculate_route uses for surge pricing
+TIME_OF_DAY_BUCKETS = [
+    ('am_peak', 7, 9),
+    ('pm_peak', 17, 19),
+    ('night', 22, 23),
+    ('night', 0, 5),
+]
+
+_registry = {}
+
+
+class TieredMapsCache:
+    """Two-level cache for Google Maps results.
+
+    A small per-process TTL/LRU tier answers repeat lookups without any I/O,
+    and Django's cache framework (Redis in production) shares results between
+    workers. Hit and miss counts are summed in process and added to counters
+    in the shared cache, so the numbers cover every worker, at most once per
+    ``stats_flush_seconds`` and only alongside a shared-cache call that is
+    being made anyway.
+    """
+
+    def __init__(self, namespace, ttl, local_maxsize=1024, stats_flush_seconds=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stats_flush_seconds = (
+            getattr(settings, 'MAPS_CACHE_STATS_FLUSH_SECONDS', 10)
+            if stats_flush_seconds is None else stats_flush_seconds
+        )
+        self._local = TTLCache(maxsize=local_maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._pending = {'hits': 0, 'misses': 0}
+        self._last_stats_flush = time.monotonic()
+        _registry[namespace] = self
+
+    def _shared_key(self, key):
+        return f"maps:{self.namespace}:{key}"
+
+    def _counter_key(self, counter):
+        return f"maps:{self.namespace}:stats:{counter}"
+
+    def _bump(self, counter):
+        with self._lock:
+            self._pending[counter] += 1
+
+    def _flush_stats(self, force=False):
+        """Add the counts gathered since the last flush to the shared counters"""
+        with self._lock:
+            if not force and time.monotonic() - self._last_stats_flush < self.stats_flush_seconds:
+                return
+            pending, self._pending = self._pending, {'hits': 0, 'misses': 0}
+            self._last_stats_flush = time.monotonic()
+        for counter, count in pending.items():
+            if not count:
+                continue
+            key = self._counter_key(counter)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, timeout=None):
+                    cache.incr(key, count)
+
+    def get(self, key):
+        with self._lock:
+            value = self._local.get(key)
+        if value is not None:
+            self._bump('hits')
+            return value
+
+        value = cache.get(self._shared_key(key))
+        if value is not None:
+            with self._lock:
+                self._local[key] = value
+        self._bump('hits' if value is not None else 'misses')
+        self._flush_stats()
+        return value
+
+    def get_many(self, keys):
+        """Fetch several keys with at most one shared-cache round trip.
+
+        Unlike ``get`` this does not touch the hit/miss counters; callers
+        that treat the batch as a single lookup should call ``record``.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._local.get(key)
+                if value is not None:
+                    found[key] = value
+
+        missing = {self._shared_key(key): key for key in keys if key not in found}
+        if missing:
+            for shared_key, value in cache.get_many(list(missing)).items():
+                key = missing[shared_key]
+                found[key] = value
+                with self._lock:
+                    self._local[key] = value
+            self._flush_stats()
+        return found
+
+    def record(self, hit):
+        self._bump('hits' if hit else 'misses')
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._local[key] = value
+        cache.set(self._shared_key(key), value, timeout=ttl or self.ttl)
+        self._flush_stats()
+
+    def stats(self):
+        # Other workers' counts arrive with their next flush
+        self._flush_stats(force=True)
+        hits = cache.get(self._counter_key('hits'), 0)
+        misses = cache.get(self._counter_key('misses'), 0)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0,
+            'saved_api_calls': hits,
+            'local_entries': len(self._local),
+        }
+
+
+def normalize_address(address, country='KE'):
+    """Fold case, punctuation and spacing so equivalent addresses share a key"""
+    text = address.lower()
+    text = re.sub(r"[^\w\s,]", ' ', text)
+    parts = [re.sub(r'\s+', ' ', part).strip() for part in text.split(',')]
+    parts = [part for part in parts if part]
+
+    country_name = COUNTRY_NAMES.get(country)
+    if country_name and parts and parts[-1] == country_name:
+        parts.pop()
+    return ', '.join(parts)
+
+
+def geocode_cache_key(address, country='KE'):
+    digest = hashlib.sha1(normalize_address(address, country).encode('utf-8')).hexdigest()
+    return f"{country.lower()}:{digest}"
+
+
+geocode_cache = TieredMapsCache(
+    'geocode',
+    ttl=getattr(settings, 'GEOCODE_CACHE_TTL', 7 * 24 * 3600),
+    local_maxsize=getattr(settings, 'GEOCODE_CACHE_LOCAL_MAXSIZE', 2048),
+)
+
+
+def snap_coordinate(value, precision_m):
+    """Round a latitude/longitude onto a grid of roughly ``precision_m`` metres"""
+    step = precision_m / (KM_PER_DEGREE_LAT * 1000)
+    return round(round(float(value) / step) * step, 6)
+
+
+def time_of_day_bucket(now=None):
+    hour = (now or datetime.now()).hour
+    for name, first_hour, last_hour in TIME_OF_DAY_BUCKETS:
+        if first_hour <= hour <= last_hour:
+            return name
+    return 'offpeak'
+
+
+def route_cache_key(start_lat, start_lng, end_lat, end_lng, now=None):
+    precision_m = getattr(settings, 'ROUTE_CACHE_PRECISION_M', 50)
+    origin = f"{snap_coordinate(start_lat, precision_m)},{snap_coordinate(start_lng, precision_m)}"
+    destination = f"{snap_coordinate(end_lat, precision_m)},{snap_coordinate(end_lng, precision_m)}"
+    return f"{time_of_day_bucket(now)}:{origin}:{destination}"
+
+
+route_cache = TieredMapsCache(
+    'route',
+    ttl=getattr(settings, 'ROUTE_CACHE_TTL', 6 * 3600),
+    local_maxsize=getattr(settings, 'ROUTE_CACHE_LOCAL_MAXSIZE', 2048),
+)
+
+
+def reverse_geocode_cell(lat, lng, cell_m):
+    step = cell_m / (KM_PER_DEGREE_LAT * 1000)
+    return (math.floor(float(lat) / step), math.floor(float(lng) / step))
+
+
+def _cell_key(cell):
+    return f"{cell[0]}:{cell[1]}"
+
+
+reverse_geocode_cache = TieredMapsCache(
+    'reverse_geocode',
+    ttl=getattr(settings, 'REVERSE_GEOCODE_CACHE_TTL', 7 * 24 * 3600),
+    local_maxsize=getattr(settings, 'REVERSE_GEOCODE_LOCAL_MAXSIZE', 8192),
+)
+
+
+def get_cached_reverse_geocode(lat, lng):
+    """Return the cached result for the point's grid cell, or the nearest one.
+
+    The exact cell is preferred; otherwise every neighbouring cell within
+    ``REVERSE_GEOCODE_TOLERANCE_M`` is fetched in one batch and the cached
+    point closest to ``lat``/``lng`` wins.
+    """
+    cell_m = getattr(settings, 'REVERSE_GEOCODE_CELL_M', 50)
+    tolerance_m = getattr(settings, 'REVERSE_GEOCODE_TOLERANCE_M', 100)
+    row, col = reverse_geocode_cell(lat, lng, cell_m)
+    reach = max(int(math.ceil(tolerance_m / cell_m)), 0)
+
+    keys = [
+        _cell_key((row + d_row, col + d_col))
+        for d_row in range(-reach, reach + 1)
+        for d_col in range(-reach, reach + 1)
+    ]
+    found = reverse_geocode_cache.get_many(keys)
+
+    exact = found.get(_cell_key((row, col)))
+    if exact is not None:
+        reverse_geocode_cache.record(True)
+        return exact
+
+    best = None
+    best_distance_m = tolerance_m
+    for value in found.values():
+        distance_m = calculate_distance(lat, lng, value['lat'], value['lng']) * 1000
+        if distance_m <= best_distance_m:
+            best, best_distance_m = value, distance_m
+
+    reverse_geocode_cache.record(best is not None)
+    return best
+
+
+def store_reverse_geocode(lat, lng, formatted_address):
+    cell_m = getattr(settings, 'REVERSE_GEOCODE_CELL_M', 50)
+    reverse_geocode_cache.set(_cell_key(reverse_geocode_cell(lat, lng, cell_m)), {
+        'formatted_address': formatted_address,
+        'lat': float(lat),
+        'lng': float(lng),
+    })
+
+
+def maps_cache_stats():
+    """Hit/miss numbers for every maps cache, keyed by namespace"""
+    return {namespace: maps_cache.stats() for namespace, maps_cache in _registry.items()}
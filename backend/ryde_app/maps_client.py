@@ -0,0 +1,200 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+GOOGLE_MAPS_ENDPOINTS = {
+    'geocode': 'https://maps.googleapis.com/maps/api/geocode/json',
+    'directions': 'https://maps.googleapis.com/maps/api/directions/json',
+    'autocomplete': 'https://maps.googleapis.com/maps/api/place/autocomplete/json',
+    'place_details': 'https://maps.googleapis.com/maps/api/place/details/json',
+}
+
+# Google statuses that mean "try again later" rather than "bad request"
+RETRYABLE_STATUSES = {'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR'}
+
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class MapsUnavailable(Exception):
+    """Google Maps could not be reached, or the circuit for the endpoint is open"""
+
+
+class CircuitBreaker:
+    """Stop calling an endpoint after repeated failures and probe it again later.
+
+    Once ``reset_seconds`` have passed the circuit is half-open: exactly one
+    caller is let through as a trial. Its success closes the circuit and its
+    failure re-opens it; everyone else is refused meanwhile.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_seconds:
+                return False
+            # A trial that never reported back doesn't block the circuit forever
+            if self.probe_started_at is not None and now - self.probe_started_at < self.reset_seconds:
+                return False
+            self.probe_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+                self.probe_started_at = None
+
+
+class LatencyHistogram:
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.total_ms = 0.0
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def observe(self, elapsed_ms):
+        with self._lock:
+            for position, bound in enumerate(self.buckets_ms):
+                if elapsed_ms <= bound:
+                    self.counts[position] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.total_ms += elapsed_ms
+            self.samples += 1
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+            return {
+                'count': self.samples,
+                'avg_ms': round(self.total_ms / self.samples, 2) if self.samples else 0,
+                'buckets': dict(zip(labels, self.counts)),
+            }
+
+
+class GoogleMapsClient:
+    """Shared keep-alive client for every Google Maps web service call"""
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=len(GOOGLE_MAPS_ENDPOINTS),
+            pool_maxsize=getattr(settings, 'MAPS_POOL_SIZE', 20),
+        )
+        self.session.mount('https://', adapter)
+        self.max_retries = getattr(settings, 'MAPS_MAX_RETRIES', 2)
+        self.backoff_seconds = getattr(settings, 'MAPS_RETRY_BACKOFF_SECONDS', 0.2)
+        self.timeout = (
+            getattr(settings, 'MAPS_CONNECT_TIMEOUT', 2),
+            getattr(settings, 'MAPS_READ_TIMEOUT', 4),
+        )
+        self.deadline_seconds = getattr(settings, 'MAPS_CALL_DEADLINE_SECONDS', 6)
+        self.breakers = {
+            endpoint: CircuitBreaker(
+                failure_threshold=getattr(settings, 'MAPS_BREAKER_FAILURES', 5),
+                reset_seconds=getattr(settings, 'MAPS_BREAKER_RESET_SECONDS', 30),
+            )
+            for endpoint in GOOGLE_MAPS_ENDPOINTS
+        }
+        self.latency = {endpoint: LatencyHistogram() for endpoint in GOOGLE_MAPS_ENDPOINTS}
+
+    def get(self, endpoint, params, timeout=None, deadline=None, retry_read_timeouts=False):
+        """Call a Maps endpoint and return the decoded JSON body.
+
+        Connection errors, 5xx responses and retryable Google statuses are
+        retried with jittered exponential backoff, all within ``deadline``
+        seconds (``MAPS_CALL_DEADLINE_SECONDS``) for the whole call. A read
+        timeout means Google is slow rather than unreachable, so it is only
+        retried with ``retry_read_timeouts``. Every failed attempt counts
+        towards the endpoint's circuit breaker. Raises ``MapsUnavailable``
+        when the call fails or while the circuit is open.
+        """
+        breaker = self.breakers[endpoint]
+        if not breaker.allow():
+            raise MapsUnavailable(f"{endpoint} circuit open")
+
+        params = dict(params, key=settings.GOOGLE_API_KEY)
+        timeout = timeout or self.timeout
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        give_up_at = time.monotonic() + (deadline or self.deadline_seconds)
+        last_error = None
+        attempts = 0
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = random.uniform(0, self.backoff_seconds * (2 ** attempt))
+                if time.monotonic() + delay >= give_up_at:
+                    break
+                time.sleep(delay)
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                break
+
+            attempts += 1
+            started = time.perf_counter()
+            try:
+                response = self.session.get(
+                    GOOGLE_MAPS_ENDPOINTS[endpoint], params=params,
+                    timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)),
+                )
+                response.raise_for_status()
+                data = response.json()
+                if data.get('status') in RETRYABLE_STATUSES:
+                    raise MapsUnavailable(f"{endpoint} returned {data['status']}")
+            except (requests.exceptions.RequestException, ValueError, MapsUnavailable) as e:
+                last_error = e
+                breaker.record_failure()
+                if breaker.state == 'open':
+                    break
+                if isinstance(e, requests.exceptions.ReadTimeout) and not retry_read_timeouts:
+                    break
+                continue
+            finally:
+                self.latency[endpoint].observe((time.perf_counter() - started) * 1000)
+
+            breaker.record_success()
+            return data
+
+        raise MapsUnavailable(f"{endpoint} failed after {attempts} attempt(s): {last_error}")
+
+    def stats(self):
+        return {
+            endpoint: {
+                'circuit': self.breakers[endpoint].state,
+                'latency': self.latency[endpoint].snapshot(),
+            }
+            for endpoint in GOOGLE_MAPS_ENDPOINTS
+        }
+
+
+maps_client = GoogleMapsClient()
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ryde_app', '0013_alter_emergencyrequest_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceDetail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('place_id', models.CharField(max_length=255, unique=True)),
+                ('address', models.TextField(blank=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('lat', models.FloatField(blank=True, null=True)),
+                ('lng', models.FloatField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
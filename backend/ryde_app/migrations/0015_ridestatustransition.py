@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ryde_app', '0014_placedetail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideStatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(max_length=30)),
+                ('to_status', models.CharField(max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ride', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='ryde_app.ride')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
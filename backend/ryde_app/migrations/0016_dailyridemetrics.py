@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:14
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_metrics(apps, schema_editor):
+    Ride = apps.get_model('ryde_app', 'Ride')
+    DailyRideMetrics = apps.get_model('ryde_app', 'DailyRideMetrics')
+    rows = Ride.objects.annotate(day=TruncDate('created_at')).values(
+        'day', 'vehicle_type', 'service_type', 'status'
+    ).annotate(ride_count=Count('id'), fare_total=Sum('fare')).order_by()
+    DailyRideMetrics.objects.bulk_create(
+        [DailyRideMetrics(**dict(row, fare_total=row['fare_total'] or 0)) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ryde_app', '0015_ridestatustransition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRideMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('vehicle_type', models.CharField(max_length=20)),
+                ('service_type', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=30)),
+                ('ride_count', models.IntegerField(default=0)),
+                ('fare_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'vehicle_type', 'service_type', 'status'), name='unique_daily_ride_metrics_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ryde_app', '0018_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ride', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='ryde_app.ride')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ride', 'driver'), name='unique_ride_offer')],
+            },
+        ),
+    ]
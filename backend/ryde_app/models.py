@@ -1,4 +1,5 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from cloudinary_storage.storage import RawMediaCloudinaryStorage
 
@@ -105,6 +106,13 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Driver approval queues and dispatch eligibility
+            models.Index(fields=['user_type', 'approval_status'], name='user_type_approval_idx'),
+            models.Index(fields=['created_at'], name='user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.email} ({self.user_type})"
 
@@ -147,6 +155,10 @@ class Vehicle(models.Model):
         default='pending'
     )
 
+# Statuses in which a driver is busy with a ride
+ACTIVE_RIDE_STATUSES = ['accepted', 'driver_arrived', 'driving_to_destination']
+
+
 class Ride(models.Model):
     STATUS_CHOICES = [
         ('requested', 'Requested'),
@@ -216,6 +228,26 @@ class Ride(models.Model):
     distance_km = models.FloatField(null=True, blank=True)
     duration_minutes = models.IntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Admin status filter, reports and rollup backfills over a date range
+            models.Index(fields=['status', 'created_at'], name='ride_status_created_idx'),
+            # Driver dashboard and earnings
+            models.Index(fields=['driver', 'status', 'created_at'], name='ride_driver_status_created_idx'),
+            # Customer ride history and stats
+            models.Index(fields=['customer', 'created_at'], name='ride_customer_created_idx'),
+            # Dispatch's busy-driver check: only the handful of in-progress rides
+            models.Index(
+                fields=['driver'], name='ride_active_driver_idx',
+                condition=models.Q(status__in=ACTIVE_RIDE_STATUSES),
+            ),
+            # Open requests polled by drivers
+            models.Index(
+                fields=['created_at'], name='ride_requested_idx',
+                condition=models.Q(status='requested'),
+            ),
+        ]
+
     def __str__(self):
         return f"Ride {self.id} - {self.customer.email}"
 
@@ -237,6 +269,80 @@ class RideMessage(models.Model):
     class Meta:
         ordering = ['timestamp']
 
+
+class RideStatusTransition(models.Model):
+    ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='transitions')
+    from_status = models.CharField(max_length=30)
+    to_status = models.CharField(max_length=30)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Ride {self.ride_id}: {self.from_status} -> {self.to_status}"
+
+
+class RideOffer(models.Model):
+    """A driver who was sent a ride request, so the others can be told once it is taken"""
+    ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='offers')
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ride', 'driver'], name='unique_ride_offer'),
+        ]
+
+    def __str__(self):
+        return f"Ride {self.ride_id} offered to {self.driver_id}"
+
+
+class DailyRideMetrics(models.Model):
+    """Ride counts and fare totals per day (of ``created_at``), vehicle, service and status"""
+    day = models.DateField()
+    vehicle_type = models.CharField(max_length=20)
+    service_type = models.CharField(max_length=20)
+    status = models.CharField(max_length=30)
+    ride_count = models.IntegerField(default=0)
+    fare_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'vehicle_type', 'service_type', 'status'],
+                name='unique_daily_ride_metrics_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.vehicle_type}/{self.service_type}/{self.status}: {self.ride_count}"
+
+
+class IdempotencyRecord(models.Model):
+    """Outcome of a request sent with an ``Idempotency-Key``; ``status_code`` is null while it runs"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    path = models.CharField(max_length=255)
+    key_digest = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    locked_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'path', 'key_digest'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.path} {self.key_digest[:12]}: {self.status_code or 'in flight'}"
+
 class EmergencyRequest(models.Model):
     SERVICE_TYPES = [
         ('ambulance', 'Ambulance'),
@@ -277,6 +383,15 @@ class DriverLocation(models.Model):
         related_name='active_driver'
     )  
 
+    class Meta:
+        indexes = [
+            # Online drivers only; covers the spatial index reload without touching the table
+            models.Index(
+                fields=['driver', 'lat', 'lng'], name='driverloc_online_idx',
+                condition=models.Q(is_online=True),
+            ),
+        ]
+
 
 class RideRating(models.Model):
     ride = models.OneToOneField(Ride, on_delete=models.CASCADE, related_name='rating')
@@ -417,3 +532,23 @@ class NotificationPreference(models.Model):
 
 
 
+
+
+class PlaceDetail(models.Model):
+    place_id = models.CharField(max_length=255, unique=True)
+    address = models.TextField(blank=True)
+    name = models.CharField(max_length=255, blank=True)
+    lat = models.FloatField(null=True, blank=True)
+    lng = models.FloatField(null=True, blank=True)
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name or self.address} ({self.place_id})"
+
+    def as_response(self):
+        return {
+            'address': self.address,
+            'name': self.name,
+            'lat': self.lat,
+            'lng': self.lng,
+        }
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+_SALT = 'ryde_app.pagination'
+
+
+class CursorError(Exception):
+    """The cursor was malformed or tampered with"""
+
+
+def _encode(position, page):
+    return signing.dumps([position, page], salt=_SALT, compress=True)
+
+
+def _decode(cursor):
+    try:
+        (timestamp, pk), page = signing.loads(cursor, salt=_SALT)
+        return datetime.fromisoformat(timestamp), pk, int(page)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise CursorError("Invalid cursor")
+
+
+def wants_page(request):
+    """Whether the client asked for a page (``cursor`` or ``page_size``) rather than the whole list"""
+    return 'cursor' in request.GET or 'page_size' in request.GET
+
+
+def page_size_from(request, default=None, maximum=None):
+    default = default or getattr(settings, 'PAGINATION_DEFAULT_PAGE_SIZE', 20)
+    maximum = maximum or getattr(settings, 'PAGINATION_MAX_PAGE_SIZE', 200)
+    try:
+        size = int(request.GET.get('page_size', default))
+    except ValueError:
+        raise CursorError("page_size must be a number")
+    return max(1, min(size, maximum))
+
+
+def count_up_to(queryset, cap=None):
+    """Row count that stops at ``cap``; returns ``(count, is_estimate)``"""
+    cap = cap or getattr(settings, 'PAGINATION_COUNT_CAP', 10000)
+    count = queryset.order_by()[:cap].count()
+    return count, count >= cap
+
+
+def paginate(queryset, request, field='created_at', descending=True, page_size=None, with_total=False):
+    """One keyset page of ``queryset`` ordered by ``(field, id)``.
+
+    The ``cursor`` query parameter continues from the last row of the previous
+    page, so a deep page costs the same as the first. Returns a dict with
+    ``items``, ``next_cursor`` (None on the last page), ``page`` and
+    ``page_size``; ``with_total`` adds a ``total`` capped at
+    ``PAGINATION_COUNT_CAP`` and a ``total_is_estimate`` flag. Raises
+    ``CursorError`` for a bad cursor or page size.
+    """
+    size = page_size or page_size_from(request)
+    page = 1
+    rows = queryset
+    cursor = request.GET.get('cursor')
+    if cursor:
+        value, pk, previous_page = _decode(cursor)
+        page = previous_page + 1
+        if descending:
+            after = Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk})
+        else:
+            after = Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+        rows = rows.filter(after)
+
+    prefix = '-' if descending else ''
+    items = list(rows.order_by(f'{prefix}{field}', f'{prefix}id')[:size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = _encode([getattr(last, field).isoformat(), last.id], page)
+
+    result = {'items': items, 'next_cursor': next_cursor, 'page': page, 'page_size': size}
+    if with_total:
+        result['total'], result['total_is_estimate'] = count_up_to(queryset)
+    return result
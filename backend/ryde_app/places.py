@@ -0,0 +1,78 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .maps_cache import TieredMapsCache
+from .maps_client import maps_client
+from .models import PlaceDetail
+
+place_details_cache = TieredMapsCache(
+    'place_details',
+    ttl=getattr(settings, 'PLACE_DETAILS_HOT_TTL', 24 * 3600),
+    local_maxsize=getattr(settings, 'PLACE_DETAILS_LOCAL_MAXSIZE', 2048),
+)
+
+
+def _cache_key(place_id):
+    return hashlib.sha1(place_id.encode('utf-8')).hexdigest()
+
+
+def get_stored_place(place_id):
+    """Look a place up in the hot tier, then in the PlaceDetail table"""
+    details = place_details_cache.get(_cache_key(place_id))
+    if details is not None:
+        return details
+
+    max_age = timedelta(days=getattr(settings, 'PLACE_DETAILS_TTL_DAYS', 90))
+    place = PlaceDetail.objects.filter(
+        place_id=place_id,
+        fetched_at__gte=timezone.now() - max_age
+    ).first()
+    if place is None:
+        return None
+
+    details = place.as_response()
+    place_details_cache.set(_cache_key(place_id), details)
+    return details
+
+
+def store_place(place_id, details):
+    PlaceDetail.objects.update_or_create(
+        place_id=place_id,
+        defaults={
+            'address': details.get('address') or '',
+            'name': details.get('name') or '',
+            'lat': details.get('lat'),
+            'lng': details.get('lng'),
+        }
+    )
+    place_details_cache.set(_cache_key(place_id), details)
+
+
+def fetch_place_details(place_id):
+    """Resolve a place id through Google and persist the result.
+
+    Returns the same ``{'address', 'name', 'lat', 'lng'}`` shape the
+    place-details endpoint has always returned, or None when Google does not
+    know the place.
+    """
+    params = {
+        'place_id': place_id,
+        'fields': 'formatted_address,geometry,name'
+    }
+    data = maps_client.get('place_details', params)
+    if data['status'] != 'OK':
+        return None
+
+    result = data['result']
+    location = result.get('geometry', {}).get('location', {})
+    details = {
+        'address': result.get('formatted_address', ''),
+        'name': result.get('name', ''),
+        'lat': location.get('lat'),
+        'lng': location.get('lng')
+    }
+    store_place(place_id, details)
+    return details
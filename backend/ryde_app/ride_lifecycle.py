@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import ride_metrics
+from .broadcast import send_to_groups
+from .dispatch import pop_offered_drivers
+from .location_fanout import ride_location_broadcaster
+from .logs import get_logger
+
+log = get_logger('rides')
+
+# Status -> statuses it may move to
+TRANSITIONS = {
+    'requested': ('accepted', 'cancelled'),
+    'accepted': ('driver_arrived', 'cancelled'),
+    'driver_arrived': ('driving_to_destination', 'cancelled'),
+    'driving_to_destination': ('completed', 'cancelled'),
+    'completed': (),
+    'cancelled': (),
+}
+
+# Column stamped when a ride enters the status
+STATUS_TIMESTAMPS = {
+    'driving_to_destination': 'actual_pickup_time',
+    'completed': 'actual_dropoff_time',
+}
+
+
+class TransitionError(Exception):
+    """A status change was refused; ``status_code`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def transition(ride_id, from_status, to_status, actor=None, notify=True, guards=None, changes=None):
+    """Move a ride from ``from_status`` to ``to_status`` with one guarded UPDATE.
+
+    The row only changes if it is still in ``from_status`` (and matches
+    ``guards``), so a concurrent change makes this raise a 409 instead of being
+    overwritten. Only the status, its timestamp column and ``changes`` are
+    written; the ride's ``DailyRideMetrics`` bucket moves in the same
+    transaction. Returns the updated ride.
+    """
+    from .models import Ride, RideStatusTransition
+
+    if not can_transition(from_status, to_status):
+        raise TransitionError(f"Cannot change status from {from_status} to {to_status}")
+
+    now = timezone.now()
+    values = dict(changes or {}, status=to_status)
+    if to_status in STATUS_TIMESTAMPS:
+        values[STATUS_TIMESTAMPS[to_status]] = now
+
+    with transaction.atomic():
+        updated = Ride.objects.filter(id=ride_id, status=from_status, **(guards or {})).update(**values)
+        if updated:
+            RideStatusTransition.objects.create(
+                ride_id=ride_id, from_status=from_status, to_status=to_status, actor=actor
+            )
+            ride = Ride.objects.select_related('customer', 'driver').get(id=ride_id)
+            ride_metrics.move_ride(ride_metrics.ride_bucket(ride, status=from_status), ride_metrics.ride_bucket(ride))
+
+    if not updated:
+        current = Ride.objects.filter(id=ride_id, **(guards or {})).values_list('status', flat=True).first()
+        if current is None:
+            raise TransitionError("Ride not found", status_code=404)
+        raise TransitionError(f"Ride is {current}, expected {from_status}", status_code=409)
+
+    # Accepting (or reassigning) changes who may stream locations for the ride
+    ride_location_broadcaster.invalidate(ride_id)
+    log.info('ride_transition', ride_id=ride_id, from_status=from_status, to_status=to_status,
+             actor_id=getattr(actor, 'id', None))
+    if notify:
+        notify_transition(ride, from_status, now)
+    return ride
+
+
+def notify_transition(ride, from_status, timestamp=None):
+    """Tell both sides of the ride about its new status over WebSocket"""
+    data = {
+        'ride_id': ride.id,
+        'status': ride.status,
+        'previous_status': from_status,
+        'timestamp': (timestamp or timezone.now()).isoformat(),
+    }
+    message = {'type': 'ride_status_update', 'data': data}
+    group_messages = [(f"customer_{ride.customer_id}", message)]
+    if ride.driver_id:
+        group_messages.append((f"driver_{ride.driver_id}", message))
+
+    if from_status == 'requested' and ride.status == 'cancelled':
+        # Drivers still looking at the request should drop it
+        taken = {'type': 'ride_taken', 'data': {'ride_id': ride.id, 'message': 'Ride was cancelled by the customer'}}
+        group_messages.extend((f"driver_{driver_id}", taken) for driver_id in pop_offered_drivers(ride.id))
+
+    fanout = send_to_groups(group_messages)
+    for group, error in fanout['failed'].items():
+        log.warning('ride_transition_notify_failed', ride_id=ride.id, group=group, error=str(error))
+    return fanout
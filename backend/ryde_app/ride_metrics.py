@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyRideMetrics, Ride
+
+
+def ride_bucket(ride, status=None):
+    """``(rollup key, fare)`` a ride counts towards, optionally as if it had ``status``"""
+    key = (
+        timezone.localdate(ride.created_at),
+        ride.vehicle_type,
+        ride.service_type,
+        status or ride.status,
+    )
+    return key, Decimal(str(ride.fare or 0))
+
+
+def _bump(key, fare, sign):
+    day, vehicle_type, service_type, status = key
+    bucket = DailyRideMetrics.objects.filter(
+        day=day, vehicle_type=vehicle_type, service_type=service_type, status=status
+    )
+    changes = {
+        'ride_count': F('ride_count') + sign,
+        'fare_total': F('fare_total') + fare * sign,
+    }
+    if bucket.update(**changes) or sign < 0:
+        return
+    try:
+        with transaction.atomic():
+            DailyRideMetrics.objects.create(
+                day=day, vehicle_type=vehicle_type, service_type=service_type, status=status,
+                ride_count=1, fare_total=fare,
+            )
+    except IntegrityError:
+        # Another request created the row first
+        bucket.update(**changes)
+
+
+def add_ride(ride):
+    """Count a newly created ride"""
+    _bump(*ride_bucket(ride), 1)
+
+
+def move_ride(before, after):
+    """Move a ride between buckets after its status (or another key field) changed"""
+    if before == after:
+        return
+    _bump(*before, -1)
+    _bump(*after, 1)
+
+
+@receiver(post_delete, sender=Ride, dispatch_uid='ride_metrics_remove_ride')
+def remove_ride(sender, instance, **kwargs):
+    """Uncount a deleted ride, including rides removed by cascade when their customer is deleted"""
+    _bump(*ride_bucket(instance), -1)
+
+
+def rebuild(start_date=None, end_date=None):
+    """Recompute the rollup from the ``Ride`` table; returns the number of rows written"""
+    rides = Ride.objects.annotate(day=TruncDate('created_at'))
+    existing = DailyRideMetrics.objects.all()
+    if start_date:
+        rides = rides.filter(day__gte=start_date)
+        existing = existing.filter(day__gte=start_date)
+    if end_date:
+        rides = rides.filter(day__lte=end_date)
+        existing = existing.filter(day__lte=end_date)
+
+    rows = [
+        DailyRideMetrics(
+            day=row['day'], vehicle_type=row['vehicle_type'], service_type=row['service_type'],
+            status=row['status'], ride_count=row['ride_count'], fare_total=row['fare_total'] or 0,
+        )
+        for row in rides.values('day', 'vehicle_type', 'service_type', 'status').annotate(
+            ride_count=Count('id'), fare_total=Sum('fare')
+        ).order_by()
+    ]
+    with transaction.atomic():
+        existing.delete()
+        DailyRideMetrics.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
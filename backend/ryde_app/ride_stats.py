@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Ride
+
+
+def _per_user(role, aggregate, output_field, **filters):
+    # Correlated subquery: joining both ride relations at once would multiply rows
+    rides = Ride.objects.filter(**{role: OuterRef('pk')}, **filters).order_by().values(role)
+    return Subquery(rides.annotate(value=aggregate).values('value'), output_field=output_field)
+
+
+def annotate_ride_stats(users):
+    """Add ride counts and driver earnings to every user in one query.
+
+    Annotates ``rides_as_customer``, ``rides_as_driver``,
+    ``completed_rides_as_driver`` and ``driver_earnings``.
+    """
+    return users.annotate(
+        rides_as_customer=Coalesce(_per_user('customer', Count('id'), models.IntegerField()), 0),
+        rides_as_driver=Coalesce(_per_user('driver', Count('id'), models.IntegerField()), 0),
+        completed_rides_as_driver=Coalesce(
+            _per_user('driver', Count('id'), models.IntegerField(), status='completed'), 0
+        ),
+        driver_earnings=Coalesce(
+            _per_user('driver', Sum('fare'), models.DecimalField(max_digits=14, decimal_places=2), status='completed'),
+            Decimal('0'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
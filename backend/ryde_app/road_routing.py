@@ -0,0 +1,395 @@
+import bz2
+import gzip
+import heapq
+import json
+import math
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+
+from django.conf import settings
+
+from .geo import calculate_distance, KM_PER_DEGREE_LAT
+from .logs import get_logger
+
+log = get_logger('routing')
+
+# Free-flow speeds (km/h) per OSM highway class, used when a way has no usable maxspeed
+DEFAULT_SPEEDS_KMH = {
+    'motorway': 80,
+    'motorway_link': 50,
+    'trunk': 65,
+    'trunk_link': 45,
+    'primary': 50,
+    'primary_link': 40,
+    'secondary': 40,
+    'secondary_link': 35,
+    'tertiary': 35,
+    'tertiary_link': 30,
+    'unclassified': 30,
+    'residential': 25,
+    'living_street': 10,
+    'service': 15,
+}
+
+GRAPH_FORMAT_VERSION = 2
+GRAPH_MAGIC = b'RYDEGRAPH\n'
+GRAPH_ARRAYS = ('lats', 'lngs', 'offsets', 'targets', 'lengths', 'times')
+
+
+def _parse_maxspeed(value):
+    if not value:
+        return None
+    value = value.strip().lower()
+    try:
+        if value.endswith('mph'):
+            return float(value[:-3].strip()) * 1.609
+        return float(value.split()[0])
+    except ValueError:
+        return None
+
+
+def _open_extract(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def encode_polyline(points):
+    """Encode (lat, lng) points with Google's polyline algorithm"""
+    encoded = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_e5 = int(round(lat * 1e5))
+        lng_e5 = int(round(lng * 1e5))
+        for delta in (lat_e5 - prev_lat, lng_e5 - prev_lng):
+            value = ~(delta << 1) if delta < 0 else (delta << 1)
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        prev_lat, prev_lng = lat_e5, lng_e5
+    return ''.join(encoded)
+
+
+class RoadGraph:
+    """Directed road graph stored as compressed sparse rows.
+
+    Edges leaving node ``n`` live at ``targets[offsets[n]:offsets[n + 1]]``
+    with matching ``lengths`` (metres) and ``times`` (seconds). Nodes are
+    bucketed on a coarse grid so coordinates can be snapped to the network.
+    """
+
+    def __init__(self, lats, lngs, offsets, targets, lengths, times, max_speed_kmh, snap_cell_km=0.5):
+        self.lats = lats
+        self.lngs = lngs
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self.times = times
+        self.max_speed_mps = max_speed_kmh / 3.6
+        self.snap_cell_km = snap_cell_km
+        self._build_snap_grid()
+
+    @classmethod
+    def from_edges(cls, lats, lngs, edges, snap_cell_km=0.5):
+        """Build a graph from node coordinates and (source, target, speed_kmh) edges"""
+        node_count = len(lats)
+        counts = [0] * (node_count + 1)
+        for source, _, _ in edges:
+            counts[source + 1] += 1
+        for i in range(node_count):
+            counts[i + 1] += counts[i]
+
+        offsets = array('l', counts)
+        targets = array('l', [0]) * len(edges)
+        lengths = array('f', [0.0]) * len(edges)
+        times = array('f', [0.0]) * len(edges)
+        cursor = list(counts[:-1])
+        max_speed = 1.0
+
+        for source, target, speed_kmh in edges:
+            slot = cursor[source]
+            cursor[source] += 1
+            length_m = calculate_distance(lats[source], lngs[source], lats[target], lngs[target]) * 1000
+            targets[slot] = target
+            lengths[slot] = length_m
+            times[slot] = length_m / (speed_kmh / 3.6)
+            max_speed = max(max_speed, speed_kmh)
+
+        return cls(array('d', lats), array('d', lngs), offsets, targets, lengths, times,
+                   max_speed, snap_cell_km=snap_cell_km)
+
+    @classmethod
+    def from_osm(cls, path, snap_cell_km=0.5):
+        """Load the drivable ways of an OSM XML extract (.osm, .osm.gz, .osm.bz2)"""
+        coords = {}
+        ways = []
+
+        with _open_extract(path) as handle:
+            way_nodes = []
+            way_tags = {}
+            root = None
+            for event, element in ET.iterparse(handle, events=('start', 'end')):
+                if root is None:
+                    root = element
+                if event == 'start':
+                    continue
+                tag = element.tag
+                if tag == 'node':
+                    coords[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+                    # Tags of a node (e.g. highway=traffic_signals) must not leak into the next way
+                    way_nodes = []
+                    way_tags = {}
+                    # Finished elements stay attached to the root unless it is cleared too
+                    root.clear()
+                elif tag == 'nd':
+                    way_nodes.append(element.get('ref'))
+                elif tag == 'tag':
+                    way_tags[element.get('k')] = element.get('v')
+                elif tag == 'way':
+                    highway = way_tags.get('highway')
+                    if highway in DEFAULT_SPEEDS_KMH and len(way_nodes) > 1:
+                        speed = _parse_maxspeed(way_tags.get('maxspeed')) or DEFAULT_SPEEDS_KMH[highway]
+                        oneway = way_tags.get('oneway', 'no')
+                        if oneway == '-1':
+                            ways.append((list(reversed(way_nodes)), speed, True))
+                        else:
+                            is_oneway = oneway in ('yes', 'true', '1') or highway in ('motorway', 'motorway_link')
+                            ways.append((way_nodes, speed, is_oneway))
+                    way_nodes = []
+                    way_tags = {}
+                    root.clear()
+                elif tag == 'relation':
+                    way_nodes = []
+                    way_tags = {}
+                    root.clear()
+
+        # Keep only nodes that belong to a drivable way and renumber them densely
+        index = {}
+        lats = []
+        lngs = []
+        edges = []
+        for node_refs, speed, is_oneway in ways:
+            previous = None
+            for ref in node_refs:
+                if ref not in coords:
+                    previous = None
+                    continue
+                node = index.get(ref)
+                if node is None:
+                    node = index[ref] = len(lats)
+                    lats.append(coords[ref][0])
+                    lngs.append(coords[ref][1])
+                if previous is not None and previous != node:
+                    edges.append((previous, node, speed))
+                    if not is_oneway:
+                        edges.append((node, previous, speed))
+                previous = node
+
+        return cls.from_edges(lats, lngs, edges, snap_cell_km=snap_cell_km)
+
+    def save(self, path):
+        """Write a JSON header line followed by the raw bytes of each array"""
+        header = {
+            'version': GRAPH_FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'max_speed_kmh': self.max_speed_mps * 3.6,
+            'snap_cell_km': self.snap_cell_km,
+            'arrays': [
+                [name, getattr(self, name).typecode, getattr(self, name).itemsize, len(getattr(self, name))]
+                for name in GRAPH_ARRAYS
+            ],
+        }
+        with open(path, 'wb') as handle:
+            handle.write(GRAPH_MAGIC)
+            handle.write(json.dumps(header).encode() + b'\n')
+            for name in GRAPH_ARRAYS:
+                getattr(self, name).tofile(handle)
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph compiled by ``build_road_graph``.
+
+        The file is parsed as plain data (nothing in it is executed), so a
+        damaged or foreign file raises ``ValueError``.
+        """
+        with open(path, 'rb') as handle:
+            if handle.read(len(GRAPH_MAGIC)) != GRAPH_MAGIC:
+                raise ValueError(f"{path} is not a compiled road graph")
+            try:
+                header = json.loads(handle.readline())
+            except ValueError:
+                raise ValueError(f"Corrupt road graph header in {path}")
+            if header.get('version') != GRAPH_FORMAT_VERSION:
+                raise ValueError(f"Unsupported road graph version in {path}")
+
+            arrays = {}
+            for name, typecode, itemsize, length in header.get('arrays', []):
+                values = array(typecode)
+                if values.itemsize != itemsize:
+                    raise ValueError(f"{path} was written on a platform with a different {typecode!r} size")
+                try:
+                    values.fromfile(handle, length)
+                except EOFError:
+                    raise ValueError(f"Truncated road graph {path}")
+                if header['byteorder'] != sys.byteorder:
+                    values.byteswap()
+                arrays[name] = values
+
+        missing = set(GRAPH_ARRAYS) - set(arrays)
+        if missing:
+            raise ValueError(f"Road graph {path} lacks {', '.join(sorted(missing))}")
+        return cls(*(arrays[name] for name in GRAPH_ARRAYS), header['max_speed_kmh'],
+                   snap_cell_km=header['snap_cell_km'])
+
+    @property
+    def node_count(self):
+        return len(self.lats)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def _cell(self, lat, lng):
+        lat_step = self.snap_cell_km / KM_PER_DEGREE_LAT
+        lng_step = self.snap_cell_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        return (int(math.floor(lat / lat_step)), int(math.floor(lng / lng_step)))
+
+    def _build_snap_grid(self):
+        self._grid = {}
+        for node in range(len(self.lats)):
+            # Only nodes with outgoing edges are useful as route endpoints
+            if self.offsets[node] == self.offsets[node + 1]:
+                continue
+            self._grid.setdefault(self._cell(self.lats[node], self.lngs[node]), []).append(node)
+
+    def nearest_node(self, lat, lng, max_distance_m):
+        row, col = self._cell(lat, lng)
+        reach = max(int(math.ceil(max_distance_m / (self.snap_cell_km * 1000))), 1)
+        best = None
+        best_distance_m = max_distance_m
+        for d_row in range(-reach, reach + 1):
+            for d_col in range(-reach, reach + 1):
+                for node in self._grid.get((row + d_row, col + d_col), ()):
+                    distance_m = calculate_distance(lat, lng, self.lats[node], self.lngs[node]) * 1000
+                    if distance_m <= best_distance_m:
+                        best, best_distance_m = node, distance_m
+        return best
+
+    def shortest_path(self, source, target):
+        """A* on travel time; returns (seconds, metres, node path) or None"""
+        lats, lngs = self.lats, self.lngs
+        offsets, targets, lengths, times = self.offsets, self.targets, self.lengths, self.times
+        target_lat, target_lng = lats[target], lngs[target]
+
+        # Equirectangular distance shrunk by 1% stays below the haversine
+        # distance at city scale, so the heuristic remains admissible.
+        metres_per_degree = KM_PER_DEGREE_LAT * 1000 * 0.99
+        lng_scale = math.cos(math.radians(target_lat))
+        seconds_per_degree = metres_per_degree / self.max_speed_mps
+        sqrt = math.sqrt
+        push, pop = heapq.heappush, heapq.heappop
+
+        node_count = len(lats)
+        best_time = [math.inf] * node_count
+        best_length = [0.0] * node_count
+        parent = [-1] * node_count
+        settled = bytearray(node_count)
+
+        best_time[source] = 0.0
+        queue = [(0.0, 0.0, source)]
+
+        while queue:
+            _, elapsed, node = pop(queue)
+            if settled[node]:
+                continue
+            if node == target:
+                path = []
+                while node != -1:
+                    path.append(node)
+                    node = parent[node]
+                path.reverse()
+                return elapsed, best_length[target], path
+            settled[node] = 1
+
+            node_length = best_length[node]
+            for slot in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[slot]
+                if settled[neighbour]:
+                    continue
+                candidate = elapsed + times[slot]
+                if candidate < best_time[neighbour]:
+                    best_time[neighbour] = candidate
+                    best_length[neighbour] = node_length + lengths[slot]
+                    parent[neighbour] = node
+                    d_lat = lats[neighbour] - target_lat
+                    d_lng = (lngs[neighbour] - target_lng) * lng_scale
+                    estimate = sqrt(d_lat * d_lat + d_lng * d_lng) * seconds_per_degree
+                    push(queue, (candidate + estimate, candidate, neighbour))
+
+        return None
+
+    def route(self, start_lat, start_lng, end_lat, end_lng, max_snap_m=500):
+        """Route between two coordinates in the same shape as get_google_route"""
+        source = self.nearest_node(start_lat, start_lng, max_snap_m)
+        target = self.nearest_node(end_lat, end_lng, max_snap_m)
+        if source is None or target is None:
+            return None
+
+        result = self.shortest_path(source, target)
+        if result is None:
+            return None
+
+        seconds, metres, path = result
+        points = [(start_lat, start_lng)]
+        points.extend((self.lats[node], self.lngs[node]) for node in path)
+        points.append((end_lat, end_lng))
+
+        # Account for the walk from each coordinate to its snapped node at road speed
+        snap_m = (calculate_distance(start_lat, start_lng, self.lats[source], self.lngs[source]) +
+                  calculate_distance(end_lat, end_lng, self.lats[target], self.lngs[target])) * 1000
+        local_speed_mps = DEFAULT_SPEEDS_KMH['residential'] / 3.6
+
+        return {
+            'distance': int(round(metres + snap_m)),
+            'duration': int(round(seconds + snap_m / local_speed_mps)),
+            'polyline': encode_polyline(points),
+        }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+_graph_load_failed = False
+
+
+def get_road_graph():
+    """Return the process-wide graph from ROUTING_GRAPH_PATH, loading it once"""
+    global _graph, _graph_load_failed
+    if _graph is not None or _graph_load_failed:
+        return _graph
+
+    path = getattr(settings, 'ROUTING_GRAPH_PATH', '')
+    if not path:
+        return None
+
+    with _graph_lock:
+        if _graph is None and not _graph_load_failed:
+            try:
+                _graph = RoadGraph.load(path)
+                log.info('road_graph_loaded', path=path, nodes=_graph.node_count, edges=_graph.edge_count)
+            except (OSError, ValueError) as e:
+                _graph_load_failed = True
+                log.error('road_graph_load_failed', path=path, error=str(e))
+    return _graph
+
+
+def local_route(start_lat, start_lng, end_lat, end_lng):
+    graph = get_road_graph()
+    if graph is None:
+        return None
+    return graph.route(start_lat, start_lng, end_lat, end_lng,
+                       max_snap_m=getattr(settings, 'ROUTING_MAX_SNAP_M', 500))
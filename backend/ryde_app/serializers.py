@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from .models import User, UserProfile, Ride, DriverLocation, RideMessage, RideRating, Vehicle, CustomerChatHistory, CustomerPaymentMethod, NotificationPreference
+from .ride_stats import annotate_ride_stats
  
 #register
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -295,9 +296,12 @@ class AdminUserSerializer(serializers.ModelSerializer):
                  'approval_status', 'is_approved', 'ride_stats', 'vehicle_info')
     
     def get_ride_stats(self, obj):
+        # Querysets from annotate_ride_stats() carry the counts; single objects are annotated here
+        if not hasattr(obj, 'rides_as_customer'):
+            obj = annotate_ride_stats(User.objects.filter(pk=obj.pk)).get()
         return {
-            'total_rides_as_customer': Ride.objects.filter(customer=obj).count(),
-            'total_rides_as_driver': Ride.objects.filter(driver=obj).count() if obj.user_type in ['driver', 'boda_rider'] else 0,
+            'total_rides_as_customer': obj.rides_as_customer,
+            'total_rides_as_driver': obj.rides_as_driver if obj.user_type in ['driver', 'boda_rider'] else 0,
         }
     
     def get_vehicle_info(self, obj):
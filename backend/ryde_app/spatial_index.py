@@ -0,0 +1,142 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from .geo import distances_to_point, KM_PER_DEGREE_LAT
+
+
+class DriverLocationIndex:
+    """In-memory grid of online driver positions for radius lookups.
+
+    The map is split into square cells of ``cell_km`` and every online driver
+    lives in exactly one cell, so a radius query only has to look at the
+    handful of cells that overlap the search circle instead of every driver.
+    """
+
+    def __init__(self, cell_km=1.0, refresh_seconds=30):
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE_LAT
+        self.refresh_seconds = refresh_seconds
+        self._cells = {}
+        self._positions = {}
+        self._lock = threading.RLock()
+        self._loaded_at = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _cell_for(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def upsert(self, driver_id, lat, lng):
+        lat = float(lat)
+        lng = float(lng)
+        cell = self._cell_for(lat, lng)
+        with self._lock:
+            previous = self._positions.get(driver_id)
+            if previous and previous[2] != cell:
+                self._discard_from_cell(driver_id, previous[2])
+            self._positions[driver_id] = (lat, lng, cell)
+            self._cells.setdefault(cell, set()).add(driver_id)
+
+    def remove(self, driver_id):
+        with self._lock:
+            previous = self._positions.pop(driver_id, None)
+            if previous:
+                self._discard_from_cell(driver_id, previous[2])
+
+    def update(self, driver_id, lat, lng, is_online):
+        """Apply a location write: online drivers are indexed, offline ones dropped"""
+        if is_online:
+            self.upsert(driver_id, lat, lng)
+        else:
+            self.remove(driver_id)
+
+    def _discard_from_cell(self, driver_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(driver_id)
+            if not members:
+                del self._cells[cell]
+
+    def rebuild(self, rows):
+        """Replace the index contents with ``(driver_id, lat, lng)`` rows"""
+        cells = {}
+        positions = {}
+        for driver_id, lat, lng in rows:
+            lat = float(lat)
+            lng = float(lng)
+            cell = self._cell_for(lat, lng)
+            positions[driver_id] = (lat, lng, cell)
+            cells.setdefault(cell, set()).add(driver_id)
+        with self._lock:
+            self._cells = cells
+            self._positions = positions
+            self._loaded_at = time.monotonic()
+
+    def ensure_fresh(self):
+        """Reload online drivers from the database when the snapshot is stale.
+
+        Each worker process keeps its own index, so writes made by other
+        workers only become visible after the next periodic reload.
+        """
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.refresh_seconds:
+            return
+        from .models import DriverLocation
+        rows = DriverLocation.objects.filter(is_online=True).values_list('driver_id', 'lat', 'lng')
+        self.rebuild(rows)
+
+    def nearby(self, lat, lng, radius_km, limit=None):
+        """Return ``(driver_id, distance_km)`` pairs within the radius, closest first"""
+        lat = float(lat)
+        lng = float(lng)
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        lng_span = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+
+        min_row, min_col = self._cell_for(lat - lat_span, lng - lng_span)
+        max_row, max_col = self._cell_for(lat + lat_span, lng + lng_span)
+
+        results = []
+        with self._lock:
+            cell_count = (max_row - min_row + 1) * (max_col - min_col + 1)
+            if cell_count > len(self._cells):
+                candidate_cells = [
+                    members for (row, col), members in self._cells.items()
+                    if min_row <= row <= max_row and min_col <= col <= max_col
+                ]
+            else:
+                candidate_cells = []
+                for row in range(min_row, max_row + 1):
+                    for col in range(min_col, max_col + 1):
+                        members = self._cells.get((row, col))
+                        if members:
+                            candidate_cells.append(members)
+
+            driver_ids = [driver_id for members in candidate_cells for driver_id in members]
+            positions = [self._positions[driver_id] for driver_id in driver_ids]
+
+        if driver_ids:
+            distances = distances_to_point(
+                [position[0] for position in positions],
+                [position[1] for position in positions],
+                lat, lng,
+            )
+            results = [
+                (driver_id, float(distance))
+                for driver_id, distance in zip(driver_ids, distances)
+                if distance <= radius_km
+            ]
+
+        results.sort(key=lambda item: item[1])
+        if limit is not None:
+            results = results[:limit]
+        return results
+
+
+driver_index = DriverLocationIndex(
+    cell_km=getattr(settings, 'DRIVER_INDEX_CELL_KM', 1.0),
+    refresh_seconds=getattr(settings, 'DRIVER_INDEX_REFRESH_SECONDS', 30),
+)
@@ -1,3 +1,1545 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+import requests
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+try:
+    import fakeredis
+except ImportError:  # Listed in requirements-dev.txt; the Redis backend tests are skipped without it
+    fakeredis = None
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import autocomplete, jwt_auth, maps_cache, places, ride_metrics, routing, views
+from .autocomplete import AutocompleteIndex
+from .broadcast import broadcast_to_groups, send_to_groups
+from .consumers import DriverConsumer, RideParticipantsMixin
+from .dispatch import find_dispatch_candidates, pop_offered_drivers, record_offers
+from .geo import KM_PER_DEGREE_LAT, calculate_distance, distance_matrix, distances_to_point
+from .maps_client import CircuitBreaker, GoogleMapsClient, MapsUnavailable
+from .jwt_auth import JWTAuthMiddlewareStack, issue_tokens
+from .management.commands import warm_place_details
+from .live_locations import LiveLocationStore, RedisLocationBackend
+from .location_fanout import RideLocationBroadcaster
+from .maps_cache import TieredMapsCache, geocode_cache_key, route_cache_key, time_of_day_bucket
+from .road_routing import DEFAULT_SPEEDS_KMH, RoadGraph
+from .models import (
+    User, UserProfile, Vehicle, Ride, DriverLocation, RideMessage, RideStatusTransition, DailyRideMetrics, IdempotencyRecord,
+    PlaceDetail,
+)
+from .ride_stats import annotate_ride_stats
+from .serializers import AdminUserSerializer, DriverLocationSerializer
+from .spatial_index import DriverLocationIndex
+from .timeseries import time_series
+
+
+def make_ride(customer, driver=None, **fields):
+    values = {
+        'pickup_lat': -1.2864, 'pickup_lng': 36.8172,
+        'dropoff_lat': -1.3000, 'dropoff_lng': 36.8000,
+        'pickup_address': 'Pickup', 'dropoff_address': 'Dropoff',
+        'fare': 100,
+    }
+    values.update(fields)
+    return Ride.objects.create(customer=customer, driver=driver, **values)
+
+
+class RideHistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        self.driver = User.objects.create_user(email='driver@example.com', password='pass', user_type='driver')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_my_rides_returns_full_history_without_cursor(self):
+        for _ in range(60):
+            make_ride(self.customer)
+        response = self.client.get('/api/auth/rides/my-rides/')
+        self.assertEqual(len(response.data), 60)
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+    def test_my_rides_pages_when_asked(self):
+        now = timezone.now()
+        for i in range(25):
+            ride = make_ride(self.customer)
+            # Shared timestamps exercise the id tiebreak
+            Ride.objects.filter(id=ride.id).update(created_at=now - timedelta(minutes=i // 3))
+        expected = list(Ride.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        seen, params = [], {'page_size': 10}
+        while True:
+            response = self.client.get('/api/auth/rides/my-rides/', params)
+            seen += [ride['id'] for ride in response.data]
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+            params = {'page_size': 10, 'cursor': cursor}
+        self.assertEqual(seen, expected)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get('/api/auth/rides/my-rides/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_messages_page_back_from_newest(self):
+        ride = make_ride(self.customer, self.driver)
+        for i in range(25):
+            RideMessage.objects.create(ride=ride, sender=self.customer, content=str(i))
+        url = f'/api/auth/rides/{ride.id}/messages/'
+
+        everything = self.client.get(url)
+        self.assertEqual([m['content'] for m in everything.data], [str(i) for i in range(25)])
+
+        first = self.client.get(url, {'page_size': 10})
+        self.assertEqual([m['content'] for m in first.data], [str(i) for i in range(15, 25)])
+        second = self.client.get(url, {'page_size': 10, 'cursor': first.headers['X-Next-Cursor']})
+        self.assertEqual([m['content'] for m in second.data], [str(i) for i in range(5, 15)])
+
+    def test_earnings_list_every_ride_without_cursor(self):
+        for _ in range(60):
+            make_ride(self.customer, self.driver, status='completed', fare=10)
+        self.client.force_authenticate(self.driver)
+        response = self.client.get('/api/auth/driver/earnings/')
+        self.assertEqual(len(response.data['rides']), 60)
+        self.assertEqual(response.data['total_rides'], 60)
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_earnings_page_when_asked(self):
+        for _ in range(25):
+            make_ride(self.customer, self.driver, status='completed', fare=10)
+        self.client.force_authenticate(self.driver)
+        first = self.client.get('/api/auth/driver/earnings/', {'page_size': 20})
+        self.assertEqual(len(first.data['rides']), 20)
+        second = self.client.get('/api/auth/driver/earnings/', {'page_size': 20, 'cursor': first.data['next_cursor']})
+        self.assertEqual(len(second.data['rides']), 5)
+        self.assertEqual(second.data['total_rides'], 25)
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        jwt_auth._user_cache.clear()
+
+    async def test_cancelled_caller_does_not_strand_waiters(self):
+        release = asyncio.Event()
+        calls = []
+
+        async def slow_load(user_id):
+            calls.append(user_id)
+            await release.wait()
+            return 'user'
+
+        with mock.patch.object(jwt_auth, '_load_user', slow_load):
+            leader = asyncio.ensure_future(jwt_auth.get_cached_user(7))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(jwt_auth.get_cached_user(7))
+            await asyncio.sleep(0)
+            leader.cancel()
+            release.set()
+            self.assertEqual(await asyncio.wait_for(waiter, 1), 'user')
+
+        self.assertEqual(calls, [7])
+        self.assertNotIn(7, jwt_auth._inflight)
+
+    async def test_failed_load_reaches_every_caller(self):
+        async def failing_load(user_id):
+            await asyncio.sleep(0)
+            raise RuntimeError('db down')
+
+        with mock.patch.object(jwt_auth, '_load_user', failing_load):
+            results = await asyncio.gather(
+                jwt_auth.get_cached_user(8), jwt_auth.get_cached_user(8), return_exceptions=True
+            )
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertNotIn(8, jwt_auth._inflight)
+
+
+class RecordingChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+class RideLocationBroadcasterTests(TransactionTestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        self.driver = User.objects.create_user(email='driver@example.com', password='pass', user_type='driver')
+        self.other = User.objects.create_user(email='other@example.com', password='pass', user_type='driver')
+        self.ride = make_ride(self.customer)
+
+    async def test_driver_assigned_after_first_lookup_is_accepted(self):
+        broadcaster = RideLocationBroadcaster(interval_seconds=0)
+        layer = RecordingChannelLayer()
+
+        self.assertFalse(await broadcaster.publish(layer, self.ride.id, self.driver.id, {'lat': 1}))
+        await Ride.objects.filter(id=self.ride.id).aupdate(driver=self.driver, status='accepted')
+        self.assertTrue(await broadcaster.publish(layer, self.ride.id, self.driver.id, {'lat': 2}))
+        self.assertEqual(layer.sent, [(f'customer_{self.customer.id}', {'type': 'location_update', 'data': {'lat': 2}})])
+
+    async def test_reassigned_driver_is_picked_up(self):
+        broadcaster = RideLocationBroadcaster(interval_seconds=0)
+        layer = RecordingChannelLayer()
+        await Ride.objects.filter(id=self.ride.id).aupdate(driver=self.driver, status='accepted')
+        self.assertTrue(await broadcaster.publish(layer, self.ride.id, self.driver.id, {'lat': 1}))
+
+        await Ride.objects.filter(id=self.ride.id).aupdate(driver=self.other)
+        self.assertTrue(await broadcaster.publish(layer, self.ride.id, self.other.id, {'lat': 2}))
+        self.assertFalse(await broadcaster.publish(layer, self.ride.id, self.driver.id, {'lat': 3}))
+
+    async def test_missing_ride_is_not_cached(self):
+        broadcaster = RideLocationBroadcaster(interval_seconds=0)
+        self.assertFalse(await broadcaster.publish(RecordingChannelLayer(), 999999, self.driver.id, {}))
+        self.assertEqual(broadcaster.stats()['tracked_rides'], 0)
+
+
+RIDE_REQUEST = {'pickup_address': 'Kenyatta Avenue', 'dropoff_address': 'Westlands', 'estimated_fare': '350'}
+
+
+def mock_ride_request_io(geocode_delay=0):
+    """Patch out geocoding, routing and driver notification for request_ride"""
+    def geocode(address):
+        time.sleep(geocode_delay)
+        return {'lat': -1.2864, 'lng': 36.8172}
+
+    return [
+        mock.patch.object(views, 'geocode_address', side_effect=geocode),
+        mock.patch.object(views, 'get_route', return_value=None),
+        mock.patch.object(views, 'send_to_groups', return_value={'sent': 0, 'failed': {}, 'elapsed_ms': 0}),
+    ]
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        for patcher in mock_ride_request_io():
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, body=RIDE_REQUEST, key='key-1'):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/auth/rides/request/', body, format='json', **headers)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post()
+        retry = self.post()
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Ride.objects.count(), 1)
+
+    def test_key_reused_for_a_different_body_is_rejected(self):
+        self.post()
+        response = self.post(dict(RIDE_REQUEST, estimated_fare='999'))
+        self.assertEqual(response.status_code, 422)
+
+    def test_requests_without_a_key_always_run(self):
+        self.post(key=None)
+        self.post(key=None)
+        self.assertEqual(Ride.objects.count(), 2)
+
+    def test_duplicate_while_in_flight_is_refused_until_the_lock_is_stale(self):
+        first = self.post()
+        IdempotencyRecord.objects.update(status_code=None, response=None, locked_at=timezone.now())
+        self.assertEqual(self.post().status_code, 409)
+
+        with self.settings(IDEMPOTENCY_LOCK_SECONDS=60):
+            IdempotencyRecord.objects.update(locked_at=timezone.now() - timedelta(seconds=61))
+            taken_over = self.post()
+        self.assertEqual(taken_over.status_code, 201)
+        self.assertNotEqual(taken_over.data['id'], first.data['id'])
+
+    def test_server_errors_are_not_stored(self):
+        with mock.patch.object(views.ride_metrics, 'add_ride', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.post()
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        self.assertEqual(self.post().status_code, 201)
+
+
+class ConcurrentWritesTestCase(TransactionTestCase):
+    """Threads writing at once to the SQLite test database.
+
+    SQLite's default deferred transactions fail a second writer with
+    "database is locked" instead of waiting, which would hide the
+    application-level race these tests check, so writers queue here.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(connection.settings_dict['OPTIONS'], {'transaction_mode': 'IMMEDIATE', 'timeout': 20})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Reconnect so the options apply to this thread's connection too
+        connection.close()
+        self.addCleanup(connection.close)
+
+
+class IdempotencyRaceTests(ConcurrentWritesTestCase):
+    def test_concurrent_duplicates_create_one_ride(self):
+        customer = User.objects.create_user(email='customer@example.com', password='pass')
+        statuses = []
+        start = threading.Barrier(10)
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(customer)
+            start.wait()
+            try:
+                response = client.post('/api/auth/rides/request/', RIDE_REQUEST, format='json',
+                                       HTTP_IDEMPOTENCY_KEY='same-key')
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        patchers = mock_ride_request_io(geocode_delay=0.05)
+        for patcher in patchers:
+            patcher.start()
+        try:
+            threads = [threading.Thread(target=send) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for patcher in patchers:
+                patcher.stop()
+
+        self.assertEqual(Ride.objects.count(), 1)
+        self.assertEqual(len(statuses), 10)
+        self.assertTrue(set(statuses) <= {201, 409}, statuses)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        self.ride = make_ride(self.customer, pickup_address='Sarit Centre, Westlands', pickup_lat=-1.2615,
+                              pickup_lng=36.8025, dropoff_address='Yaya Centre, Kilimani')
+
+    def test_history_ids_resolve_on_a_worker_that_never_indexed_them(self):
+        issuing = AutocompleteIndex()
+        issuing.ensure_loaded()
+        place_id = issuing.search('sarit')[0]['place_id']
+
+        with mock.patch.object(autocomplete, 'autocomplete_index', AutocompleteIndex()), \
+                mock.patch.object(views, 'fetch_place_details') as google:
+            response = APIClient().post('/api/auth/place-details/', {'place_id': place_id}, format='json')
+            missing = APIClient().post('/api/auth/place-details/', {'place_id': 'ryde:999999:pickup'}, format='json')
+        self.assertEqual(response.data, {
+            'address': 'Sarit Centre, Westlands', 'name': 'Sarit Centre', 'lat': -1.2615, 'lng': 36.8025,
+        })
+        self.assertEqual(missing.status_code, 400)
+        google.assert_not_called()
+
+    def test_bulk_load_matches_incremental_adds(self):
+        for i in range(30):
+            make_ride(self.customer, pickup_address=f'Stage {i}, Ngong Road', dropoff_address=f'Gate {i}, Thika Road')
+        loaded = AutocompleteIndex()
+        loaded.ensure_loaded()
+        incremental = AutocompleteIndex()
+        for ride in Ride.objects.order_by('-created_at'):
+            incremental.add_address(ride.pickup_address, ride.pickup_lat, ride.pickup_lng, ride.id, 'pickup')
+            incremental.add_address(ride.dropoff_address, ride.dropoff_lat, ride.dropoff_lng, ride.id, 'dropoff')
+        self.assertEqual(loaded._keys, incremental._keys)
+        self.assertEqual(len(loaded.search('ngong')), 15)
+
+    def test_failed_load_is_retried(self):
+        index = AutocompleteIndex()
+        with mock.patch('ryde_app.models.Ride.objects.order_by', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                index.ensure_loaded()
+        index.ensure_loaded()
+        self.assertEqual(len(index.search('sarit')), 1)
+
+    def test_rejected_types_filter_is_only_skipped_for_a_while(self):
+        sent_types = []
+
+        def places(endpoint, params):
+            sent_types.append('types' in params)
+            return {'status': 'INVALID_REQUEST' if 'types' in params else 'OK', 'predictions': []}
+
+        with mock.patch.object(autocomplete, '_types_filter_skip_until', 0.0), \
+                mock.patch.object(autocomplete.maps_client, 'get', side_effect=places), \
+                mock.patch.object(autocomplete.time, 'monotonic', return_value=1000.0) as clock:
+            autocomplete.fetch_google_suggestions('westl')
+            autocomplete.fetch_google_suggestions('westla')
+            clock.return_value = 1000.0 + 601
+            autocomplete.fetch_google_suggestions('westlan')
+        self.assertEqual(sent_types, [True, False, False, True, False])
+
+
+class AcceptRaceTests(ConcurrentWritesTestCase):
+    def test_simultaneous_accepts_have_exactly_one_winner(self):
+        customer = User.objects.create_user(email='customer@example.com', password='pass')
+        drivers = [
+            User.objects.create_user(email=f'driver{i}@example.com', password=None, user_type='driver')
+            for i in range(50)
+        ]
+        ride = make_ride(customer, status='requested')
+        record_offers(ride.id, [driver.id for driver in drivers[:10]])
+
+        results = []
+        sent = []
+        start = threading.Barrier(len(drivers))
+
+        def accept(driver):
+            client = APIClient()
+            client.force_authenticate(driver)
+            start.wait()
+            try:
+                results.append((driver.id, client.post(f'/api/auth/rides/{ride.id}/accept/').status_code))
+            finally:
+                connection.close()
+
+        def record(group_messages):
+            sent.extend(group_messages)
+            return {'sent': len(group_messages), 'failed': {}, 'elapsed_ms': 0}
+
+        with mock.patch.object(views, 'send_to_groups', side_effect=record):
+            threads = [threading.Thread(target=accept, args=(driver,)) for driver in drivers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        winners = [driver_id for driver_id, status_code in results if status_code == 200]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(sorted(status_code for _, status_code in results), [200] + [409] * 49)
+        ride.refresh_from_db()
+        self.assertEqual((ride.status, ride.driver_id), ('accepted', winners[0]))
+        self.assertEqual(ride.transitions.count(), 1)
+
+        taken = {group for group, message in sent if message['type'] == 'ride_taken'}
+        self.assertEqual(taken, {f'driver_{driver.id}' for driver in drivers[:10] if driver.id != winners[0]})
+        self.assertEqual(pop_offered_drivers(ride.id), [])
+
+
+class MapsClientTests(TestCase):
+    def client_with(self, *outcomes, **settings):
+        with self.settings(MAPS_RETRY_BACKOFF_SECONDS=0, **settings):
+            client = GoogleMapsClient()
+        session_get = mock.Mock(side_effect=list(outcomes))
+        client.session.get = session_get
+        return client, session_get
+
+    def ok(self, status='OK'):
+        response = mock.Mock()
+        response.json.return_value = {'status': status}
+        return response
+
+    def test_connection_errors_are_retried(self):
+        client, session_get = self.client_with(requests.ConnectionError('reset'), self.ok())
+        self.assertEqual(client.get('geocode', {})['status'], 'OK')
+        self.assertEqual(session_get.call_count, 2)
+
+    def test_read_timeouts_are_not_retried_by_default(self):
+        client, session_get = self.client_with(requests.ReadTimeout('slow'), self.ok())
+        with self.assertRaises(MapsUnavailable):
+            client.get('geocode', {})
+        self.assertEqual(session_get.call_count, 1)
+
+        client, session_get = self.client_with(requests.ReadTimeout('slow'), self.ok())
+        self.assertEqual(client.get('geocode', {}, retry_read_timeouts=True)['status'], 'OK')
+
+    def test_attempts_stop_at_the_call_deadline(self):
+        client, session_get = self.client_with(*[requests.ConnectionError('down')] * 3, MAPS_MAX_RETRIES=2)
+        with mock.patch('ryde_app.maps_client.time.monotonic', side_effect=[0, 0, 0, 7, 7, 7]):
+            with self.assertRaises(MapsUnavailable):
+                client.get('geocode', {}, deadline=6)
+        self.assertEqual(session_get.call_count, 1)
+        self.assertLessEqual(session_get.call_args.kwargs['timeout'][1], 6)
+
+    def test_every_failed_attempt_counts_towards_the_breaker(self):
+        client, session_get = self.client_with(*[self.ok('UNKNOWN_ERROR')] * 6, MAPS_MAX_RETRIES=2,
+                                               MAPS_BREAKER_FAILURES=3)
+        with self.assertRaises(MapsUnavailable):
+            client.get('geocode', {})
+        self.assertEqual(client.breakers['geocode'].state, 'open')
+        with self.assertRaises(MapsUnavailable):
+            client.get('geocode', {})
+        self.assertEqual(session_get.call_count, 3)
+
+    def test_half_open_lets_exactly_one_probe_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+        with mock.patch('ryde_app.maps_client.time.monotonic', return_value=100.0) as clock:
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+            clock.return_value = 131.0
+            self.assertEqual([breaker.allow() for _ in range(5)], [True, False, False, False, False])
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+            clock.return_value = 162.0
+            self.assertTrue(breaker.allow())
+            breaker.record_success()
+            self.assertTrue(breaker.allow())
+            self.assertTrue(breaker.allow())
+
+
+class VectorisedDistanceTests(TestCase):
+    def setUp(self):
+        rng = random.Random(11)
+        # Mostly around Nairobi, plus points anywhere including near the poles and the antimeridian
+        self.points = [(rng.uniform(-1.45, -1.15), rng.uniform(36.65, 37.05)) for _ in range(300)]
+        self.points += [(rng.uniform(-89.9, 89.9), rng.uniform(-180, 180)) for _ in range(200)]
+        self.points += [(0.0, 179.99), (0.0, -179.99), (-1.2864, 36.8172)]
+
+    def test_distances_to_point_matches_scalar(self):
+        lats = [lat for lat, _ in self.points]
+        lngs = [lng for _, lng in self.points]
+        for lat, lng in self.points[::25]:
+            vectorised = distances_to_point(lats, lngs, lat, lng)
+            for index, (point_lat, point_lng) in enumerate(self.points):
+                self.assertAlmostEqual(
+                    float(vectorised[index]), calculate_distance(lat, lng, point_lat, point_lng), delta=1e-6
+                )
+
+    def test_distance_matrix_matches_scalar(self):
+        drivers = self.points[:40]
+        rides = self.points[-60:]
+        matrix = distance_matrix([p[0] for p in drivers], [p[1] for p in drivers],
+                                 [p[0] for p in rides], [p[1] for p in rides])
+        for row, driver in enumerate(drivers):
+            for column, ride in enumerate(rides):
+                self.assertAlmostEqual(float(matrix[row][column]), calculate_distance(*driver, *ride), delta=1e-6)
+
+    def test_scalar_fallback_without_numpy(self):
+        lats = [lat for lat, _ in self.points[:20]]
+        lngs = [lng for _, lng in self.points[:20]]
+        with mock.patch('ryde_app.geo.np', None):
+            fallback = distances_to_point(lats, lngs, -1.2864, 36.8172)
+        self.assertEqual(fallback, [calculate_distance(-1.2864, 36.8172, lat, lng) for lat, lng in zip(lats, lngs)])
+
+
+class ReportQueryCountTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        self.customer = User.objects.create_user(email='reports@example.com', password=None)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def seed(self, count, days):
+        now = timezone.now()
+        for i in range(count):
+            ride = make_ride(self.customer, status='completed', fare=50)
+            Ride.objects.filter(id=ride.id).update(created_at=now - timedelta(days=i * days // count))
+            user = User.objects.create_user(email=f'growth{count}-{i}@example.com', password=None)
+            User.objects.filter(id=user.id).update(created_at=now - timedelta(days=i % 7))
+        ride_metrics.rebuild()
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(captured)
+
+    def test_earnings_report_query_count_independent_of_range(self):
+        self.seed(10, 365)
+        expected = self.queries('/api/auth/admin/reports/earnings/?period=week')
+        with self.assertNumQueries(expected):
+            year = self.client.get('/api/auth/admin/reports/earnings/?period=year').data
+        self.assertEqual(year['summary']['total_rides'], 10)
+        self.seed(60, 365)
+        with self.assertNumQueries(expected):
+            self.client.get('/api/auth/admin/reports/earnings/?period=week')
+        with self.assertNumQueries(expected):
+            self.client.get('/api/auth/admin/reports/earnings/?period=year&interval=month')
+
+    def test_usage_report_query_count_independent_of_data_size(self):
+        self.seed(5, 30)
+        expected = self.queries('/api/auth/admin/reports/usage/')
+        self.seed(50, 30)
+        with self.assertNumQueries(expected):
+            usage = self.client.get('/api/auth/admin/reports/usage/').data
+        growth = usage['user_metrics']['growth_data']
+        self.assertEqual(len(growth), 7)
+        self.assertEqual(growth[-1]['total_users'], User.objects.count())
+
+
+class TimeSeriesTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='series@example.com', password=None)
+
+    def ride_on(self, day):
+        ride = make_ride(self.customer)
+        created = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+        Ride.objects.filter(id=ride.id).update(created_at=created)
+
+    def test_empty_days_are_zero_filled(self):
+        self.ride_on(date(2026, 3, 2))
+        self.ride_on(date(2026, 3, 2))
+        self.ride_on(date(2026, 3, 5))
+        series = time_series(Ride.objects.all(), 'created_at', date(2026, 3, 1), date(2026, 3, 6), rides=Count('id'))
+        self.assertEqual([row['period'] for row in series], [date(2026, 3, d) for d in range(1, 7)])
+        self.assertEqual([row['rides'] for row in series], [0, 2, 0, 0, 1, 0])
+
+    def test_week_buckets_start_on_monday(self):
+        # 2026-03-01 is a Sunday, so it belongs to the week starting 2026-02-23
+        for day in (date(2026, 3, 1), date(2026, 3, 2), date(2026, 3, 8), date(2026, 3, 16)):
+            self.ride_on(day)
+        series = time_series(Ride.objects.all(), 'created_at', date(2026, 3, 1), date(2026, 3, 20),
+                             bucket='week', rides=Count('id'))
+        self.assertEqual(
+            [(row['period'], row['rides']) for row in series],
+            [(date(2026, 2, 23), 1), (date(2026, 3, 2), 2), (date(2026, 3, 9), 0), (date(2026, 3, 16), 1)],
+        )
+
+    def test_month_buckets(self):
+        for day in (date(2025, 12, 31), date(2026, 1, 1), date(2026, 1, 31), date(2026, 3, 15)):
+            self.ride_on(day)
+        series = time_series(Ride.objects.all(), 'created_at', date(2025, 12, 15), date(2026, 3, 20),
+                             bucket='month', rides=Count('id'))
+        self.assertEqual(
+            [(row['period'], row['rides']) for row in series],
+            [(date(2025, 12, 1), 1), (date(2026, 1, 1), 2), (date(2026, 2, 1), 0), (date(2026, 3, 1), 1)],
+        )
+
+
+class AdminUserListQueryCountTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.seeded = 0
+
+    def seed(self, count):
+        for i in range(self.seeded, self.seeded + count):
+            customer = User.objects.create_user(email=f'customer{i}@example.com', password=None)
+            driver = User.objects.create_user(
+                email=f'driver{i}@example.com', password=None,
+                user_type='driver' if i % 2 else 'boda_rider', approval_status='approved',
+            )
+            if i % 3:
+                Vehicle.objects.create(
+                    driver=driver, vehicle_type='economy', license_plate=f'KAA {i:03d}A',
+                    make='Toyota', model='Axio', year=2018, color='White',
+                )
+            if i % 2:
+                UserProfile.objects.get_or_create(user=customer)
+            make_ride(customer, driver, status='completed', fare=100 + i)
+            make_ride(customer, driver, status='cancelled')
+        self.seeded += count
+
+    def assert_constant_queries(self, run):
+        self.seed(2)
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        self.seed(12)
+        with self.assertNumQueries(len(captured)):
+            return run()
+
+    def test_admin_user_management(self):
+        data = self.assert_constant_queries(
+            lambda: self.client.get('/api/auth/admin/users/?page_size=100').data
+        )
+        self.assertEqual(len(data['users']), User.objects.filter(is_active=True).count())
+
+    def test_get_approved_drivers(self):
+        data = self.assert_constant_queries(lambda: self.client.get('/api/auth/admin/drivers/approved/').data)
+        self.assertEqual(len(data), 14)
+        first = next(row for row in data if row['email'] == 'driver1@example.com')
+        self.assertEqual(first['ride_stats']['completed_rides'], 1)
+        self.assertEqual(first['ride_stats']['total_rides_as_driver'], 2)
+        self.assertEqual(first['ride_stats']['total_earnings'], 101.0)
+
+    def test_admin_user_serializer_many(self):
+        users = lambda: annotate_ride_stats(User.objects.select_related('vehicle').order_by('id'))
+        data = self.assert_constant_queries(lambda: AdminUserSerializer(users(), many=True).data)
+        self.assertEqual(len(data), 29)
+        driver = next(row for row in data if row['email'] == 'driver3@example.com')
+        self.assertEqual(driver['ride_stats'], {'total_rides_as_customer': 0, 'total_rides_as_driver': 2})
+
+
+class AdminRideUpdateTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        self.customer = User.objects.create_user(email='rider@example.com', password=None)
+        self.driver = User.objects.create_user(email='driver@example.com', password=None, user_type='driver')
+        self.ride = make_ride(self.customer, self.driver, status='accepted', fare=200)
+        ride_metrics.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = f'/api/auth/admin/rides/{self.ride.id}/'
+
+    def put(self, data):
+        with mock.patch('ryde_app.ride_lifecycle.send_to_groups',
+                        return_value={'sent': 0, 'failed': {}, 'elapsed_ms': 0}) as send:
+            response = self.client.put(self.url, data, format='json')
+        return response, send
+
+    def rollup(self, status):
+        return DailyRideMetrics.objects.filter(status=status).values_list('ride_count', 'fare_total').first()
+
+    def test_status_change_goes_through_transition(self):
+        response, send = self.put({'status': 'cancelled', 'fare': '250.00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.ride.refresh_from_db()
+        self.assertEqual((self.ride.status, self.ride.fare), ('cancelled', 250))
+        move = RideStatusTransition.objects.get(ride=self.ride)
+        self.assertEqual((move.from_status, move.to_status, move.actor), ('accepted', 'cancelled', self.admin))
+        self.assertEqual(self.rollup('cancelled'), (1, 250))
+        self.assertIn(self.rollup('accepted'), (None, (0, 0)))
+        send.assert_called_once()
+
+    def test_invalid_transition_is_refused_and_nothing_is_written(self):
+        Ride.objects.filter(id=self.ride.id).update(status='completed')
+        ride_metrics.rebuild()
+        response, send = self.put({'status': 'requested', 'fare': '999.00'})
+        self.assertEqual(response.status_code, 400)
+        self.ride.refresh_from_db()
+        self.assertEqual((self.ride.status, self.ride.fare), ('completed', 200))
+        self.assertFalse(RideStatusTransition.objects.exists())
+        send.assert_not_called()
+
+    def put_after_concurrent_change(self, data, status):
+        # The view loads the ride, then another request moves it on before the write
+        stale = Ride.objects.get(id=self.ride.id)
+        Ride.objects.filter(id=self.ride.id).update(status=status)
+        with mock.patch.object(Ride.objects, 'select_related') as select_related:
+            select_related.return_value.get.return_value = stale
+            response, _ = self.put(data)
+        self.ride.refresh_from_db()
+        return response
+
+    def test_concurrent_status_change_returns_conflict(self):
+        response = self.put_after_concurrent_change({'status': 'cancelled', 'fare': '999.00'}, 'driver_arrived')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((self.ride.status, self.ride.fare), ('driver_arrived', 200))
+
+    def test_field_update_does_not_overwrite_status(self):
+        response = self.put_after_concurrent_change({'pickup_address': 'Gate B'}, 'driver_arrived')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((self.ride.status, self.ride.pickup_address), ('driver_arrived', 'Gate B'))
+
+
+@skipIf(fakeredis is None, 'fakeredis is not installed')
+class RedisLiveLocationPruneTests(TestCase):
+    def setUp(self):
+        server = fakeredis.FakeRedis(decode_responses=True)
+        with mock.patch('redis.Redis.from_url', return_value=server):
+            self.backend = RedisLocationBackend('redis://test', ttl_seconds=60)
+        self.store = LiveLocationStore(self.backend, flush_seconds=5)
+
+    def ping(self, driver_id, age, lat=-1.2864, lng=36.8172):
+        snapshot = {
+            'driver_id': driver_id, 'lat': lat, 'lng': lng, 'heading': None, 'speed': None,
+            'is_online': True, 'timestamp': time.time() - age,
+        }
+        self.backend.write(snapshot, mark_dirty=False)
+
+    def test_stale_members_are_pruned_from_search(self):
+        self.ping(1, age=5)
+        self.ping(2, age=300)
+        self.assertEqual(self.backend.prune(), 1)
+        self.assertEqual([driver_id for driver_id, _ in self.backend.nearby(-1.2864, 36.8172, 5)], [1])
+        self.assertEqual(self.backend.client.zrange(RedisLocationBackend.SEEN_KEY, 0, -1), ['1'])
+
+    def test_search_prunes_when_nothing_flushes(self):
+        self.ping(1, age=5)
+        self.ping(2, age=300)
+        self.assertEqual([driver_id for driver_id, _ in self.store.nearby(-1.2864, 36.8172, 5)], [1])
+
+    def test_going_offline_removes_the_member(self):
+        self.ping(1, age=5)
+        self.backend.write({
+            'driver_id': 1, 'lat': -1.2864, 'lng': 36.8172, 'heading': None, 'speed': None,
+            'is_online': False, 'timestamp': time.time(),
+        }, mark_dirty=False)
+        self.assertEqual(self.backend.client.zcard(RedisLocationBackend.SEEN_KEY), 0)
+        self.assertEqual(self.backend.nearby(-1.2864, 36.8172, 5), [])
+
+    def test_driver_pinging_during_prune_keeps_its_place(self):
+        self.ping(1, age=300)
+        # The ping lands after the range read but before the removal
+        self.backend.client.hset(self.backend._driver_key(1), 'timestamp', time.time())
+        self.assertEqual(self.backend.prune(), 0)
+        self.assertEqual([driver_id for driver_id, _ in self.backend.nearby(-1.2864, 36.8172, 5)], [1])
+
+
+class RideMetricsDeleteTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        self.customer = User.objects.create_user(email='leaving@example.com', password=None)
+        self.other = User.objects.create_user(email='staying@example.com', password=None)
+        self.driver = User.objects.create_user(email='driver@example.com', password=None, user_type='driver')
+        make_ride(self.customer, self.driver, status='completed', fare=120)
+        make_ride(self.customer, self.driver, status='completed', fare=80)
+        make_ride(self.customer, status='cancelled')
+        make_ride(self.other, self.driver, status='completed', fare=50)
+        ride_metrics.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def rollup(self):
+        return sorted(
+            DailyRideMetrics.objects.filter(ride_count__gt=0).values_list('status', 'ride_count', 'fare_total')
+        )
+
+    def test_deleting_a_customer_uncounts_their_rides(self):
+        response = self.client.delete(f'/api/auth/admin/users/{self.customer.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rollup(), [('completed', 1, 50)])
+        ride_metrics.rebuild()
+        self.assertEqual(self.rollup(), [('completed', 1, 50)])
+
+    def test_deleting_a_driver_keeps_their_rides_counted(self):
+        before = self.rollup()
+        self.client.delete(f'/api/auth/admin/users/{self.driver.id}/')
+        self.assertEqual(Ride.objects.filter(driver__isnull=True).count(), 4)
+        self.assertEqual(self.rollup(), before)
+
+    def test_deleting_rides_directly(self):
+        Ride.objects.filter(status='cancelled').delete()
+        self.assertEqual(self.rollup(), [('completed', 3, 250)])
+
+
+class TieredMapsCacheStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tiered = TieredMapsCache('test_stats', ttl=60, stats_flush_seconds=3600)
+
+    def tearDown(self):
+        maps_cache._registry.pop('test_stats', None)
+
+    def test_local_hits_do_no_io(self):
+        self.tiered.set('a', {'lat': 1})
+        with mock.patch('ryde_app.maps_cache.cache') as shared:
+            for _ in range(100):
+                self.assertEqual(self.tiered.get('a'), {'lat': 1})
+        self.assertEqual(shared.mock_calls, [])
+
+    def test_counts_reach_the_shared_counters(self):
+        self.tiered.set('a', {'lat': 1})
+        for _ in range(5):
+            self.tiered.get('a')
+        self.tiered.get('missing')
+        self.assertEqual(self.tiered.stats()['hits'], 5)
+        self.assertEqual(self.tiered.stats()['misses'], 1)
+
+        # Another worker sees them once they are flushed
+        other = TieredMapsCache('test_stats', ttl=60, stats_flush_seconds=3600)
+        self.assertEqual((other.stats()['hits'], other.stats()['misses']), (5, 1))
+
+    def test_shared_lookups_flush_once_the_interval_has_passed(self):
+        self.tiered.stats_flush_seconds = 0
+        self.tiered.set('a', {'lat': 1})
+        self.tiered.get('a')
+        self.tiered.get('missing')
+        self.assertEqual(cache.get(self.tiered._counter_key('hits')), 1)
+        self.assertEqual(cache.get(self.tiered._counter_key('misses')), 1)
+
+
+class RoadGraphFromOsmTests(TestCase):
+    OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="-1.2800" lon="36.8100"/>
+  <node id="2" lat="-1.2810" lon="36.8110">
+    <tag k="highway" v="speed_camera"/>
+    <tag k="maxspeed" v="10"/>
+  </node>
+  <node id="3" lat="-1.2820" lon="36.8120">
+    <tag k="oneway" v="yes"/>
+  </node>
+  <node id="4" lat="-1.2830" lon="36.8130">
+    <tag k="highway" v="residential"/>
+  </node>
+  <way id="10">
+    <nd ref="1"/>
+    <nd ref="2"/>
+    <nd ref="3"/>
+    <tag k="highway" v="residential"/>
+  </way>
+  <way id="11">
+    <nd ref="3"/>
+    <nd ref="4"/>
+    <tag k="building" v="yes"/>
+  </way>
+</osm>
+"""
+
+    def test_node_tags_do_not_leak_into_ways(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.osm', delete=False) as handle:
+            handle.write(self.OSM)
+        self.addCleanup(os.remove, handle.name)
+
+        graph = RoadGraph.from_osm(handle.name)
+        # Only the residential way: three nodes, both directions, at the class default speed
+        self.assertEqual(len(graph.lats), 3)
+        self.assertEqual(len(graph.targets), 4)
+        for length, seconds in zip(graph.lengths, graph.times):
+            self.assertAlmostEqual(length / seconds * 3.6, DEFAULT_SPEEDS_KMH['residential'], places=3)
+
+    def graph_path(self):
+        handle, path = tempfile.mkstemp(suffix='.graph')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_saved_graph_loads_back(self):
+        lats = [-1.28, -1.281, -1.282]
+        lngs = [36.81, 36.811, 36.812]
+        graph = RoadGraph.from_edges(lats, lngs, [(0, 1, 40), (1, 2, 25), (2, 1, 25)], snap_cell_km=0.25)
+        path = self.graph_path()
+        graph.save(path)
+
+        loaded = RoadGraph.load(path)
+        for name in ('lats', 'lngs', 'offsets', 'targets', 'lengths', 'times'):
+            self.assertEqual(getattr(loaded, name), getattr(graph, name), name)
+        self.assertAlmostEqual(loaded.max_speed_mps, graph.max_speed_mps)
+        self.assertEqual(loaded.snap_cell_km, 0.25)
+        self.assertEqual(loaded.route(*PICKUP, *PICKUP), graph.route(*PICKUP, *PICKUP))
+
+    def test_load_refuses_files_that_are_not_graphs(self):
+        path = self.graph_path()
+        with open(path, 'wb') as handle:
+            pickle.dump({'version': 1}, handle)
+        with self.assertRaises(ValueError):
+            RoadGraph.load(path)
+
+    def test_load_refuses_a_truncated_graph(self):
+        graph = RoadGraph.from_edges([-1.28, -1.281], [36.81, 36.811], [(0, 1, 40)])
+        path = self.graph_path()
+        graph.save(path)
+        with open(path, 'rb+') as handle:
+            handle.truncate(os.path.getsize(path) - 4)
+        with self.assertRaises(ValueError):
+            RoadGraph.load(path)
+
+
+PICKUP = (-1.2864, 36.8172)
+
+
+def km_north(km):
+    """A point ``km`` kilometres north of PICKUP"""
+    return PICKUP[0] + km / KM_PER_DEGREE_LAT, PICKUP[1]
+
+
+class DispatchCandidateTests(TestCase):
+    def setUp(self):
+        self.index = DriverLocationIndex(cell_km=1.0)
+        self.nearby = mock.Mock(side_effect=self.index.nearby)
+        patcher = mock.patch('ryde_app.dispatch.live_locations', mock.Mock(nearby=self.nearby))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.customer = User.objects.create_user(email='dispatch-customer@example.com', password=None)
+
+    def driver(self, name, km, vehicle_type='economy', online=True, user_type='driver', **fields):
+        values = {'user_type': user_type, 'approval_status': 'approved'}
+        values.update(fields)
+        driver = User.objects.create_user(email=f'{name}@example.com', password=None, **values)
+        Vehicle.objects.create(
+            driver=driver, vehicle_type=vehicle_type, license_plate=name[:15],
+            make='Toyota', model='Vitz', year=2019, color='Silver',
+        )
+        lat, lng = km_north(km)
+        DriverLocation.objects.create(driver=driver, lat=lat, lng=lng, is_online=online)
+        # The live store can lag the database, so index the driver either way
+        self.index.upsert(driver.id, lat, lng)
+        return driver
+
+    def candidates(self, vehicle_type='economy', max_drivers=5, radii_km=(2, 5, 10)):
+        return find_dispatch_candidates(*PICKUP, vehicle_type, max_drivers=max_drivers, radii_km=list(radii_km))
+
+    def ids(self, candidates):
+        return [driver_id for driver_id, _ in candidates]
+
+    def test_nearest_drivers_first(self):
+        self.driver('far', 1.8)
+        near = self.driver('near', 0.3)
+        middle = self.driver('middle', 1.0)
+        beyond = self.driver('beyond', 1.5)
+        candidates = self.candidates(max_drivers=3)
+        self.assertEqual(self.ids(candidates), [near.id, middle.id, beyond.id])
+        distances = [distance for _, distance in candidates]
+        self.assertEqual(distances, sorted(distances))
+        self.assertAlmostEqual(distances[0], 0.3, places=2)
+
+    def test_search_stops_at_the_first_ring_with_enough_drivers(self):
+        self.driver('one', 0.5)
+        self.driver('two', 1.5)
+        self.driver('outer', 4)
+        self.assertEqual(len(self.candidates(max_drivers=2)), 2)
+        self.assertEqual([call.args[2] for call in self.nearby.call_args_list], [2])
+
+    def test_search_widens_until_enough_drivers(self):
+        inner = self.driver('inner', 1)
+        outer = self.driver('outer', 4)
+        farthest = self.driver('farthest', 8)
+        self.assertEqual(self.ids(self.candidates(max_drivers=2)), [inner.id, outer.id])
+        self.assertEqual([call.args[2] for call in self.nearby.call_args_list], [2, 5])
+        self.assertEqual(self.ids(self.candidates(max_drivers=5)), [inner.id, outer.id, farthest.id])
+
+    def test_vehicle_type_must_match(self):
+        self.driver('comfort', 0.5, vehicle_type='comfort')
+        economy = self.driver('economy', 1)
+        self.assertEqual(self.ids(self.candidates('economy')), [economy.id])
+
+    def test_driver_offline_in_the_database_is_skipped(self):
+        self.driver('offline', 0.5, online=False)
+        online = self.driver('online', 1)
+        self.assertEqual(self.ids(self.candidates()), [online.id])
+
+    def test_driver_with_an_active_ride_is_skipped(self):
+        busy = self.driver('busy', 0.5)
+        idle = self.driver('idle', 1)
+        finished = self.driver('finished', 1.5)
+        make_ride(self.customer, busy, status='driver_arrived')
+        make_ride(self.customer, finished, status='completed')
+        self.assertEqual(self.ids(self.candidates()), [idle.id, finished.id])
+
+    def test_unapproved_inactive_and_non_driver_accounts_are_skipped(self):
+        self.driver('pending', 0.2, approval_status='pending')
+        self.driver('inactive', 0.4, is_active=False)
+        self.driver('customer', 0.6, user_type='customer')
+        boda = self.driver('boda', 0.8, user_type='boda_rider')
+        self.assertEqual(self.ids(self.candidates()), [boda.id])
+
+    def test_no_drivers_nearby(self):
+        self.driver('distant', 30)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.candidates(), [])
+        self.assertEqual([call.args[2] for call in self.nearby.call_args_list], [2, 5, 10])
+
+
+class DriverLocationResponseTests(TestCase):
+    def test_response_keeps_the_serializer_shape(self):
+        driver = User.objects.create_user(
+            email='located@example.com', password=None, user_type='driver',
+            first_name='Jane', last_name='Wanjiru', phone_number='0712345678',
+        )
+        Vehicle.objects.create(
+            driver=driver, vehicle_type='comfort', license_plate='KDA 123X',
+            make='Mazda', model='Demio', year=2017, color='Blue',
+        )
+        client = APIClient()
+        client.force_authenticate(driver)
+
+        response = client.post('/api/auth/driver/location/', {'lat': -1.29, 'lng': 36.82, 'is_online': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        location = DriverLocation.objects.get(driver=driver)
+        expected = DriverLocationSerializer(location).data
+        self.assertLessEqual(set(expected), set(response.data))
+        for field in ('id', 'driver', 'driver_name', 'driver_phone', 'vehicle_type', 'lat', 'lng', 'is_online'):
+            self.assertEqual(response.data[field], expected[field], field)
+        self.assertEqual(response.data['vehicle_type'], 'comfort')
+
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def websocket(user, role=None):
+    """A communicator for ``user``'s socket, authenticated like the real ASGI stack"""
+    application = JWTAuthMiddlewareStack(URLRouter(routing.websocket_urlpatterns))
+    token = issue_tokens(user).access_token
+    return WebsocketCommunicator(application, f'/ws/{role or user.user_type}/{user.id}/?token={token}')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class DriverLocationIngestTests(TransactionTestCase):
+    def setUp(self):
+        jwt_auth._user_cache.clear()
+        self.customer = User.objects.create_user(email='customer@example.com', password=None)
+        self.driver = User.objects.create_user(email='driver@example.com', password=None, user_type='driver')
+        self.clock = [1000.0]
+        self.live = mock.Mock()
+        self.broadcaster = RideLocationBroadcaster(interval_seconds=0)
+        for target, value in (
+            ('ryde_app.consumers.time', mock.Mock(monotonic=lambda: self.clock[0])),
+            ('ryde_app.consumers.live_locations', self.live),
+            ('ryde_app.consumers.ride_location_broadcaster', self.broadcaster),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def connect(self, user=None):
+        communicator = websocket(user or self.driver)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'connection_established')
+        return communicator
+
+    async def send_fix(self, communicator, at, **data):
+        self.clock[0] = 1000.0 + at
+        await communicator.send_json_to({'type': 'location_update', 'data': data})
+        # Frames are handled in order, so the pong means the fix has been processed
+        await communicator.send_json_to({'type': 'ping'})
+        return await communicator.receive_json_from()
+
+    def recorded(self):
+        return [call.args[1:3] for call in self.live.record.call_args_list]
+
+    async def test_invalid_fixes_are_rejected(self):
+        communicator = await self.connect()
+        await communicator.send_json_to({'type': 'location_update', 'data': {'lat': 'north', 'lng': 36.8}})
+        self.assertEqual(await communicator.receive_json_from(),
+                         {'type': 'location_error', 'data': {'message': 'Invalid coordinates'}})
+        await communicator.send_json_to({'type': 'location_update', 'data': {'lat': 91, 'lng': 36.8}})
+        self.assertEqual((await communicator.receive_json_from())['data']['message'], 'Invalid coordinate values')
+        await communicator.send_json_to({'type': 'location_update', 'data': {'lng': 36.8}})
+        self.assertEqual((await communicator.receive_json_from())['data']['message'], 'Invalid coordinates')
+        self.live.record.assert_not_called()
+        await communicator.disconnect()
+
+    async def test_out_of_range_heading_and_speed_are_dropped(self):
+        communicator = await self.connect()
+        await self.send_fix(communicator, 0, lat=-1.28, lng=36.81, heading=400, speed=-3)
+        self.assertEqual(self.live.record.call_args.kwargs, {'heading': None, 'speed': None, 'is_online': True})
+        await communicator.disconnect()
+
+    async def test_throttle_rules(self):
+        lat, lng = PICKUP
+        step = 1 / KM_PER_DEGREE_LAT / 1000  # one metre north
+        communicator = await self.connect()
+        await self.send_fix(communicator, 0, lat=lat, lng=lng)
+        await self.send_fix(communicator, 1, lat=lat + 100 * step, lng=lng)   # under 2 s: dropped
+        await self.send_fix(communicator, 5, lat=lat + 5 * step, lng=lng)     # under 10 m: dropped
+        await self.send_fix(communicator, 6, lat=lat + 50 * step, lng=lng)    # accepted
+        await self.send_fix(communicator, 20, lat=lat + 52 * step, lng=lng)   # parked: dropped
+        await self.send_fix(communicator, 37, lat=lat + 52 * step, lng=lng)   # 30 s of silence: accepted
+        self.assertEqual(self.recorded(), [(lat, lng), (lat + 50 * step, lng), (lat + 52 * step, lng)])
+        await communicator.disconnect()
+
+    async def test_throttle_state_belongs_to_the_connection(self):
+        first = await self.connect()
+        await self.send_fix(first, 0, lat=-1.28, lng=36.81)
+        await first.disconnect()
+        second = await self.connect()
+        await self.send_fix(second, 0.5, lat=-1.28, lng=36.81)
+        self.assertEqual(len(self.recorded()), 2)
+        self.assertFalse(hasattr(DriverConsumer, 'accepted_fixes'))
+        await second.disconnect()
+
+    async def test_fix_with_ride_reaches_the_customer(self):
+        ride = await database_sync_to_async(make_ride)(self.customer, self.driver, status='accepted')
+        layer = get_channel_layer()
+        customer_channel = await layer.new_channel()
+        await layer.group_add(f'customer_{self.customer.id}', customer_channel)
+
+        communicator = await self.connect()
+        await self.send_fix(communicator, 0, lat=-1.28, lng=36.81, heading=90, ride_id=ride.id, timestamp='t1')
+        message = await asyncio.wait_for(layer.receive(customer_channel), 1)
+        self.assertEqual(message['type'], 'location_update')
+        self.assertEqual(message['data'], {
+            'ride_id': ride.id, 'driver_id': self.driver.id, 'lat': -1.28, 'lng': 36.81,
+            'heading': 90.0, 'speed': None, 'timestamp': 't1',
+        })
+        await communicator.disconnect()
+
+    async def test_fix_for_someone_elses_ride_is_not_published(self):
+        other = await database_sync_to_async(User.objects.create_user)(
+            email='other@example.com', password=None, user_type='driver'
+        )
+        ride = await database_sync_to_async(make_ride)(self.customer, other, status='accepted')
+        communicator = await self.connect()
+        await self.send_fix(communicator, 0, lat=-1.28, lng=36.81, ride_id=ride.id)
+        self.assertEqual(self.live.record.call_count, 1)
+        self.assertEqual(self.broadcaster.sent, 0)
+        await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class RideParticipantsCacheTests(TransactionTestCase):
+    def setUp(self):
+        jwt_auth._user_cache.clear()
+        self.customer = User.objects.create_user(email='customer@example.com', password=None)
+        self.driver = User.objects.create_user(email='driver@example.com', password=None, user_type='driver')
+        self.new_driver = User.objects.create_user(email='second@example.com', password=None, user_type='driver')
+        self.ride = make_ride(self.customer, self.driver, status='accepted')
+
+        self.loads = []
+        load = RideParticipantsMixin.__dict__['load_ride_participants']
+
+        async def counting_load(consumer, ride_id):
+            self.loads.append(ride_id)
+            return await load.__get__(consumer, type(consumer))(ride_id)
+
+        patcher = mock.patch.object(RideParticipantsMixin, 'load_ride_participants', counting_load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def connect(self, user):
+        communicator = websocket(user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()
+        return communicator
+
+    async def listen(self, group):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(group, channel)
+        return channel
+
+    async def chat(self, communicator, message_type, listener):
+        await communicator.send_json_to({'type': message_type, 'data': {'ride_id': self.ride.id, 'message': 'hi'}})
+        return await asyncio.wait_for(get_channel_layer().receive(listener), 1)
+
+    async def deliver(self, communicator, group, event_type):
+        await get_channel_layer().group_send(group, {'type': event_type, 'data': {'ride_id': self.ride.id}})
+        self.assertEqual((await communicator.receive_json_from())['type'], event_type)
+
+    async def reassign(self):
+        await Ride.objects.filter(id=self.ride.id).aupdate(driver=self.new_driver)
+
+    async def test_customer_cache_hit_needs_no_query(self):
+        communicator = await self.connect(self.customer)
+        listener = await self.listen(f'driver_{self.driver.id}')
+        await self.chat(communicator, 'customer_message', listener)
+        await self.chat(communicator, 'customer_message', listener)
+        self.assertEqual(self.loads, [self.ride.id])
+        await communicator.disconnect()
+
+    async def test_customer_events_drop_the_cached_ride(self):
+        for event_type in ('ride_status_update', 'ride_accepted'):
+            with self.subTest(event_type):
+                await Ride.objects.filter(id=self.ride.id).aupdate(driver=self.driver)
+                self.loads.clear()
+                communicator = await self.connect(self.customer)
+                old_driver = await self.listen(f'driver_{self.driver.id}')
+                new_driver = await self.listen(f'driver_{self.new_driver.id}')
+                await self.chat(communicator, 'customer_message', old_driver)
+
+                await self.reassign()
+                await self.deliver(communicator, f'customer_{self.customer.id}', event_type)
+                relayed = await self.chat(communicator, 'customer_message', new_driver)
+                self.assertEqual(relayed['type'], 'customer_message')
+                self.assertEqual(self.loads, [self.ride.id, self.ride.id])
+                await communicator.disconnect()
+
+    async def test_driver_cache_hit_needs_no_query(self):
+        communicator = await self.connect(self.driver)
+        listener = await self.listen(f'customer_{self.customer.id}')
+        await self.chat(communicator, 'driver_message', listener)
+        await self.chat(communicator, 'driver_message', listener)
+        self.assertEqual(self.loads, [self.ride.id])
+        await communicator.disconnect()
+
+    async def test_driver_events_drop_the_cached_ride(self):
+        listener = await self.listen(f'customer_{self.customer.id}')
+        for event_type in ('ride_status_update', 'ride_taken', 'ride_accepted_self'):
+            with self.subTest(event_type):
+                self.loads.clear()
+                communicator = await self.connect(self.driver)
+                await self.chat(communicator, 'driver_message', listener)
+                await self.deliver(communicator, f'driver_{self.driver.id}', event_type)
+                await self.chat(communicator, 'driver_message', listener)
+                self.assertEqual(self.loads, [self.ride.id, self.ride.id])
+                await communicator.disconnect()
+
+
+class RouteCacheKeyTests(TestCase):
+    STEP = 50 / (KM_PER_DEGREE_LAT * 1000)  # one 50 m grid step, the default ROUTE_CACHE_PRECISION_M
+
+    def setUp(self):
+        # Grid-aligned origin and destination so small offsets can't straddle a rounding boundary
+        self.origin = (round(-1.2864 / self.STEP) * self.STEP, round(36.8172 / self.STEP) * self.STEP)
+        self.destination = (round(-1.3000 / self.STEP) * self.STEP, round(36.8000 / self.STEP) * self.STEP)
+        self.noon = datetime(2026, 3, 2, 12, 0)
+
+    def key(self, origin, destination, now=None):
+        return route_cache_key(*origin, *destination, now=now or self.noon)
+
+    def metres(self, point, north_m, east_m):
+        return point[0] + north_m * self.STEP / 50, point[1] + east_m * self.STEP / 50
+
+    def test_nearby_points_share_a_key(self):
+        key = self.key(self.origin, self.destination)
+        self.assertEqual(self.key(self.metres(self.origin, 12, -15), self.metres(self.destination, -20, 8)), key)
+
+    def test_points_a_grid_step_apart_do_not(self):
+        key = self.key(self.origin, self.destination)
+        self.assertNotEqual(self.key(self.metres(self.origin, 60, 0), self.destination), key)
+        self.assertNotEqual(self.key(self.origin, self.metres(self.destination, 0, 60)), key)
+
+    def test_direction_matters(self):
+        self.assertNotEqual(self.key(self.origin, self.destination), self.key(self.destination, self.origin))
+
+    def test_time_of_day_buckets(self):
+        at = lambda hour, minute=0: self.key(self.origin, self.destination, datetime(2026, 3, 2, hour, minute))
+        self.assertEqual(at(7), at(9, 59))
+        self.assertEqual(at(17, 30), at(19))
+        self.assertEqual(at(22), at(3))
+        self.assertEqual(at(12), at(15))
+        self.assertEqual(len({at(8), at(18), at(23), at(12)}), 4)
+        self.assertNotEqual(at(6, 59), at(7))
+        self.assertEqual(
+            [time_of_day_bucket(datetime(2026, 3, 2, hour)) for hour in (6, 7, 10, 17, 20, 22, 5)],
+            ['offpeak', 'am_peak', 'offpeak', 'pm_peak', 'offpeak', 'night', 'night'],
+        )
+
+    @override_settings(ROUTE_CACHE_PRECISION_M=500)
+    def test_precision_setting_widens_the_grid(self):
+        self.assertEqual(
+            self.key(self.metres(self.origin, 100, 0), self.destination, datetime(2026, 3, 2, 12)).split(':')[1],
+            route_cache_key(*self.origin, *self.destination, now=self.noon).split(':')[1],
+        )
+
+
+class ReverseGeocodeCacheTests(TestCase):
+    STEP = 50 / (KM_PER_DEGREE_LAT * 1000)  # one 50 m cell, the default REVERSE_GEOCODE_CELL_M
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(maps_cache, 'reverse_geocode_cache', TieredMapsCache('test_reverse_geocode', ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Centre of a cell, so a few metres either way stays inside it
+        self.point = ((round(-1.2864 / self.STEP) + 0.5) * self.STEP, (round(36.8172 / self.STEP) + 0.5) * self.STEP)
+        maps_cache.store_reverse_geocode(*self.point, 'Kenyatta Avenue, Nairobi')
+
+    def offset(self, north_m, east_m=0):
+        return self.point[0] + north_m * self.STEP / 50, self.point[1] + east_m * self.STEP / 50
+
+    def lookup(self, north_m, east_m=0):
+        result = maps_cache.get_cached_reverse_geocode(*self.offset(north_m, east_m))
+        return result and result['formatted_address']
+
+    def test_hit_in_the_same_cell(self):
+        self.assertEqual(self.lookup(10, -10), 'Kenyatta Avenue, Nairobi')
+
+    def test_falls_back_to_a_neighbouring_cell_within_tolerance(self):
+        self.assertNotEqual(
+            maps_cache.reverse_geocode_cell(*self.offset(70), 50),
+            maps_cache.reverse_geocode_cell(*self.point, 50),
+        )
+        self.assertEqual(self.lookup(70), 'Kenyatta Avenue, Nairobi')
+
+    def test_nearest_neighbour_wins(self):
+        maps_cache.store_reverse_geocode(*self.offset(-90), 'Moi Avenue, Nairobi')
+        self.assertEqual(self.lookup(-60), 'Moi Avenue, Nairobi')
+        self.assertEqual(self.lookup(-35), 'Kenyatta Avenue, Nairobi')
+
+    def test_miss_beyond_tolerance(self):
+        self.assertIsNone(self.lookup(160))
+        # Within the scanned cells but still more than 100 m from the cached point
+        self.assertIsNone(self.lookup(90, 50))
+
+    def test_hits_and_misses_are_recorded(self):
+        self.lookup(0)
+        self.lookup(70)
+        self.lookup(500)
+        stats = maps_cache.reverse_geocode_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+
+class PlaceDetailStoreTests(TestCase):
+    PLACE_ID = 'ChIJp0lN2HIRLxgRTJKXslQCz_c'
+
+    def setUp(self):
+        cache.clear()
+        for patcher in (
+            mock.patch.object(places, 'place_details_cache', TieredMapsCache('test_place_details', ttl=60)),
+            mock.patch.object(warm_place_details, 'geocode_cache', TieredMapsCache('test_geocode', ttl=60)),
+            mock.patch.object(places.maps_client, 'get'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.google = places.maps_client.get
+
+    def place_details(self):
+        return APIClient().post('/api/auth/place-details/', {'place_id': self.PLACE_ID}, format='json')
+
+    def test_stored_place_skips_google(self):
+        PlaceDetail.objects.create(place_id=self.PLACE_ID, name='Sarit Centre', address='Karuna Road, Nairobi',
+                                   lat=-1.2615, lng=36.8025)
+        response = self.place_details()
+        self.assertEqual(response.data, {
+            'address': 'Karuna Road, Nairobi', 'name': 'Sarit Centre', 'lat': -1.2615, 'lng': 36.8025,
+        })
+        self.google.assert_not_called()
+
+    def test_stale_place_is_fetched_again(self):
+        PlaceDetail.objects.create(place_id=self.PLACE_ID, name='Sarit Centre', lat=-1.2615, lng=36.8025)
+        PlaceDetail.objects.update(fetched_at=timezone.now() - timedelta(days=91))
+        self.google.return_value = {'status': 'ZERO_RESULTS'}
+        self.assertEqual(self.place_details().status_code, 400)
+        self.google.assert_called_once()
+
+    def test_miss_is_fetched_once_and_persisted(self):
+        self.google.return_value = {'status': 'OK', 'result': {
+            'formatted_address': 'Karuna Road, Nairobi', 'name': 'Sarit Centre',
+            'geometry': {'location': {'lat': -1.2615, 'lng': 36.8025}},
+        }}
+        first = self.place_details()
+        self.assertEqual(self.google.call_args[0][0], 'place_details')
+
+        place = PlaceDetail.objects.get(place_id=self.PLACE_ID)
+        self.assertEqual((place.name, place.address, place.lat, place.lng),
+                         ('Sarit Centre', 'Karuna Road, Nairobi', -1.2615, 36.8025))
+
+        # A worker without the hot tier still answers from the table
+        with mock.patch.object(places, 'place_details_cache', TieredMapsCache('test_place_details_2', ttl=60)):
+            second = self.place_details()
+        self.assertEqual(second.data, first.data)
+        self.google.assert_called_once()
+
+    def warm(self, *args):
+        out = StringIO()
+        call_command('warm_place_details', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_warm_command_loads_the_landmark_fixture(self):
+        with open(warm_place_details.DEFAULT_FIXTURE) as fixture:
+            landmarks = json.load(fixture)
+
+        def geocode(endpoint, params):
+            index = next(i for i, entry in enumerate(landmarks) if entry['query'] == params['address'])
+            return {'status': 'OK', 'results': [{
+                'place_id': f'landmark-{index}', 'formatted_address': params['address'],
+                'geometry': {'location': {'lat': -1.2 - index / 1000, 'lng': 36.8}},
+            }]}
+        self.google.side_effect = geocode
+
+        self.assertIn(f'0 loaded, {len(landmarks)} fetched', self.warm())
+        self.assertEqual(PlaceDetail.objects.count(), len(landmarks))
+        self.assertEqual(PlaceDetail.objects.get(place_id='landmark-1').name, landmarks[1]['name'])
+        self.assertIsNotNone(warm_place_details.geocode_cache.get(geocode_cache_key(landmarks[1]['query'])))
+
+    def test_exported_fixture_loads_without_google(self):
+        PlaceDetail.objects.create(place_id=self.PLACE_ID, name='Sarit Centre', lat=-1.2615, lng=36.8025)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'places.json')
+            self.warm('--export', path)
+            PlaceDetail.objects.all().delete()
+
+            self.assertIn('1 loaded, 0 fetched, 0 already fresh', self.warm(path))
+            self.assertIn('0 loaded, 0 fetched, 1 already fresh', self.warm(path))
+        self.assertEqual(PlaceDetail.objects.get().as_response()['lat'], -1.2615)
+        self.google.assert_not_called()
+
+
+class FlakyChannelLayer(RecordingChannelLayer):
+    """Records sends, tracks how many overlap and fails the groups in ``failing``"""
+
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.in_flight = self.max_in_flight = 0
+
+    async def group_send(self, group, message):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.02)
+            if group in self.failing:
+                raise ConnectionError(f'{group} unreachable')
+            await super().group_send(group, message)
+        finally:
+            self.in_flight -= 1
+
+
+class SendToGroupsTests(TestCase):
+    def test_sends_are_gathered_and_failures_reported_per_group(self):
+        layer = FlakyChannelLayer(failing={'driver_2'})
+        groups = [f'driver_{i}' for i in range(5)]
+        result = broadcast_to_groups(groups, {'type': 'ride_request'}, channel_layer=layer)
+
+        self.assertEqual(result['sent'], 4)
+        self.assertEqual(result['failed'], {'driver_2': 'driver_2 unreachable'})
+        self.assertEqual([group for group, _ in layer.sent], [g for g in groups if g != 'driver_2'])
+        # All five were in flight at once rather than one after another
+        self.assertEqual(layer.max_in_flight, 5)
+        self.assertGreaterEqual(result['elapsed_ms'], 20)
+
+    def test_each_group_gets_its_own_message(self):
+        layer = RecordingChannelLayer()
+        result = send_to_groups([('customer_1', {'n': 1}), ('driver_1', {'n': 2})], channel_layer=layer)
+        self.assertEqual(layer.sent, [('customer_1', {'n': 1}), ('driver_1', {'n': 2})])
+        self.assertEqual((result['sent'], result['failed']), (2, {}))
+
+    def test_nothing_to_send(self):
+        layer = mock.Mock()
+        self.assertEqual(send_to_groups([], channel_layer=layer), {'sent': 0, 'failed': {}, 'elapsed_ms': 0.0})
+        layer.group_send.assert_not_called()
+
+
+class DriverLocationIndexTests(TestCase):
+    def setUp(self):
+        self.index = DriverLocationIndex(cell_km=1.0, refresh_seconds=30)
+
+    def test_nearby_is_sorted_filtered_and_limited(self):
+        for driver_id, km in ((1, 2.5), (2, 0.3), (3, 1.2), (4, 6.0)):
+            self.index.upsert(driver_id, *km_north(km))
+
+        found = self.index.nearby(*PICKUP, radius_km=3)
+        self.assertEqual([driver_id for driver_id, _ in found], [2, 3, 1])
+        self.assertAlmostEqual(found[0][1], 0.3, places=2)
+        self.assertEqual([driver_id for driver_id, _ in self.index.nearby(*PICKUP, radius_km=3, limit=2)], [2, 3])
+        self.assertEqual(self.index.nearby(*PICKUP, radius_km=0.1), [])
+
+    def test_grid_lookup_matches_a_full_scan(self):
+        rng = random.Random(7)
+        for driver_id in range(400):
+            self.index.upsert(driver_id, PICKUP[0] + rng.uniform(-0.1, 0.1), PICKUP[1] + rng.uniform(-0.1, 0.1))
+        self.assertGreater(len(self.index._cells), 100)
+
+        # Small radii walk the overlapping cells; a wide one scans the occupied cells instead
+        for radius_km in (0.5, 2, 5, 40):
+            expected = sorted(
+                driver_id for driver_id, (lat, lng, _) in self.index._positions.items()
+                if calculate_distance(PICKUP[0], PICKUP[1], lat, lng) <= radius_km
+            )
+            found = self.index.nearby(*PICKUP, radius_km=radius_km)
+            self.assertEqual(sorted(driver_id for driver_id, _ in found), expected)
+            self.assertEqual([distance for _, distance in found], sorted(distance for _, distance in found))
+
+    def test_moving_a_driver_changes_cell(self):
+        self.index.upsert(1, *km_north(0.2))
+        old_cell = self.index._positions[1][2]
+        self.index.upsert(1, *km_north(4.2))
+        self.assertEqual(len(self.index), 1)
+        self.assertNotIn(old_cell, self.index._cells)
+        self.assertEqual(self.index.nearby(*PICKUP, radius_km=1), [])
+        self.assertEqual([driver_id for driver_id, _ in self.index.nearby(*km_north(4), radius_km=1)], [1])
+
+    def test_going_offline_removes_the_driver(self):
+        self.index.update(1, *km_north(0.2), is_online=True)
+        self.index.update(2, *km_north(0.4), is_online=True)
+        self.index.update(1, *km_north(0.2), is_online=False)
+        self.index.remove(99)
+        self.assertEqual([driver_id for driver_id, _ in self.index.nearby(*PICKUP, radius_km=1)], [2])
+        self.index.remove(2)
+        self.assertEqual((len(self.index), self.index._cells), (0, {}))
+
+    def test_ensure_fresh_reloads_after_the_refresh_interval(self):
+        driver = User.objects.create_user(email='driver@example.com', password='pass', user_type='driver')
+        location = DriverLocation.objects.create(driver=driver, lat=km_north(0.5)[0], lng=PICKUP[1], is_online=True)
+        offline = User.objects.create_user(email='offline@example.com', password='pass', user_type='driver')
+        DriverLocation.objects.create(driver=offline, lat=PICKUP[0], lng=PICKUP[1], is_online=False)
+
+        with mock.patch('ryde_app.spatial_index.time.monotonic', return_value=1000.0) as monotonic:
+            self.index.ensure_fresh()
+            self.assertEqual([driver_id for driver_id, _ in self.index.nearby(*PICKUP, 1)], [driver.id])
+
+            location.is_online = False
+            location.save()
+            monotonic.return_value = 1029.0
+            with self.assertNumQueries(0):
+                self.index.ensure_fresh()
+            self.assertEqual(len(self.index), 1)
+
+            monotonic.return_value = 1030.0
+            with self.assertNumQueries(1):
+                self.index.ensure_fresh()
+            self.assertEqual(len(self.index), 0)
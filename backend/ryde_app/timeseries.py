@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+from django.db import models
+from django.db.models import F
+from django.db.models.functions import TruncDate, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+
+
+def _bucket_start(value, bucket):
+    if bucket == 'hour':
+        if not isinstance(value, datetime):
+            value = timezone.make_aware(datetime.combine(value, datetime.min.time()))
+        return timezone.localtime(value).replace(minute=0, second=0, microsecond=0)
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    if bucket == 'week':
+        return value - timedelta(days=value.weekday())
+    if bucket == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def _next_bucket(value, bucket):
+    if bucket == 'hour':
+        return value + timedelta(hours=1)
+    if bucket == 'week':
+        return value + timedelta(weeks=1)
+    if bucket == 'month':
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return value + timedelta(days=1)
+
+
+def periods(start, end, bucket='day'):
+    """Start of every ``bucket`` from the one containing ``start`` to the one containing ``end``"""
+    current = _bucket_start(start, bucket)
+    last = _bucket_start(end, bucket)
+    while current <= last:
+        yield current
+        current = _next_bucket(current, bucket)
+
+
+def day_bounds(start, end=None):
+    """Aware ``[start of start, start of the day after end)`` datetimes for a date range.
+
+    Filtering with ``field__gte``/``field__lt`` on these keeps an index on the
+    datetime column usable, unlike ``field__date`` which wraps it in a cast.
+    """
+    end = end or start
+    lower = timezone.make_aware(datetime.combine(start, datetime.min.time()))
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return lower, upper
+
+
+def _trunc(field, bucket, is_datetime):
+    if bucket == 'hour':
+        return TruncHour(field)
+    if bucket == 'day':
+        # A date column is already its own daily bucket
+        return TruncDate(field) if is_datetime else F(field)
+    trunc = TruncWeek if bucket == 'week' else TruncMonth
+    return trunc(field, output_field=models.DateField())
+
+
+def time_series(queryset, field, start, end, bucket='day', **aggregates):
+    """Aggregate ``queryset`` per ``bucket`` of the date/datetime ``field`` in one GROUP BY query.
+
+    Returns one dict per bucket between ``start`` and ``end`` (inclusive),
+    each with a ``period`` key (a date, or a datetime for hourly buckets) and
+    one key per aggregate. Buckets without rows are filled with zeros.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    is_datetime = isinstance(queryset.model._meta.get_field(field), models.DateTimeField)
+    if bucket == 'hour' and not is_datetime:
+        raise ValueError(f"{field} is a date field and can't be grouped by hour")
+
+    starts = list(periods(start, end, bucket))
+    lower, upper = starts[0], _next_bucket(starts[-1], bucket)
+    if is_datetime and not isinstance(lower, datetime):
+        lower, upper = day_bounds(lower, upper - timedelta(days=1))
+
+    rows = queryset.filter(**{f'{field}__gte': lower, f'{field}__lt': upper}).annotate(
+        period=_trunc(field, bucket, is_datetime)
+    ).values('period').annotate(**aggregates).order_by()
+    found = {}
+    for row in rows:
+        period = row.pop('period')
+        if isinstance(period, datetime) and bucket != 'hour':
+            period = period.date()
+        found[period] = row
+
+    return [
+        dict({name: found.get(period, {}).get(name) or 0 for name in aggregates}, period=period)
+        for period in starts
+    ]
+
+
+def running_total(series, key, into, initial=0):
+    """Add a cumulative ``into`` column to ``series`` from the values under ``key``"""
+    total = initial
+    for row in series:
+        total += row[key]
+        row[into] = total
+    return series
@@ -24,6 +24,8 @@ urlpatterns = [
     path('test-google-api/', views.test_google_api, name='test_google_api'),
     path('map/geocode/', views.geocode_address_view, name='geocode_address'),
     path('map/nearby-drivers/', views.get_nearby_drivers, name='nearby_drivers'),
+    path('map/cache-stats/', views.maps_cache_stats_view, name='maps_cache_stats'),
+    path('map/client-stats/', views.maps_client_stats_view, name='maps_client_stats'),
     path('driver/location/', views.update_driver_location, name='update_driver_location'),
 #suggestions
     path('autocomplete-address/', views.autocomplete_address, name='autocomplete_address'),
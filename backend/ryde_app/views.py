@@ -3,19 +3,41 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
-from django.db import models
-from .models import User, UserProfile, Ride, DriverLocation, RideMessage, CustomerPaymentMethod, CustomerChatHistory, EmergencyRequest, AdminNotification, NotificationPreference, Vehicle
+from django.db import models, transaction
+from .models import ACTIVE_RIDE_STATUSES, User, UserProfile, Ride, DriverLocation, RideMessage, CustomerPaymentMethod, CustomerChatHistory, EmergencyRequest, AdminNotification, NotificationPreference, Vehicle, DailyRideMetrics
 from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserSerializer, RideSerializer, DriverLocationSerializer, RideMessageSerializer,  CustomerProfileUpdateSerializer, PaymentMethodSerializer, ChatHistorySerializer, NotificationPreferenceSerializer
 from django.utils import timezone
-import math
-import requests
 import json
 from django.conf import settings
 from django.db.models import Q, Count, Sum, Avg
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from rest_framework.permissions import IsAuthenticated
 from django.http import FileResponse
 from collections import defaultdict
+from .geo import calculate_distance, distances_to_point
+from .live_locations import live_locations
+from .dispatch import find_dispatch_candidates, record_offers, pop_offered_drivers
+from .ride_lifecycle import transition, notify_transition, TransitionError
+from . import ride_metrics
+from .timeseries import time_series, running_total, day_bounds
+from .ride_stats import annotate_ride_stats
+from .pagination import paginate, page_size_from, wants_page, CursorError, NEXT_CURSOR_HEADER
+from .broadcast import send_to_groups, broadcast_to_groups
+from .maps_cache import geocode_cache, geocode_cache_key, route_cache, route_cache_key, maps_cache_stats, get_cached_reverse_geocode, store_reverse_geocode
+from .maps_client import maps_client, MapsUnavailable
+from .autocomplete import autocomplete_index, parse_local_place_id, resolve_place, suggest as suggest_addresses
+from .places import get_stored_place, fetch_place_details
+from .road_routing import local_route
+from .jwt_auth import issue_tokens
+from .idempotency import idempotent
+from .logs import get_logger
+
+auth_log = get_logger('auth')
+maps_log = get_logger('maps')
+rides_log = get_logger('rides')
+drivers_log = get_logger('drivers')
+admin_log = get_logger('admin')
+notifications_log = get_logger('notifications')
 
 # Authentication Views
 @api_view(['POST'])
@@ -30,7 +52,7 @@ def register_user(request):
             if user.user_type in ['driver', 'boda_rider']:
                 trigger_driver_registration_notification(user)
             
-            refresh = RefreshToken.for_user(user)
+            refresh = issue_tokens(user)
             
            
             if user.user_type in ['driver', 'boda_rider']:
@@ -63,28 +85,11 @@ def register_user(request):
 @permission_classes([permissions.AllowAny])
 def login_user(request):
     if request.method == 'POST':
-        print(f"🟡 [Login] Request data received: {request.data}")
         email = request.data.get('email')
-        password = request.data.get('password')
         
-        print(f" [Login] Email: {email}, Password provided: {'*' * len(password) if password else 'None'}")
-        
-        
-        try:
-            user = User.objects.get(email=email)
-            print(f" [Login] User found: {user.email}")
-            print(f"[Login] User details - ID: {user.id}, Type: {user.user_type}, Staff: {user.is_staff}, Superuser: {user.is_superuser}")
-            print(f"[Login] User active: {user.is_active}, Has password: {bool(user.password)}")
-            
-            
-            password_valid = user.check_password(password)
-            print(f" [Login] Password valid: {password_valid}")
-            
-            if not password_valid:
-                print(f"[Login] Password check failed")
-                
-        except User.DoesNotExist:
-            print(f"[Login] User with email {email} not found")
+        # The serializer's authenticate() does the (slow) password hash exactly once
+        if not User.objects.filter(email=email).exists():
+            auth_log.info('login_failed', reason='unknown_email')
             return Response({
                 "error": "Invalid email or password"
             }, status=400)
@@ -104,7 +109,8 @@ def login_user(request):
                     }, status=403)
             
             
-            refresh = RefreshToken.for_user(user)
+            refresh = issue_tokens(user)
+            auth_log.info('login_succeeded', user_id=user.id, user_type=user.user_type)
             
             return Response({
                 'user': UserSerializer(user).data,
@@ -114,6 +120,7 @@ def login_user(request):
                 'can_login': True
             }, status=status.HTTP_200_OK)
         
+        auth_log.info('login_failed', reason='invalid_credentials')
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 @api_view(['GET', 'PUT'])
@@ -138,95 +145,97 @@ def logout_user(request):
         token = RefreshToken(refresh_token)
         token.blacklist()
         return Response({"message": "Logout successful"}, status=status.HTTP_200_OK)
-    except Exception as e:
+    except Exception:
         return Response({"error": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST)
 
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two coordinates in kilometers using Haversine formula"""
-    R = 6371 
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
+def geocode_address(address, country='KE'):
+    cache_key = geocode_cache_key(address, country)
+    cached = geocode_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    a = (math.sin(delta_lat/2) * math.sin(delta_lat/2) +
-         math.cos(lat1_rad) * math.cos(lat2_rad) *
-         math.sin(delta_lon/2) * math.sin(delta_lon/2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
-
-def geocode_address(address):
     try:
-        base_url = 'https://maps.googleapis.com/maps/api/geocode/json'
         params = {
             'address': address,
-            'key': settings.GOOGLE_API_KEY,
-            'components': 'country:KE'  
+            'components': f'country:{country}'  
         }
         
-        response = requests.get(base_url, params=params, timeout=10)
-        
-        # Check for HTTP errors
-        response.raise_for_status()
-        
-        data = response.json()
+        data = maps_client.get('geocode', params)
         
         if data['status'] == 'OK':
             result = data['results'][0]
             location = result['geometry']['location']
-            return {
+            coords = {
                 'lat': location['lat'],
                 'lng': location['lng'],
                 'display_name': result['formatted_address']
             }
+            geocode_cache.set(cache_key, coords)
+            return coords
         else:
-            print(f"Google Maps API error: {data['status']}")
+            maps_log.warning('geocode_failed', status=data['status'])
             return None
             
-    except requests.exceptions.Timeout:
-        print("Google Maps API timeout")
-        return None
-    except requests.exceptions.ConnectionError:
-        print("Google Maps API connection error")
+    except MapsUnavailable as e:
+        maps_log.warning('geocode_unavailable', error=str(e))
         return None
-    except Exception as e:
-        print(f"Google Maps geocoding error: {e}")
+    except Exception:
+        maps_log.exception('geocode_error')
         return None
 
 def get_google_route(start_lat, start_lng, end_lat, end_lng):
     """Get route directions using Google Directions API"""
+    cache_key = route_cache_key(start_lat, start_lng, end_lat, end_lng)
+    cached = route_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
-        base_url = 'https://maps.googleapis.com/maps/api/directions/json'
         params = {
             'origin': f'{start_lat},{start_lng}',
             'destination': f'{end_lat},{end_lng}',
-            'key': settings.GOOGLE_API_KEY,
             'mode': 'driving'
         }
         
-        response = requests.get(base_url, params=params, timeout=10)
-        data = response.json()
+        data = maps_client.get('directions', params)
         
         if data['status'] == 'OK':
             route = data['routes'][0]['legs'][0]
-            return {
+            route_info = {
                 'distance': route['distance']['value'],  
                 'duration': route['duration']['value'],  
                 'polyline': data['routes'][0]['overview_polyline']['points']
             }
+            route_cache.set(cache_key, route_info)
+            return route_info
         else:
-            print(f"Google Directions API error: {data['status']}")
+            maps_log.warning('directions_failed', status=data['status'])
             return None
             
-    except Exception as e:
-        print(f"Google Directions error: {e}")
+    except MapsUnavailable as e:
+        maps_log.warning('directions_unavailable', error=str(e))
+        return None
+    except Exception:
+        maps_log.exception('directions_error')
         return None
 
+def get_route(start_lat, start_lng, end_lat, end_lng):
+    """Route with the configured ROUTING_BACKEND, trying the other backend on failure"""
+    if getattr(settings, 'ROUTING_BACKEND', 'google') == 'local':
+        backends = (local_route, get_google_route)
+    else:
+        backends = (get_google_route, local_route)
+    
+    for backend in backends:
+        route_info = backend(start_lat, start_lng, end_lat, end_lng)
+        if route_info:
+            return route_info
+    return None
+
 # Ride Views 
 @api_view(['POST'])
+@idempotent
 def request_ride(request):
     """Customer requests a ride OR courier service - ACTUAL REQUEST ONLY"""
     if request.user.user_type != 'customer':
@@ -273,8 +282,8 @@ def request_ride(request):
     serializer = RideSerializer(data=ride_data)
     if serializer.is_valid():
         
-        route_info = get_google_route(pickup_coords['lat'], pickup_coords['lng'], 
-                                     dropoff_coords['lat'], dropoff_coords['lng'])
+        route_info = get_route(pickup_coords['lat'], pickup_coords['lng'], 
+                               dropoff_coords['lat'], dropoff_coords['lng'])
         
         if route_info:
             distance_km = route_info['distance'] / 1000
@@ -284,161 +293,66 @@ def request_ride(request):
                                            dropoff_coords['lat'], dropoff_coords['lng'])
             duration_min = distance_km * 2
         
-        ride = serializer.save(
-            customer=request.user,
-            status='requested',
-            fare=estimated_fare,
-            distance_km=distance_km,
-            duration_minutes=duration_min
-        )
+        with transaction.atomic():
+            ride = serializer.save(
+                customer=request.user,
+                status='requested',
+                fare=estimated_fare,
+                distance_km=distance_km,
+                duration_minutes=duration_min
+            )
+            ride_metrics.add_ride(ride)
+        autocomplete_index.add_address(ride.pickup_address, ride.pickup_lat, ride.pickup_lng, ride.id, 'pickup')
+        autocomplete_index.add_address(ride.dropoff_address, ride.dropoff_lat, ride.dropoff_lng, ride.id, 'dropoff')
         
         # ✅ NOTIFY DRIVERS VIA WEBSOCKET
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        
-        channel_layer = get_channel_layer()
-        
-       
-        approved_drivers = User.objects.filter(
-           user_type__in=['driver', 'boda_rider'],
-           approval_status='approved',
-           is_active=True
+        candidates = find_dispatch_candidates(
+            pickup_coords['lat'], pickup_coords['lng'], ride.vehicle_type
         )
 
-        print(f"📊 [Request Ride] Total approved drivers: {approved_drivers.count()}")
+        rides_log.info('ride_requested', ride_id=ride.id, vehicle_type=ride.vehicle_type, candidates=len(candidates))
 
+        driver_messages = []
+        for driver_id, driver_to_pickup_distance in candidates:
+            notification_data = {
+                'id': ride.id,
+                'ride_id': ride.id,
+                'customer_name': f"{ride.customer.first_name} {ride.customer.last_name}",
+                'customer_phone': ride.customer.phone_number,
+                'pickup_address': ride.pickup_address,
+                'dropoff_address': ride.dropoff_address,
+                'fare': str(ride.fare),
+                'vehicle_type': ride.vehicle_type,
+                'service_type': ride.service_type,
+                'distance': f"{driver_to_pickup_distance:.1f} km",
+                'estimated_pickup_time': f"{int(driver_to_pickup_distance * 3)} min",
+                'created_at': ride.created_at.isoformat(),
+            }
 
-        driver_locations = DriverLocation.objects.filter(driver__in=approved_drivers)
-        location_map = {loc.driver_id: loc for loc in driver_locations}
+            if ride.service_type != 'ride':
+                notification_data.update({
+                    'package_description': ride.package_description,
+                    'package_size': ride.package_size,
+                    'recipient_name': ride.recipient_name,
+                    'is_courier': True
+                })
 
-        notified_count = 0
-        for driver in approved_drivers:
-    
-            driver_loc = location_map.get(driver.id)
-    
-            if driver_loc:
-                driver_lat = driver_loc.lat
-                driver_lng = driver_loc.lng
-                is_online = driver_loc.is_online
-            else:
-                print(f"⚠️ [Request Ride] Driver {driver.id} has no location record - using default")
-        
-                driver_lat = pickup_coords['lat']
-                driver_lng = pickup_coords['lng']
-                is_online = False  
-    
-    
-            if not is_online:
-                print(f"🔔 [Request Ride] Notifying OFFLINE driver {driver.id} for testing")
-        
-    
-    
-            driver_to_pickup_distance = calculate_distance(
-                driver_lat, driver_lng,
-                pickup_coords['lat'], pickup_coords['lng']
-            )
-    
-            print(f"📍 [Request Ride] Driver {driver.id} distance to pickup: {driver_to_pickup_distance}km")
-    
-   
-            MAX_DISTANCE_KM = 1000 
-    
-            if driver_to_pickup_distance <= MAX_DISTANCE_KM:
-                notification_data = {
-                    'id': ride.id,
-                    'ride_id': ride.id,
-                    'customer_name': f"{ride.customer.first_name} {ride.customer.last_name}",
-                    'customer_phone': ride.customer.phone_number,
-                    'pickup_address': ride.pickup_address,
-                    'dropoff_address': ride.dropoff_address,
-                    'fare': str(ride.fare),
-                    'vehicle_type': ride.vehicle_type,
-                    'service_type': ride.service_type,
-                    'distance': f"{driver_to_pickup_distance:.1f} km",
-                    'estimated_pickup_time': f"{int(driver_to_pickup_distance * 3)} min",
-                    'created_at': ride.created_at.isoformat(),
+            driver_messages.append((
+                f"driver_{driver_id}",
+                {
+                    "type": "new_ride_request",
+                    "data": notification_data
                 }
+            ))
+
+        # Recorded before sending so an instant accept can already tell who to notify
+        record_offers(ride.id, [driver_id for driver_id, _ in candidates])
+        fanout = send_to_groups(driver_messages)
+        notified_count = fanout['sent']
+        for group, error in fanout['failed'].items():
+            rides_log.warning('ride_offer_failed', ride_id=ride.id, group=group, error=str(error))
         
-        
-                if ride.service_type != 'ride':
-                    notification_data.update({
-                        'package_description': ride.package_description,
-                        'package_size': ride.package_size,
-                        'recipient_name': ride.recipient_name,
-                        'is_courier': True
-                    })
-        
-                print(f"📢 [WebSocket] Sending new_ride_request to driver_{driver.id}")
-        
-                try:
-                    async_to_sync(channel_layer.group_send)(
-                        f"driver_{driver.id}",
-                        {
-                            "type": "new_ride_request",
-                            "data": notification_data
-                        }
-                    )
-                    notified_count += 1
-                    print(f"✅ [WebSocket] Notified driver {driver.id}")
-                except Exception as e:
-                    print(f"❌ [WebSocket] Failed to notify driver {driver.id}: {str(e)}")
-            else:
-                print(f"⏭️ [Request Ride] Driver {driver.id} too far ({driver_to_pickup_distance}km > {MAX_DISTANCE_KM}km)")
-            
-            # Calculate distance
-            # driver_to_pickup_distance = calculate_distance(
-            #     driver_lat, driver_lng,
-            #     pickup_coords['lat'], pickup_coords['lng']
-            # )
-            
-            # print(f"📍 [Request Ride] Driver {driver.id} distance to pickup: {driver_to_pickup_distance}km")
-            
-           
-            # MAX_DISTANCE_KM = 50  
-            
-            # if driver_to_pickup_distance <= MAX_DISTANCE_KM:
-            #     notification_data = {
-            #         'id': ride.id,
-            #         'ride_id': ride.id,
-            #         'customer_name': f"{ride.customer.first_name} {ride.customer.last_name}",
-            #         'customer_phone': ride.customer.phone_number,
-            #         'pickup_address': ride.pickup_address,
-            #         'dropoff_address': ride.dropoff_address,
-            #         'fare': str(ride.fare),
-            #         'vehicle_type': ride.vehicle_type,
-            #         'service_type': ride.service_type,
-            #         'distance': f"{driver_to_pickup_distance:.1f} km",
-            #         'estimated_pickup_time': f"{int(driver_to_pickup_distance * 3)} min",
-            #         'created_at': ride.created_at.isoformat(),
-            #     }
-                
-              
-            #     if ride.service_type != 'ride':
-            #         notification_data.update({
-            #             'package_description': ride.package_description,
-            #             'package_size': ride.package_size,
-            #             'recipient_name': ride.recipient_name,
-            #             'is_courier': True
-            #         })
-                
-            #     print(f"📢 [WebSocket] Sending new_ride_request to driver_{driver.id}")
-                
-            #     try:
-            #         async_to_sync(channel_layer.group_send)(
-            #             f"driver_{driver.id}",
-            #             {
-            #                 "type": "new_ride_request",
-            #                 "data": notification_data
-            #             }
-            #         )
-            #         notified_count += 1
-            #         print(f"✅ [WebSocket] Notified driver {driver.id}")
-            #     except Exception as e:
-            #         print(f"❌ [WebSocket] Failed to notify driver {driver.id}: {str(e)}")
-            # else:
-            #     print(f"⏭️ [Request Ride] Driver {driver.id} too far ({driver_to_pickup_distance}km > {MAX_DISTANCE_KM}km)")
-        
-        print(f"✅ [Request Ride] Notified {notified_count} drivers for ride {ride.id}")
+        rides_log.info('ride_offered', ride_id=ride.id, drivers=notified_count, elapsed_ms=fanout['elapsed_ms'])
         
         response_data = RideSerializer(ride).data
         response_data.update({
@@ -492,8 +406,8 @@ def calculate_route(request):
         }, status=400)
     
     # Get route information
-    route_info = get_google_route(pickup_coords['lat'], pickup_coords['lng'], 
-                                 dropoff_coords['lat'], dropoff_coords['lng'])
+    route_info = get_route(pickup_coords['lat'], pickup_coords['lng'], 
+                          dropoff_coords['lat'], dropoff_coords['lng'])
     
     try:
         if route_info:
@@ -555,8 +469,8 @@ def calculate_route(request):
         
         return Response(response_data)
         
-    except (TypeError, ValueError) as e:
-        print(f"Route calculation error: {e}")
+    except (TypeError, ValueError):
+        maps_log.exception('route_calculation_error')
         return Response({"error": "Could not calculate route and fare"}, status=400)
 
 @api_view(['POST'])
@@ -600,20 +514,27 @@ def reverse_geocode(request):
     except (TypeError, ValueError):
         return Response({"error": "Invalid coordinates"}, status=400)
     
+    cached = get_cached_reverse_geocode(lat, lng)
+    if cached is not None:
+        return Response({
+            'address': cached['formatted_address'],
+            'display_name': cached['formatted_address'],
+            'lat': lat,
+            'lng': lng
+        })
+    
     try:
-        base_url = 'https://maps.googleapis.com/maps/api/geocode/json'
         params = {
             'latlng': f'{lat},{lng}',
-            'key': settings.GOOGLE_API_KEY,
         }
         
-        response = requests.get(base_url, params=params, timeout=10)
-        data = response.json()
+        data = maps_client.get('geocode', params)
         
-        print(f"Google Reverse Geocoding API Response: {data['status']}")
+        maps_log.debug('reverse_geocode_response', status=data['status'])
         
         if data['status'] == 'OK':
             result = data['results'][0]
+            store_reverse_geocode(lat, lng, result['formatted_address'])
             return Response({
                 'address': result['formatted_address'],
                 'display_name': result['formatted_address'],
@@ -621,7 +542,7 @@ def reverse_geocode(request):
                 'lng': lng
             })
         else:
-            print(f"Google Reverse Geocoding API error: {data['status']}")
+            maps_log.warning('reverse_geocode_failed', status=data['status'])
             
             return Response({
                 'address': f'Current Location ({lat:.4f}, {lng:.4f})',
@@ -630,8 +551,8 @@ def reverse_geocode(request):
                 'lng': lng
             })
             
-    except Exception as e:
-        print(f"Reverse geocoding error: {e}")
+    except Exception:
+        maps_log.exception('reverse_geocode_error')
        
         return Response({
             'address': f'Current Location ({lat:.4f}, {lng:.4f})',
@@ -676,15 +597,7 @@ def set_current_location(request):
     
     
     if request.user.user_type in ['driver', 'boda_rider']:
-        DriverLocation.objects.update_or_create(
-            driver=request.user,
-            defaults={
-                'lat': lat,
-                'lng': lng,
-                'is_online': True,
-                'last_updated': timezone.now()
-            }
-        )
+        live_locations.record(request.user.id, lat, lng, is_online=True)
     
     return Response({
         "message": "Location updated successfully",
@@ -709,13 +622,29 @@ def get_nearby_drivers(request):
         return Response({"error": "Invalid coordinates"}, status=400)
     
    
-    online_drivers = DriverLocation.objects.filter(is_online=True)
+    matches = live_locations.nearby(lat, lng, radius_km)
+    driver_ids = [driver_id for driver_id, _ in matches]
+    
+    
+    locations = DriverLocation.objects.filter(
+        driver_id__in=driver_ids,
+        is_online=True
+    ).select_related('driver', 'driver__vehicle')
+    location_map = {loc.driver_id: loc for loc in locations}
+    live = live_locations.get_many(driver_ids)
     
     nearby_drivers = []
-    for driver_loc in online_drivers:
-        distance = calculate_distance(lat, lng, driver_loc.lat, driver_loc.lng)
-        if distance <= radius_km:
+    for driver_id, distance in matches:
+        driver_loc = location_map.get(driver_id)
+        if driver_loc:
             driver_data = DriverLocationSerializer(driver_loc).data
+            # The table is only flushed periodically; the hot store has the latest fix
+            snapshot = live.get(driver_id)
+            if snapshot:
+                driver_data['lat'] = snapshot['lat']
+                driver_data['lng'] = snapshot['lng']
+                driver_data['heading'] = snapshot['heading']
+                driver_data['speed'] = snapshot['speed']
             driver_data['distance_km'] = round(distance, 2)
             nearby_drivers.append(driver_data)
     
@@ -736,6 +665,25 @@ def available_rides(request):
     driver_lat = request.GET.get('lat')
     driver_lng = request.GET.get('lng')
     
+    rides = list(rides)
+    
+    # One batched distance computation instead of a haversine call per ride
+    distances = {}
+    if driver_lat and driver_lng:
+        try:
+            driver_lat, driver_lng = float(driver_lat), float(driver_lng)
+            located = [ride for ride in rides if ride.pickup_lat is not None and ride.pickup_lng is not None]
+            distances = dict(zip(
+                [ride.id for ride in located],
+                distances_to_point(
+                    [ride.pickup_lat for ride in located],
+                    [ride.pickup_lng for ride in located],
+                    driver_lat, driver_lng
+                )
+            ))
+        except (TypeError, ValueError):
+            distances = {}
+    
     rides_data = []
     for ride in rides:
         ride_data = RideSerializer(ride).data
@@ -746,14 +694,11 @@ def available_rides(request):
         
        
         if driver_lat and driver_lng:
-            try:
-                distance = calculate_distance(
-                    float(driver_lat), float(driver_lng),
-                    ride.pickup_lat, ride.pickup_lng
-                )
-                ride_data['distance_to_pickup_km'] = round(distance, 2)
+            distance = distances.get(ride.id)
+            if distance is not None:
+                ride_data['distance_to_pickup_km'] = round(float(distance), 2)
                 ride_data['estimated_pickup_time'] = f"{int(distance * 3)} min"
-            except (TypeError, ValueError):
+            else:
                 ride_data['distance_to_pickup_km'] = None
                 ride_data['estimated_pickup_time'] = 'Unknown'
         
@@ -762,132 +707,110 @@ def available_rides(request):
     return Response(rides_data)
 
 @api_view(['POST'])
+@idempotent
 def accept_ride(request, ride_id):
     """Driver accepts a ride and notifies customer via WebSocket"""
     if request.user.user_type not in ['driver', 'boda_rider']:
         return Response({"error": "Only drivers can accept rides"}, status=403)
     
+    # Guarded UPDATE: the database lets exactly one concurrent accept through
     try:
-        ride = Ride.objects.get(id=ride_id, status='requested')
-        ride.driver = request.user
-        ride.status = 'accepted'
-        ride.save()
-        
-        print(f"✅ [Ride Accepted] Driver {request.user.id} accepted ride {ride_id}")
-        
-        
-        DriverLocation.objects.update_or_create(
-            driver=request.user,
-            defaults={
-                'lat': ride.pickup_lat,
-                'lng': ride.pickup_lng,
-                'is_online': True
-            }
-        )
-        
-        
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        
-        channel_layer = get_channel_layer()
-        
-        
-        print(f"📢 [WebSocket] Notifying customer {ride.customer.id} about accepted ride")
-        
-        async_to_sync(channel_layer.group_send)(
-            f"customer_{ride.customer.id}",
-            {
-                "type": "ride_accepted",
-                "data": {
-                    'ride_id': ride.id,
-                    'driver_id': request.user.id,
-                    'driver_name': f"{request.user.first_name} {request.user.last_name}",
-                    'driver_phone': request.user.phone_number,
-                    'vehicle_type': getattr(request.user, 'vehicle_type', 'Economy'),
-                    'license_plate': getattr(getattr(request.user, 'vehicle', None), 'license_plate', ''),
-                    'timestamp': timezone.now().isoformat()
-                }
+        ride = transition(ride_id, 'requested', 'accepted', actor=request.user, notify=False,
+                          changes={'driver': request.user})
+    except TransitionError as e:
+        if e.status_code == 409:
+            rides_log.info('ride_accept_lost', ride_id=ride_id, driver_id=request.user.id)
+            return Response({"error": "Ride has already been accepted by another driver"}, status=409)
+        return Response({"error": e.message}, status=e.status_code)
+
+    rides_log.info('ride_accepted', ride_id=ride.id, driver_id=request.user.id)
+
+    DriverLocation.objects.update_or_create(
+        driver=request.user,
+        defaults={
+            'lat': ride.pickup_lat,
+            'lng': ride.pickup_lng,
+            'is_online': True
+        }
+    )
+    live_locations.record(request.user.id, ride.pickup_lat, ride.pickup_lng, is_online=True, persisted=True)
+
+    group_messages = [
+        (f"customer_{ride.customer.id}", {
+            "type": "ride_accepted",
+            "data": {
+                'ride_id': ride.id,
+                'driver_id': request.user.id,
+                'driver_name': f"{request.user.first_name} {request.user.last_name}",
+                'driver_phone': request.user.phone_number,
+                'vehicle_type': getattr(request.user, 'vehicle_type', 'Economy'),
+                'license_plate': getattr(getattr(request.user, 'vehicle', None), 'license_plate', ''),
+                'timestamp': timezone.now().isoformat()
             }
-        )
-        
-        
-        print(f"📢 [WebSocket] Notifying driver {request.user.id} about accepted ride")
-        
-        async_to_sync(channel_layer.group_send)(
-            f"driver_{request.user.id}",
-            {
-                "type": "ride_accepted_self",
-                "data": {
-                    'ride_id': ride.id,
-                    'status': ride.status,
-                    'customer_name': f"{ride.customer.first_name} {ride.customer.last_name}",
-                    'customer_phone': ride.customer.phone_number,
-                    'pickup_address': ride.pickup_address,
-                    'dropoff_address': ride.dropoff_address,
-                    'fare': str(ride.fare),
-                    'pickup_lat': ride.pickup_lat,
-                    'pickup_lng': ride.pickup_lng,
-                    'timestamp': timezone.now().isoformat()
-                }
+        }),
+        (f"driver_{request.user.id}", {
+            "type": "ride_accepted_self",
+            "data": {
+                'ride_id': ride.id,
+                'status': ride.status,
+                'customer_name': f"{ride.customer.first_name} {ride.customer.last_name}",
+                'customer_phone': ride.customer.phone_number,
+                'pickup_address': ride.pickup_address,
+                'dropoff_address': ride.dropoff_address,
+                'fare': str(ride.fare),
+                'pickup_lat': ride.pickup_lat,
+                'pickup_lng': ride.pickup_lng,
+                'timestamp': timezone.now().isoformat()
             }
-        )
-        
-        
-        online_drivers = DriverLocation.objects.filter(is_online=True).exclude(driver=request.user)
-        for driver_loc in online_drivers:
-            async_to_sync(channel_layer.group_send)(
-                f"driver_{driver_loc.driver.id}",
-                {
-                    "type": "ride_taken",
-                    "data": {
-                        'ride_id': ride.id,
-                        'message': 'Ride has been accepted by another driver'
-                    }
-                }
-            )
-        
-        return Response({
-            'message': 'Ride accepted successfully',
-            'ride': RideSerializer(ride).data
-        })
-    except Ride.DoesNotExist:
-        return Response({"error": "Ride not found or already accepted"}, status=404)
+        }),
+    ]
+
+    # Only the drivers who were sent this request need to hear it's gone
+    ride_taken_message = {
+        "type": "ride_taken",
+        "data": {
+            'ride_id': ride.id,
+            'message': 'Ride has been accepted by another driver'
+        }
+    }
+    group_messages.extend(
+        (f"driver_{driver_id}", ride_taken_message)
+        for driver_id in pop_offered_drivers(ride.id) if driver_id != request.user.id
+    )
+
+    fanout = send_to_groups(group_messages)
+    for group, error in fanout['failed'].items():
+        rides_log.warning('ride_accept_notify_failed', ride_id=ride.id, group=group, error=str(error))
+    rides_log.debug('ride_accept_fanout', ride_id=ride.id, groups=fanout['sent'], elapsed_ms=fanout['elapsed_ms'])
+
+    return Response({
+        'message': 'Ride accepted successfully',
+        'ride': RideSerializer(ride).data
+    })
 
 @api_view(['POST'])
 def update_ride_status(request, ride_id):
     """Update ride status"""
-    try:
-        ride = Ride.objects.get(id=ride_id)
-        new_status = request.data.get('status')
-        
-        if not new_status:
-            return Response({"error": "Status is required"}, status=400)
-        
-       
-        if request.user != ride.customer and request.user != ride.driver:
-            return Response({"error": "Not authorized to update this ride"}, status=403)
-        
-        valid_transitions = {
-            'requested': ['accepted', 'cancelled'],
-            'accepted': ['driver_arrived', 'cancelled'],
-            'driver_arrived': ['driving_to_destination', 'cancelled'],  # ✅ CHANGED
-            'driving_to_destination': ['completed', 'cancelled'],  # ✅ CHANGED
-            'completed': [],
-            'cancelled': []
-        }
-        
-        if new_status in valid_transitions.get(ride.status, []):
-            ride.status = new_status
-            if new_status == 'completed':
-                ride.completed_at = timezone.now()
-            ride.save()
-            return Response(RideSerializer(ride).data)
-        else:
-            return Response({"error": f"Cannot change status from {ride.status} to {new_status}"}, status=400)
-            
-    except Ride.DoesNotExist:
+    ride = Ride.objects.filter(id=ride_id).values('customer_id', 'driver_id', 'status').first()
+    if ride is None:
         return Response({"error": "Ride not found"}, status=404)
 
+    new_status = request.data.get('status')
+    if not new_status:
+        return Response({"error": "Status is required"}, status=400)
+
+    if request.user.id not in (ride['customer_id'], ride['driver_id']):
+        return Response({"error": "Not authorized to update this ride"}, status=403)
+
+    if new_status == 'accepted':
+        return Response({"error": "Rides are accepted through the accept endpoint"}, status=400)
+
+    try:
+        updated = transition(ride_id, ride['status'], new_status, actor=request.user)
+    except TransitionError as e:
+        return Response({"error": e.message}, status=e.status_code)
+    return Response(RideSerializer(updated).data)
+
 @api_view(['POST'])
 def update_driver_location(request):
     """Update driver's current location"""
@@ -903,31 +826,58 @@ def update_driver_location(request):
     try:
         lat = float(lat)
         lng = float(lng)
+        heading = request.data.get('heading')
+        speed = request.data.get('speed')
+        heading = float(heading) if heading not in (None, '') else None
+        speed = float(speed) if speed not in (None, '') else None
     except (TypeError, ValueError):
         return Response({"error": "Invalid coordinates"}, status=400)
     
-    location, created = DriverLocation.objects.update_or_create(
-        driver=request.user,
-        defaults={
-            'lat': lat,
-            'lng': lng,
-            'is_online': request.data.get('is_online', True)
-        }
-    )
-    return Response(DriverLocationSerializer(location).data)
+    is_online = request.data.get('is_online', True)
+    if isinstance(is_online, str):
+        is_online = is_online.lower() in ('true', '1', 'yes')
+    
+    # Pings land in the live location store; DriverLocation is updated in bulk
+    snapshot = live_locations.record(request.user.id, lat, lng, heading=heading, speed=speed, is_online=is_online)
+    # Same shape as DriverLocationSerializer, from one indexed read instead of the saved row
+    row = User.objects.filter(id=request.user.id).values('driverlocation__id', 'vehicle__vehicle_type').first() or {}
+    return Response({
+        'id': row.get('driverlocation__id'),
+        'driver': request.user.id,
+        'driver_name': request.user.get_full_name(),
+        'driver_phone': request.user.phone_number,
+        'vehicle_type': row.get('vehicle__vehicle_type'),
+        'lat': snapshot['lat'],
+        'lng': snapshot['lng'],
+        'heading': snapshot['heading'],
+        'speed': snapshot['speed'],
+        'is_online': snapshot['is_online'],
+        'last_updated': datetime.fromtimestamp(snapshot['timestamp'], tz=dt_timezone.utc).isoformat()
+    })
 
 @api_view(['GET'])
 def user_rides(request):
     """Get user's ride history"""
     if request.user.user_type == 'customer':
-        rides = Ride.objects.filter(customer=request.user).order_by('-created_at')
+        rides = Ride.objects.filter(customer=request.user)
     elif request.user.user_type in ['driver', 'boda_rider']:
-        rides = Ride.objects.filter(driver=request.user).order_by('-created_at')
+        rides = Ride.objects.filter(driver=request.user)
     else:
         rides = Ride.objects.none()
     
-    serializer = RideSerializer(rides, many=True)
-    return Response(serializer.data)
+    rides = rides.select_related('customer', 'driver')
+    # Paging is opt-in: clients that don't send a cursor or page_size still get the full history
+    if not wants_page(request):
+        return Response(RideSerializer(rides.order_by('-created_at', '-id'), many=True).data)
+    
+    # Still a plain list; the next page's cursor travels in a header
+    try:
+        page = paginate(rides, request, page_size=page_size_from(request, default=50))
+    except CursorError as e:
+        return Response({"error": str(e)}, status=400)
+    serializer = RideSerializer(page['items'], many=True)
+    headers = {NEXT_CURSOR_HEADER: page['next_cursor']} if page['next_cursor'] else None
+    return Response(serializer.data, headers=headers)
 
 @api_view(['GET'])
 def ride_detail(request, ride_id):
@@ -967,6 +917,18 @@ def test_google_api(request):
             "api_key_set": bool(settings.GOOGLE_API_KEY)
         }, status=500)
     
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def maps_cache_stats_view(request):
+    """Hit ratio and saved Google API calls for each maps cache"""
+    return Response(maps_cache_stats())
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def maps_client_stats_view(request):
+    """Circuit state and latency histogram for each Google Maps endpoint"""
+    return Response(maps_client.stats())
+    
 #location suggestions
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -976,82 +938,27 @@ def autocomplete_address(request):
     user_lat = request.data.get('lat')
     user_lng = request.data.get('lng')
     
-    print(f"🔍 [Backend Autocomplete] Query: '{query}', User location: ({user_lat}, {user_lng})")
+    maps_log.sampled('autocomplete_query', query_length=len(query))
     
     if not query or len(query) < 3:
-        print("⏹️ [Backend Autocomplete] Query too short")
         return Response({"suggestions": []})
     
+    lat = lng = None
+    if user_lat and user_lng:
+        try:
+            lat = float(user_lat)
+            lng = float(user_lng)
+        except (TypeError, ValueError) as e:
+            maps_log.debug('autocomplete_invalid_location', error=str(e))
+            lat = lng = None
+    
     try:
-        base_url = 'https://maps.googleapis.com/maps/api/place/autocomplete/json'
-        
-       
-        params = {
-            'input': query,
-            'key': settings.GOOGLE_API_KEY,
-            'components': 'country:ke',
-            
-            'types': 'establishment,geocode',
-        }
-        
-       
-        if user_lat and user_lng:
-            try:
-               
-                lat = float(user_lat)
-                lng = float(user_lng)
-                params.update({
-                    'location': f'{lat},{lng}',
-                    'radius': 50000,  
-                })
-                print(f"📍 [Backend Autocomplete] Using user location: {lat}, {lng}")
-            except (TypeError, ValueError) as e:
-                print(f"⚠️ [Backend Autocomplete] Invalid user location: {e}")
-        
-        print(f"🔄 [Backend Autocomplete] Making API call with params: {params}")
-        
-       
-        response = requests.get(base_url, params=params, timeout=10)
-        data = response.json()
-        
-        print(f"📡 [Backend Autocomplete] Google API Status: {data['status']}")
-        
-        if data['status'] != 'OK':
-            print(f"❌ [Backend Autocomplete] Google API Error: {data.get('error_message', 'No error message')}")
-            print(f"🔍 [Backend Autocomplete] Full error response: {data}")
-            
-           
-            if data['status'] == 'INVALID_REQUEST':
-                print("🔄 [Backend Autocomplete] Trying fallback without types parameter...")
-                fallback_params = params.copy()
-                fallback_params.pop('types', None)  
-                
-                fallback_response = requests.get(base_url, params=fallback_params, timeout=10)
-                fallback_data = fallback_response.json()
-                
-                print(f"📡 [Backend Autocomplete] Fallback API Status: {fallback_data['status']}")
-                data = fallback_data
-        
-        suggestions = []
-        if data['status'] == 'OK':
-            for prediction in data['predictions']:
-                suggestion_data = {
-                    'description': prediction['description'],
-                    'place_id': prediction['place_id'],
-                    'main_text': prediction.get('structured_formatting', {}).get('main_text', ''),
-                    'secondary_text': prediction.get('structured_formatting', {}).get('secondary_text', ''),
-                    'types': prediction.get('types', [])
-                }
-                suggestions.append(suggestion_data)
-                print(f"📍 [Backend Autocomplete] Found: {prediction['description']}")
-        
-        print(f"✅ [Backend Autocomplete] Returning {len(suggestions)} suggestions")
+        suggestions, source = suggest_addresses(query, lat, lng)
+        maps_log.sampled('autocomplete_served', source=source, results=len(suggestions))
         return Response({"suggestions": suggestions[:15]})
             
-    except Exception as e:
-        print(f"❌ [Backend Autocomplete] Exception: {str(e)}")
-        import traceback
-        print(f"🔍 [Backend Autocomplete] Traceback: {traceback.format_exc()}")
+    except Exception:
+        maps_log.exception('autocomplete_error')
         return Response({"suggestions": []})
 
 @api_view(['POST'])
@@ -1063,32 +970,29 @@ def get_place_details(request):
     if not place_id:
         return Response({"error": "Place ID is required"}, status=400)
     
+    local_place = resolve_place(place_id)
+    if local_place:
+        return Response(local_place)
+    if parse_local_place_id(place_id):
+        # Our own ride-history id: Google has never heard of it
+        return Response({"error": "Place not found"}, status=400)
+    
+    stored_place = get_stored_place(place_id)
+    if stored_place:
+        return Response(stored_place)
+    
     try:
-        base_url = 'https://maps.googleapis.com/maps/api/place/details/json'
-        params = {
-            'place_id': place_id,
-            'key': settings.GOOGLE_API_KEY,
-            'fields': 'formatted_address,geometry,name'
-        }
+        details = fetch_place_details(place_id)
         
-        response = requests.get(base_url, params=params, timeout=5)
-        data = response.json()
-        
-        if data['status'] == 'OK':
-            result = data['result']
-            location = result.get('geometry', {}).get('location', {})
-            
-            return Response({
-                'address': result.get('formatted_address', ''),
-                'name': result.get('name', ''),
-                'lat': location.get('lat'),
-                'lng': location.get('lng')
-            })
+        if details:
+            if details['lat'] is not None and details['lng'] is not None:
+                autocomplete_index.set_location(place_id, details['lat'], details['lng'])
+            return Response(details)
         else:
             return Response({"error": "Place not found"}, status=400)
             
-    except Exception as e:
-        print(f"Place details error: {e}")
+    except Exception:
+        maps_log.exception('place_details_error')
         return Response({"error": "Failed to get place details"}, status=400)
 
 
@@ -1127,21 +1031,23 @@ def driver_dashboard(request):
      
         current_ride = Ride.objects.filter(
             driver=request.user,
-            status__in=['accepted', 'driver_arrived', 'driving_to_destination']
+            status__in=ACTIVE_RIDE_STATUSES
         ).order_by('-created_at').first()  
         
         today = timezone.now().date()
+        today_start, tomorrow = day_bounds(today)
         today_rides = Ride.objects.filter(
             driver=request.user,
-            created_at__date=today,
-            status='completed'
+            status='completed',
+            created_at__gte=today_start,
+            created_at__lt=tomorrow
         )
         
         week_ago = today - timezone.timedelta(days=7)
         weekly_rides = Ride.objects.filter(
             driver=request.user,
-            created_at__date__gte=week_ago,
-            status='completed'
+            status='completed',
+            created_at__gte=day_bounds(week_ago)[0]
         )
         
         
@@ -1182,10 +1088,8 @@ def driver_dashboard(request):
         
         return Response(dashboard_data)
         
-    except Exception as e:
-        print(f"❌ [Driver Dashboard Error]: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+    except Exception:
+        drivers_log.exception('driver_dashboard_error', driver_id=request.user.id)
         
         dashboard_data.update({
             "error": "Failed to load dashboard data",
@@ -1226,6 +1130,9 @@ def toggle_online_status(request):
                 driver_location.lng = lng
             driver_location.save()
         
+        live_locations.record(request.user.id, driver_location.lat, driver_location.lng,
+                              is_online=is_online, persisted=True)
+        
         return Response({
             "message": f"Driver is now {'online' if is_online else 'offline'}",
             "is_online": is_online,
@@ -1234,9 +1141,7 @@ def toggle_online_status(request):
         })
         
     except Exception as e:
-        print(f"❌ [Toggle Online Error]: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        drivers_log.exception('toggle_online_error', driver_id=request.user.id)
         return Response({"error": str(e)}, status=500)
     
 
@@ -1247,56 +1152,41 @@ def start_ride(request, ride_id):
         return Response({"error": "Only drivers can start rides"}, status=403)
     
     try:
-        ride = Ride.objects.get(id=ride_id, driver=request.user)
-        
-        if ride.status != 'driver_arrived':
-            return Response({"error": "Ride status must be 'driver_arrived' to start"}, status=400)
-        
-        ride.status = 'driving_to_destination'
-        ride.actual_pickup_time = timezone.now()
-        ride.save()
-        
-       
-        RideMessage.objects.create(
-            ride=ride,
-            sender=request.user,
-            message_type='system',
-            content=f'Ride started at {ride.actual_pickup_time.strftime("%H:%M")}'
-        )
-        
-        return Response(RideSerializer(ride).data)
-        
-    except Ride.DoesNotExist:
-        return Response({"error": "Ride not found"}, status=404)
+        ride = transition(ride_id, 'driver_arrived', 'driving_to_destination', actor=request.user,
+                          guards={'driver': request.user})
+    except TransitionError as e:
+        return Response({"error": e.message}, status=e.status_code)
+    
+    RideMessage.objects.create(
+        ride=ride,
+        sender=request.user,
+        message_type='system',
+        content=f'Ride started at {ride.actual_pickup_time.strftime("%H:%M")}'
+    )
+    
+    return Response(RideSerializer(ride).data)
 
 @api_view(['POST'])
+@idempotent
 def complete_ride(request, ride_id):
     """Driver completes the ride"""
     if request.user.user_type not in ['driver', 'boda_rider']:
         return Response({"error": "Only drivers can complete rides"}, status=403)
     
     try:
-        ride = Ride.objects.get(id=ride_id, driver=request.user)
-        
-        if ride.status != 'driving_to_destination':
-            return Response({"error": "Ride must be in progress to complete"}, status=400)
-        
-        ride.status = 'completed'
-        ride.actual_dropoff_time = timezone.now()
-        ride.save()
-        
-        
-        RideMessage.objects.create(
-            ride=ride,
-            sender=request.user,
-            message_type='system',
-            content=f'Ride completed at {ride.actual_dropoff_time.strftime("%H:%M")}'
-        )
-        
-        return Response(RideSerializer(ride).data)
-        
-    except Ride.DoesNotExist:
-        return Response({"error": "Ride not found"}, status=404)
+        ride = transition(ride_id, 'driving_to_destination', 'completed', actor=request.user,
+                          guards={'driver': request.user})
+    except TransitionError as e:
+        return Response({"error": e.message}, status=e.status_code)
+    
+    RideMessage.objects.create(
+        ride=ride,
+        sender=request.user,
+        message_type='system',
+        content=f'Ride completed at {ride.actual_dropoff_time.strftime("%H:%M")}'
+    )
+    
+    return Response(RideSerializer(ride).data)
 
 @api_view(['POST'])
 def send_ride_message(request, ride_id):
@@ -1336,10 +1226,21 @@ def ride_messages(request, ride_id):
         if request.user not in [ride.customer, ride.driver]:
             return Response({"error": "Not authorized to view messages for this ride"}, status=403)
         
-        messages = RideMessage.objects.filter(ride=ride)
-        serializer = RideMessageSerializer(messages, many=True)
+        messages = RideMessage.objects.filter(ride=ride).select_related('sender__profile')
+        # Paging is opt-in: clients that don't send a cursor or page_size still get the whole chat
+        if not wants_page(request):
+            return Response(RideMessageSerializer(messages, many=True).data)
         
-        return Response(serializer.data)
+        # Pages walk back from the newest message; each page is still returned oldest-first
+        try:
+            page = paginate(messages, request, field='timestamp',
+                            page_size=page_size_from(request, default=200, maximum=500))
+        except CursorError as e:
+            return Response({"error": str(e)}, status=400)
+        serializer = RideMessageSerializer(page['items'][::-1], many=True)
+        headers = {NEXT_CURSOR_HEADER: page['next_cursor']} if page['next_cursor'] else None
+        
+        return Response(serializer.data, headers=headers)
         
     except Ride.DoesNotExist:
         return Response({"error": "Ride not found"}, status=404)
@@ -1363,22 +1264,38 @@ def driver_earnings(request):
     else:
         start_date = end_date - timezone.timedelta(days=7)
     
+    period_start, period_end = day_bounds(start_date, end_date)
     completed_rides = Ride.objects.filter(
         driver=request.user,
         status='completed',
-        created_at__date__range=[start_date, end_date]
+        created_at__gte=period_start,
+        created_at__lt=period_end
+    )
+    
+    totals = completed_rides.aggregate(
+        total_rides=Count('id'),
+        total_earnings=Sum('fare'),
+        avg_fare=Avg('fare'),
     )
+    rides = completed_rides.select_related('customer', 'driver')
+    # Paging is opt-in, as for my-rides: clients that don't ask still get every ride in the period
+    if wants_page(request):
+        try:
+            page = paginate(rides, request, page_size=page_size_from(request, default=50))
+        except CursorError as e:
+            return Response({"error": str(e)}, status=400)
+    else:
+        page = {'items': rides.order_by('-created_at', '-id'), 'next_cursor': None}
     
     earnings_data = {
         'period': period,
         'start_date': start_date,
         'end_date': end_date,
-        'total_rides': completed_rides.count(),
-        'total_earnings': sum(ride.fare for ride in completed_rides if ride.fare),
-        'average_earnings_per_ride': completed_rides.aggregate(
-            avg_fare=models.Avg('fare')
-        )['avg_fare'] or 0,
-        'rides': RideSerializer(completed_rides, many=True).data
+        'total_rides': totals['total_rides'],
+        'total_earnings': totals['total_earnings'] or 0,
+        'average_earnings_per_ride': totals['avg_fare'] or 0,
+        'rides': RideSerializer(page['items'], many=True).data,
+        'next_cursor': page['next_cursor'],
     }
     
     return Response(earnings_data)    
@@ -1528,7 +1445,7 @@ def decline_ride(request, ride_id):
     try:
         ride = Ride.objects.get(id=ride_id, status='requested')
         
-        print(f"🚫 Driver {request.user.id} declined ride {ride_id}")
+        rides_log.info('ride_declined', ride_id=ride.id, driver_id=request.user.id)
         
         
         from channels.layers import get_channel_layer
@@ -1547,7 +1464,6 @@ def decline_ride(request, ride_id):
             }
         }
         
-        print(f"📢 [Backend] Broadcasting to customer_{ride.customer.id}: {message_data}")
         
         async_to_sync(channel_layer.group_send)(
             f"customer_{ride.customer.id}",
@@ -1661,7 +1577,7 @@ def customer_stats(request):
     first_day_of_month = today.replace(day=1)
     this_month_rides = Ride.objects.filter(
         customer=request.user,
-        created_at__date__gte=first_day_of_month
+        created_at__gte=day_bounds(first_day_of_month)[0]
     ).count()
     
     
@@ -1730,8 +1646,8 @@ def update_chat_history(ride, message):
                 chat_history.unread_count += 1
             chat_history.save()
             
-    except Exception as e:
-        print(f"Error updating chat history: {e}")
+    except Exception:
+        rides_log.exception('chat_history_update_failed')
 
 
 @api_view(['POST'])
@@ -1819,7 +1735,7 @@ def customer_stats(request):
     first_day_of_month = today.replace(day=1)
     this_month_rides = Ride.objects.filter(
         customer=request.user,
-        created_at__date__gte=first_day_of_month
+        created_at__gte=day_bounds(first_day_of_month)[0]
     ).count()
     
   
@@ -1866,76 +1782,56 @@ def admin_dashboard_stats(request):
     week_ago = today - timedelta(days=7)
     month_ago = today - timedelta(days=30)
     
-   
-    total_users = User.objects.count()
-    total_customers = User.objects.filter(user_type='customer').count()
-    total_drivers = User.objects.filter(user_type__in=['driver', 'boda_rider']).count()
-    total_emergency_responders = User.objects.filter(user_type='emergency_responder').count()
-    
-    
-    new_users_week = User.objects.filter(created_at__date__gte=week_ago).count()
-    
-   
-    total_rides = Ride.objects.count()
-    completed_rides = Ride.objects.filter(status='completed').count()
-    active_rides = Ride.objects.filter(status__in=['accepted', 'driver_arrived', 'driving_to_destination']).count()
-    cancelled_rides = Ride.objects.filter(status='cancelled').count()
-    
- 
-    recent_rides = Ride.objects.filter(created_at__date__gte=week_ago).count()
-    
-   
-    total_revenue = Ride.objects.filter(status='completed').aggregate(
-        total=Sum('fare')
-    )['total'] or 0
-    
-    weekly_revenue = Ride.objects.filter(
-        status='completed',
-        created_at__date__gte=week_ago
-    ).aggregate(total=Sum('fare'))['total'] or 0
-    
-   
-    pending_drivers_count = User.objects.filter(
-        user_type__in=['driver', 'boda_rider'],
-        approval_status='pending'
-    ).count()
-    
-    approved_drivers_count = User.objects.filter(
-        user_type__in=['driver', 'boda_rider'],
-        approval_status='approved'
-    ).count()
-    
-    suspended_drivers_count = User.objects.filter(
-        user_type__in=['driver', 'boda_rider'],
-        approval_status='suspended'
-    ).count()
-    
-    
-    total_emergency_requests = EmergencyRequest.objects.count()
-    active_emergency_requests = EmergencyRequest.objects.filter(
-        status__in=['requested', 'accepted', 'driving_to_destination']
-    ).count()
-    
+    driver_types = ['driver', 'boda_rider']
+    user_counts = User.objects.aggregate(
+        total=Count('id'),
+        customers=Count('id', filter=Q(user_type='customer')),
+        drivers=Count('id', filter=Q(user_type__in=driver_types)),
+        emergency_responders=Count('id', filter=Q(user_type='emergency_responder')),
+        new_this_week=Count('id', filter=Q(created_at__date__gte=week_ago)),
+        pending_drivers=Count('id', filter=Q(user_type__in=driver_types, approval_status='pending')),
+        approved_drivers=Count('id', filter=Q(user_type__in=driver_types, approval_status='approved')),
+        suspended_drivers=Count('id', filter=Q(user_type__in=driver_types, approval_status='suspended')),
+    )
+    total_users = user_counts['total']
+    pending_drivers_count = user_counts['pending_drivers']
+    approved_drivers_count = user_counts['approved_drivers']
+    suspended_drivers_count = user_counts['suspended_drivers']
+    
+    # Ride figures come from the daily rollup instead of scanning the rides table
+    by_status = {
+        row['status']: row
+        for row in DailyRideMetrics.objects.values('status').annotate(
+            rides=Sum('ride_count'), fare=Sum('fare_total')
+        ).order_by()
+    }
+    total_rides = sum(row['rides'] for row in by_status.values())
+    completed_rides = by_status.get('completed', {}).get('rides', 0)
+    cancelled_rides = by_status.get('cancelled', {}).get('rides', 0)
+    active_rides = sum(by_status.get(s, {}).get('rides', 0) for s in ['accepted', 'driver_arrived', 'driving_to_destination'])
+    total_revenue = by_status.get('completed', {}).get('fare') or 0
+    
+    recent_days = time_series(
+        DailyRideMetrics.objects.all(), 'day', week_ago, today,
+        rides=Sum('ride_count'),
+        revenue=Sum('fare_total', filter=Q(status='completed')),
+    )
+    recent_rides = sum(day['rides'] for day in recent_days)
+    weekly_revenue = sum(day['revenue'] for day in recent_days)
     
-    daily_stats = []
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        day_rides = Ride.objects.filter(created_at__date=date).count()
-        day_revenue = Ride.objects.filter(
-            created_at__date=date,
-            status='completed'
-        ).aggregate(total=Sum('fare'))['total'] or 0
-        
-        daily_stats.append({
-            'date': date.isoformat(),
-            'rides': day_rides,
-            'revenue': float(day_revenue)
-        })
+    emergency_counts = EmergencyRequest.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status__in=['requested', 'accepted', 'driving_to_destination'])),
+    )
     
+    daily_stats = [
+        {'date': day['period'].isoformat(), 'rides': day['rides'], 'revenue': float(day['revenue'])}
+        for day in recent_days[-7:]
+    ]
     
-    vehicle_stats = Ride.objects.values('vehicle_type').annotate(
-        count=Count('id'),
-        revenue=Sum('fare')
+    vehicle_stats = DailyRideMetrics.objects.values('vehicle_type').annotate(
+        count=Sum('ride_count'),
+        revenue=Sum('fare_total')
     ).order_by('-count')
     
     stats = {
@@ -1947,10 +1843,10 @@ def admin_dashboard_stats(request):
         },
         'users': {
             'total': total_users,
-            'customers': total_customers,
-            'drivers': total_drivers,
-            'emergency_responders': total_emergency_responders,
-            'new_this_week': new_users_week,
+            'customers': user_counts['customers'],
+            'drivers': user_counts['drivers'],
+            'emergency_responders': user_counts['emergency_responders'],
+            'new_this_week': user_counts['new_this_week'],
         },
         'rides': {
             'total': total_rides,
@@ -1972,8 +1868,8 @@ def admin_dashboard_stats(request):
             'approval_rate': (approved_drivers_count / (approved_drivers_count + pending_drivers_count) * 100) if (approved_drivers_count + pending_drivers_count) > 0 else 0,
         },
         'emergency_services': {
-            'total_requests': total_emergency_requests,
-            'active_requests': active_emergency_requests,
+            'total_requests': emergency_counts['total'],
+            'active_requests': emergency_counts['active'],
         },
         'charts': {
             'daily_stats': daily_stats,
@@ -1983,6 +1879,19 @@ def admin_dashboard_stats(request):
     
     return Response(stats)
 
+def page_info(page, total_key):
+    """Pagination block for admin listings; totals stop counting at PAGINATION_COUNT_CAP"""
+    total = page['total']
+    return {
+        'current_page': page['page'],
+        'total_pages': (total + page['page_size'] - 1) // page['page_size'],
+        total_key: total,
+        'total_is_estimate': page['total_is_estimate'],
+        'page_size': page['page_size'],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['next_cursor'] is not None,
+    }
+
 # User Management
 @api_view(['GET'])
 @permission_classes([permissions.IsAdminUser])
@@ -1993,8 +1902,6 @@ def admin_user_management(request):
     user_type = request.GET.get('user_type', '')
     status_filter = request.GET.get('status', '')
     search = request.GET.get('search', '')
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 20))
     
     
     filters = Q()
@@ -2019,25 +1926,23 @@ def admin_user_management(request):
         )
     
     
-    users = User.objects.filter(filters).order_by('-created_at')
-    total_users = users.count()
-    total_pages = (total_users + page_size - 1) // page_size
-    
-   
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-    paginated_users = users[start_index:end_index]
+    users = annotate_ride_stats(User.objects.filter(filters).select_related('vehicle', 'profile'))
+    try:
+        page = paginate(users, request, with_total=True)
+    except CursorError as e:
+        return Response({"error": str(e)}, status=400)
     
    
     users_data = []
-    for user in paginated_users:
+    for user in page['items']:
         user_data = UserSerializer(user).data
         
         
+        is_driver = user.user_type in ['driver', 'boda_rider']
         user_data['ride_stats'] = {
-            'total_rides_as_customer': Ride.objects.filter(customer=user).count(),
-            'total_rides_as_driver': Ride.objects.filter(driver=user).count() if user.user_type in ['driver', 'boda_rider'] else 0,
-            'completed_rides': Ride.objects.filter(driver=user, status='completed').count() if user.user_type in ['driver', 'boda_rider'] else 0,
+            'total_rides_as_customer': user.rides_as_customer,
+            'total_rides_as_driver': user.rides_as_driver if is_driver else 0,
+            'completed_rides': user.completed_rides_as_driver if is_driver else 0,
         }
         
         
@@ -2058,12 +1963,7 @@ def admin_user_management(request):
     
     return Response({
         'users': users_data,
-        'pagination': {
-            'current_page': page,
-            'total_pages': total_pages,
-            'total_users': total_users,
-            'page_size': page_size,
-        },
+        'pagination': page_info(page, 'total_users'),
         'filters': {
             'user_type': user_type,
             'status': status_filter,
@@ -2136,7 +2036,7 @@ def admin_user_detail(request, user_id):
     
     elif request.method == 'DELETE':
         
-        print(f"🟡 [Backend] Deleting user ID: {user_id}")
+        admin_log.info('user_deleted', user_id=user_id, by=request.user.id)
         user.delete()  
         return Response({"message": "User deleted successfully"})
     
@@ -2148,7 +2048,7 @@ def admin_user_detail(request, user_id):
             "error": "You cannot delete your own account"
         }, status=400)
     
-    print(f"🟡 [Backend] Deleting user ID: {user_id}")
+    admin_log.info('user_deleted', user_id=user_id, by=request.user.id)
     user.delete()
     return Response({"message": "User deleted successfully"})
 
@@ -2164,8 +2064,6 @@ def admin_ride_management(request):
     date_from = request.GET.get('date_from', '')
     date_to = request.GET.get('date_to', '')
     search = request.GET.get('search', '')
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 20))
     
     filters = Q()
     
@@ -2193,17 +2091,11 @@ def admin_ride_management(request):
         )
     
     
-    rides = Ride.objects.filter(filters).select_related(
-        'customer', 'driver'
-    ).order_by('-created_at')
-    
-    total_rides = rides.count()
-    total_pages = (total_rides + page_size - 1) // page_size
-    
-   
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-    paginated_rides = rides[start_index:end_index]
+    rides = Ride.objects.filter(filters).select_related('customer', 'driver')
+    try:
+        page = paginate(rides, request, with_total=True)
+    except CursorError as e:
+        return Response({"error": str(e)}, status=400)
     
     
     ride_stats = rides.aggregate(
@@ -2213,16 +2105,11 @@ def admin_ride_management(request):
         cancelled_rides=Count('id', filter=Q(status='cancelled'))
     )
     
-    serializer = RideSerializer(paginated_rides, many=True)
+    serializer = RideSerializer(page['items'], many=True)
     
     return Response({
         'rides': serializer.data,
-        'pagination': {
-            'current_page': page,
-            'total_pages': total_pages,
-            'total_rides': total_rides,
-            'page_size': page_size,
-        },
+        'pagination': page_info(page, 'total_rides'),
         'stats': ride_stats,
         'filters': {
             'status': status_filter,
@@ -2266,7 +2153,7 @@ def admin_ride_detail(request, ride_id):
         
        
         if ride.pickup_lat and ride.pickup_lng and ride.dropoff_lat and ride.dropoff_lng:
-            route_info = get_google_route(
+            route_info = get_route(
                 ride.pickup_lat, ride.pickup_lng,
                 ride.dropoff_lat, ride.dropoff_lng
             )
@@ -2281,11 +2168,32 @@ def admin_ride_detail(request, ride_id):
     
     elif request.method == 'PUT':
         
-        serializer = RideSerializer(ride, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=400)
+        # Status only changes through the lifecycle, so the move is guarded and recorded
+        new_status = request.data.get('status')
+        fields = {key: request.data[key] for key in request.data if key != 'status'}
+        serializer = RideSerializer(ride, data=fields, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        from_status = ride.status
+        changes_status = bool(new_status) and new_status != from_status
+        try:
+            with transaction.atomic():
+                if serializer.validated_data:
+                    # Write only the submitted columns so a concurrent status change isn't overwritten
+                    before = ride_metrics.ride_bucket(ride)
+                    for field, value in serializer.validated_data.items():
+                        setattr(ride, field, value)
+                    ride.save(update_fields=list(serializer.validated_data))
+                    ride_metrics.move_ride(before, ride_metrics.ride_bucket(ride))
+                if changes_status:
+                    ride = transition(ride.id, from_status, new_status, actor=request.user, notify=False)
+        except TransitionError as e:
+            return Response({"error": e.message}, status=e.status_code)
+
+        if changes_status:
+            notify_transition(ride, from_status)
+        return Response(RideSerializer(ride).data)
 
 # Emergency Management
 @api_view(['GET'])
@@ -2368,6 +2276,9 @@ def admin_earnings_report(request):
     period = request.GET.get('period', 'week')  
     date_from = request.GET.get('date_from', '')
     date_to = request.GET.get('date_to', '')
+    interval = request.GET.get('interval', 'day')
+    if interval not in ('day', 'week', 'month'):
+        return Response({"error": "interval must be day, week or month"}, status=400)
     
     
     today = timezone.now().date()
@@ -2387,50 +2298,37 @@ def admin_earnings_report(request):
         start_date = today - timedelta(days=7)
         end_date = today
     
-    # Get earnings data
-    earnings_data = Ride.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date, end_date]
-    ).aggregate(
-        total_earnings=Sum('fare'),
-        total_rides=Count('id'),
-        avg_fare=Avg('fare')
+    # One range scan of the daily rollup covers the summary, the series and the vehicle split
+    completed = DailyRideMetrics.objects.filter(status='completed', day__range=[start_date, end_date])
+    breakdown = time_series(
+        completed, 'day', start_date, end_date, bucket=interval,
+        total_earnings=Sum('fare_total'), total_rides=Sum('ride_count'),
     )
-    
-    # FIX: Update daily breakdown to use 'total_earnings' instead of 'earnings'
-    daily_breakdown = []
-    current_date = start_date
-    while current_date <= end_date:
-        day_earnings = Ride.objects.filter(
-            status='completed',
-            created_at__date=current_date
-        ).aggregate(
-            total_earnings=Sum('fare'),  # Changed from 'total' to 'total_earnings'
-            total_rides=Count('id')
-        )
-        
-        daily_breakdown.append({
-            'date': current_date.isoformat(),
-            'total_earnings': float(day_earnings['total_earnings'] or 0),  # Changed key
-            'total_rides': day_earnings['total_rides'] or 0,
-        })
-        
-        current_date += timedelta(days=1)
+    total_earnings = sum(row['total_earnings'] for row in breakdown)
+    total_rides = sum(row['total_rides'] for row in breakdown)
+    daily_breakdown = [
+        {
+            'date': row['period'].isoformat(),
+            'total_earnings': float(row['total_earnings']),
+            'total_rides': row['total_rides'],
+        }
+        for row in breakdown
+    ]
     
     # Vehicle type breakdown
-    by_vehicle_type = Ride.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date, end_date]
-    ).values('vehicle_type').annotate(
-        total_earnings=Sum('fare'),
-        total_rides=Count('id'),
-        avg_fare=Avg('fare')
-    ).order_by('-total_earnings')
+    by_vehicle_type = list(completed.values('vehicle_type').annotate(
+        total_earnings=Sum('fare_total'),
+        total_rides=Sum('ride_count')
+    ).order_by('-total_earnings'))
+    for row in by_vehicle_type:
+        row['avg_fare'] = row['total_earnings'] / row['total_rides'] if row['total_rides'] else 0
     
     # Top drivers
+    period_start, period_end = day_bounds(start_date, end_date)
     top_drivers = Ride.objects.filter(
         status='completed',
-        created_at__date__range=[start_date, end_date],
+        created_at__gte=period_start,
+        created_at__lt=period_end,
         driver__isnull=False
     ).values(
         'driver__id',
@@ -2450,12 +2348,12 @@ def admin_earnings_report(request):
             'period_type': period,
         },
         'summary': {
-            'total_earnings': float(earnings_data['total_earnings'] or 0),
-            'total_rides': earnings_data['total_rides'] or 0,
-            'average_fare': float(earnings_data['avg_fare'] or 0),
+            'total_earnings': float(total_earnings),
+            'total_rides': total_rides,
+            'average_fare': float(total_earnings / total_rides) if total_rides else 0,
         },
         'daily_breakdown': daily_breakdown,
-        'by_vehicle_type': list(by_vehicle_type),
+        'by_vehicle_type': by_vehicle_type,
         'top_drivers': list(top_drivers),
     }
     
@@ -2468,22 +2366,25 @@ def admin_usage_report(request):
     """System usage and performance reports"""
     
     
-    user_growth = []
-    for i in range(6, -1, -1):
-        date = timezone.now().date() - timedelta(days=i)
-        total_users = User.objects.filter(created_at__date__lte=date).count()
-        new_users = User.objects.filter(created_at__date=date).count()
-        
-        user_growth.append({
-            'date': date.isoformat(),
-            'total_users': total_users,
-            'new_users': new_users,
-        })
-    
-    
-    total_rides = Ride.objects.count()
-    completed_rides = Ride.objects.filter(status='completed').count()
-    cancelled_rides = Ride.objects.filter(status='cancelled').count()
+    today = timezone.now().date()
+    growth_start = today - timedelta(days=6)
+    user_growth = time_series(User.objects.all(), 'created_at', growth_start, today, new_users=Count('id'))
+    running_total(
+        user_growth, 'new_users', 'total_users',
+        initial=User.objects.filter(created_at__lt=day_bounds(growth_start)[0]).count(),
+    )
+    total_users = user_growth[-1]['total_users']
+    user_growth = [
+        {'date': day['period'].isoformat(), 'total_users': day['total_users'], 'new_users': day['new_users']}
+        for day in user_growth
+    ]
+    
+    ride_counts = dict(
+        DailyRideMetrics.objects.values_list('status').annotate(rides=Sum('ride_count')).order_by()
+    )
+    total_rides = sum(ride_counts.values())
+    completed_rides = ride_counts.get('completed', 0)
+    cancelled_rides = ride_counts.get('cancelled', 0)
     
     completion_rate = (completed_rides / total_rides * 100) if total_rides > 0 else 0
     cancellation_rate = (cancelled_rides / total_rides * 100) if total_rides > 0 else 0
@@ -2568,51 +2469,48 @@ def create_admin_notification(
         broadcast_admin_notification(notification)
         
         return notification
-    except Exception as e:
-        print(f"Error creating admin notification: {e}")
+    except Exception:
+        notifications_log.exception('admin_notification_create_failed')
         return None
 
 def broadcast_admin_notification(notification):
     """Broadcast notification to all connected admin users"""
     try:
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        
-        channel_layer = get_channel_layer()
-        
-        
         admin_users = User.objects.filter(
             is_staff=True,
             notification_preferences__receive_system_alerts=True 
-        )
+        ).select_related('notification_preferences')
         
-        for admin in admin_users:
-           
-            pref = getattr(admin, 'notification_preferences', None)
-            if should_send_notification(admin, notification):
-                async_to_sync(channel_layer.group_send)(
-                    f"admin_{admin.id}",
-                    {
-                        "type": "admin_notification",
-                        "data": {
-                            'id': notification.id,
-                            'type': notification.notification_type,
-                            'title': notification.title,
-                            'message': notification.message,
-                            'priority': notification.priority,
-                            'is_read': notification.is_read,
-                            'created_at': notification.created_at.isoformat(),
-                            'related_user_id': notification.related_user_id,
-                            'related_ride_id': notification.related_ride_id,
-                            'related_emergency_id': notification.related_emergency_request_id,
-                        }
-                    }
-                )
+        admin_groups = [
+            f"admin_{admin.id}" for admin in admin_users
+            if should_send_notification(admin, notification)
+        ]
+        
+        fanout = broadcast_to_groups(
+            admin_groups,
+            {
+                "type": "admin_notification",
+                "data": {
+                    'id': notification.id,
+                    'type': notification.notification_type,
+                    'title': notification.title,
+                    'message': notification.message,
+                    'priority': notification.priority,
+                    'is_read': notification.is_read,
+                    'created_at': notification.created_at.isoformat(),
+                    'related_user_id': notification.related_user_id,
+                    'related_ride_id': notification.related_ride_id,
+                    'related_emergency_id': notification.related_emergency_request_id,
+                }
+            }
+        )
+        for group, error in fanout['failed'].items():
+            notifications_log.warning('admin_notification_send_failed', group=group, error=str(error))
         
-        print(f"📢 [Admin Notification] Broadcast: {notification.title}")
+        notifications_log.info('admin_notification_broadcast', notification_id=notification.id, admins=fanout['sent'], elapsed_ms=fanout['elapsed_ms'])
         
-    except Exception as e:
-        print(f"Error broadcasting admin notification: {e}")
+    except Exception:
+        notifications_log.exception('admin_notification_broadcast_failed')
 
 def should_send_notification(admin_user, notification):
     """Check if admin should receive this notification based on preferences"""
@@ -2640,8 +2538,8 @@ def should_send_notification(admin_user, notification):
         
         return notification_priority >= min_priority
         
-    except Exception as e:
-        print(f"Error checking notification preferences: {e}")
+    except Exception:
+        notifications_log.exception('notification_preferences_check_failed')
         return True
 
 
@@ -2705,8 +2603,6 @@ def admin_notifications(request):
     notification_type = request.GET.get('type', '')
     priority = request.GET.get('priority', '')
     is_read = request.GET.get('is_read', '')
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 20))
     
     filters = Q()
     
@@ -2721,17 +2617,14 @@ def admin_notifications(request):
     
     notifications = AdminNotification.objects.filter(filters).select_related(
         'related_user', 'related_ride', 'related_emergency_request', 'created_by'
-    ).order_by('-created_at')
-    
-    total_notifications = notifications.count()
-    total_pages = (total_notifications + page_size - 1) // page_size
-    
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-    paginated_notifications = notifications[start_index:end_index]
+    )
+    try:
+        page = paginate(notifications, request, with_total=True)
+    except CursorError as e:
+        return Response({"error": str(e)}, status=400)
     
     notifications_data = []
-    for notification in paginated_notifications:
+    for notification in page['items']:
         notifications_data.append({
             'id': notification.id,
             'type': notification.notification_type,
@@ -2768,12 +2661,7 @@ def admin_notifications(request):
     
     return Response({
         'notifications': notifications_data,
-        'pagination': {
-            'current_page': page,
-            'total_pages': total_pages,
-            'total_notifications': total_notifications,
-            'page_size': page_size,
-        },
+        'pagination': page_info(page, 'total_notifications'),
         'summary': {
             'unread_count': unread_count,
             'unread_high_priority': unread_high_priority,
@@ -2998,10 +2886,10 @@ def approve_driver_with_vehicle(request, user_id):
 def get_approved_drivers(request):
     """Get all approved drivers with their details"""
     try:
-        approved_drivers = User.objects.filter(
+        approved_drivers = annotate_ride_stats(User.objects.filter(
             user_type__in=['driver', 'boda_rider'],
             approval_status='approved'
-        ).select_related('vehicle')
+        ).select_related('vehicle', 'profile'))
         
         drivers_data = []
         for driver in approved_drivers:
@@ -3023,12 +2911,9 @@ def get_approved_drivers(request):
                 driver_data['vehicle'] = None
             
             driver_data['ride_stats'] = {
-                'total_rides_as_driver': Ride.objects.filter(driver=driver).count(),
-                'completed_rides': Ride.objects.filter(driver=driver, status='completed').count(),
-                'total_earnings': float(Ride.objects.filter(
-                    driver=driver, 
-                    status='completed'
-                ).aggregate(total=Sum('fare'))['total'] or 0),
+                'total_rides_as_driver': driver.rides_as_driver,
+                'completed_rides': driver.completed_rides_as_driver,
+                'total_earnings': float(driver.driver_earnings),
             }
             
             drivers_data.append(driver_data)
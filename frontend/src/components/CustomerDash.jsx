@@ -7,7 +7,7 @@ import {
   Clock, Car, Bike, AlertCircle, Search, Star, Package, Bell, X, Edit3, Save, Mail, CheckCircle,
   CreditCard, Smartphone, Info, Upload, Download, Mic, Square, Bot 
 } from 'lucide-react';
-import RideService from '../services/ride';
+import RideService, { rideAttemptKey } from '../services/ride';
 import websocketService from '../services/websocketService';
 import UserService from '../services/user';
 import ChatService from '../services/chatService';
@@ -1289,6 +1289,8 @@ const [allChatHistory, setAllChatHistory] = useState([]);
 
   const chatEndRef = useRef();
   const mapRef = useRef();
+  // Idempotency key of the ride request being attempted, reused if the user retries it
+  const rideAttemptRef = useRef(null);
   const pickupRef = useRef(null);
   const dropoffRef = useRef(null);
 
@@ -1460,7 +1462,8 @@ const handleCourierRequest = async (packageData) => {
 
     console.log('🟡 [Courier] Final request data:', courierRequest);
     
-    const result = await RideService.requestRide(courierRequest);
+    const result = await RideService.requestRide(courierRequest, rideAttemptKey(rideAttemptRef, courierRequest));
+    rideAttemptRef.current = null;
     
     setActiveRide(result);
     setRideStatus('requested');
@@ -2885,7 +2888,8 @@ const requestRide = async () => {
     console.log('🟡 [Customer] Requesting ride with data:', rideData);
     
     
-    const result = await RideService.requestRide(rideData);
+    const result = await RideService.requestRide(rideData, rideAttemptKey(rideAttemptRef, rideData));
+    rideAttemptRef.current = null;
     
     setActiveRide(result);
     setRideStatus('requested');
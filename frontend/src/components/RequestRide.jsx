@@ -1,6 +1,6 @@
-import React, { useState } from 'react';
+import React, { useState, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import RideService from '../services/ride';
+import RideService, { rideAttemptKey } from '../services/ride';
 
 const RequestRide = () => {
   const [formData, setFormData] = useState({
@@ -13,6 +13,8 @@ const RequestRide = () => {
   });
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  // Idempotency key of the ride request being attempted, reused if the user retries it
+  const rideAttemptRef = useRef(null);
   const navigate = useNavigate();
 
   const handleChange = (e) => {
@@ -37,7 +39,8 @@ const RequestRide = () => {
         dropoff_lng: formData.dropoff_lng || 32.5827,
       };
 
-      const result = await RideService.requestRide(rideData);
+      const result = await RideService.requestRide(rideData, rideAttemptKey(rideAttemptRef, rideData));
+      rideAttemptRef.current = null;
       console.log('Ride requested successfully:', result);
       alert(`Ride requested successfully! Estimated fare: UGX ${result.fare}`);
       navigate('/my-rides');
@@ -1053,14 +1053,16 @@ const fetchAvailableRides = async () => {
         if (!isOnline) return;
 
         try {
-            await DriverService.updateDriverLocation({ lat: location.lat, lng: location.lng, is_online: isOnline });
-            if (dashboardDataRef.current?.current_ride) {
+            // The socket persists the fix and relays it to the customer; REST is only the fallback
+            if (websocketService.isConnected()) {
                 websocketService.sendMessage('location_update', {
-                    ride_id: dashboardDataRef.current.current_ride.id,
+                    ride_id: dashboardDataRef.current?.current_ride?.id,
                     lat: location.lat,
                     lng: location.lng,
                     timestamp: new Date().toISOString()
                 });
+            } else {
+                await DriverService.updateDriverLocation({ lat: location.lat, lng: location.lng, is_online: isOnline });
             }
         } catch (err) { console.error(err); }
     };
@@ -1230,12 +1232,11 @@ const fetchAvailableRides = async () => {
 };
 
     const handleRideAction = async (rideId, action) => {
-        let newStatus = '';
         try {
-            if (action === 'arrived') { await DriverService.updateRideStatus(rideId, 'driver_arrived'); newStatus = 'driver_arrived'; }
-            if (action === 'start') { await DriverService.startRide(rideId); newStatus = 'driving_to_destination'; }
-            if (action === 'complete') { await DriverService.completeRide(rideId); newStatus = 'completed'; }
-            if (newStatus) websocketService.sendMessage('ride_status_update', { ride_id: rideId, status: newStatus, timestamp: new Date().toISOString() });
+            // The server notifies the customer of each status change
+            if (action === 'arrived') await DriverService.updateRideStatus(rideId, 'driver_arrived');
+            if (action === 'start') await DriverService.startRide(rideId);
+            if (action === 'complete') await DriverService.completeRide(rideId);
             fetchDashboardData();
         } catch (err) { console.error(err); }
     };
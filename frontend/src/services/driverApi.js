@@ -47,7 +47,8 @@ class DriverService {
   async acceptRide(rideId) {
     try {
       const response = await axios.post(`${API_URL}/rides/${rideId}/accept/`, {}, {
-        headers: AuthService.getAuthHeader()
+        // Same key on every retry, so the server only accepts once
+        headers: { ...AuthService.getAuthHeader(), 'Idempotency-Key': `accept-${rideId}` }
       });
       return response.data;
     } catch (error) {
@@ -84,7 +85,8 @@ async startRide(rideId) {
   async completeRide(rideId) {
     try {
       const response = await axios.post(`${API_URL}/rides/${rideId}/complete/`, {}, {
-        headers: AuthService.getAuthHeader()
+        // Same key on every retry, so the server only completes once
+        headers: { ...AuthService.getAuthHeader(), 'Idempotency-Key': `complete-${rideId}` }
       });
       return response.data;
     } catch (error) {
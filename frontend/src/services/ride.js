@@ -4,6 +4,26 @@ import config from '../config';
 
 const API_URL = `${config.API_URL}/auth`; // ✅ Add /auth to base URL
 
+// crypto.randomUUID only exists in secure contexts (HTTPS or localhost); getRandomValues works everywhere
+export const createIdempotencyKey = () => {
+  if (window.crypto?.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  const bytes = new Uint8Array(16);
+  window.crypto.getRandomValues(bytes);
+  return Array.from(bytes, (byte) => byte.toString(16).padStart(2, '0')).join('');
+};
+
+// One key per ride attempt: retrying the same request reuses it, a changed request gets a new one.
+// Clear attemptRef.current once the request succeeds.
+export const rideAttemptKey = (attemptRef, rideData) => {
+  const body = JSON.stringify(rideData);
+  if (attemptRef.current?.body !== body) {
+    attemptRef.current = { body, key: createIdempotencyKey() };
+  }
+  return attemptRef.current.key;
+};
+
 class RideService {
   
   async reverseGeocode(lat, lng) {
@@ -126,7 +146,8 @@ class RideService {
     }
   }
 
-  async requestRide(rideData) {
+  // Pass the same idempotencyKey when retrying so the ride is only created once (see rideAttemptKey)
+  async requestRide(rideData, idempotencyKey = createIdempotencyKey()) {
     try {
       console.log('🚗 [Service] Requesting ride:', rideData);
       
@@ -136,7 +157,7 @@ class RideService {
       }
       
       const response = await axios.post(`${API_URL}/rides/request/`, rideData, {
-        headers: AuthService.getAuthHeader(),
+        headers: { ...AuthService.getAuthHeader(), 'Idempotency-Key': idempotencyKey },
         timeout: 30000
       });
       
@@ -212,7 +233,8 @@ class RideService {
   async acceptRide(rideId) {
     try {
       const response = await axios.post(`${API_URL}/rides/${rideId}/accept/`, {}, {
-        headers: AuthService.getAuthHeader()
+        // Same key on every retry, so the server only accepts once
+        headers: { ...AuthService.getAuthHeader(), 'Idempotency-Key': `accept-${rideId}` }
       });
       return response.data;
     } catch (error) {